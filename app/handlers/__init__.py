@@ -3,7 +3,9 @@ Handlers module
 """
 from aiogram import Router
 
-from . import start, help, login, voice
+from app.middlewares import MetricsMiddleware, create_throttling_middleware
+from config.settings import settings
+from . import start, help, login, report, export, voice
 
 
 def setup_routers() -> Router:
@@ -16,6 +18,17 @@ def setup_routers() -> Router:
     main_router.include_router(start.router)
     main_router.include_router(help.router)
     main_router.include_router(login.router)
+    main_router.include_router(report.router)
+    main_router.include_router(export.router)
     main_router.include_router(voice.router)
     
+    # Handler latency (outermost, so throttled messages are timed too)
+    if settings.metrics_enabled:
+        main_router.message.middleware(MetricsMiddleware())
+    
+    # Per-user rate limit (applies to the handlers of all included routers)
+    throttling = create_throttling_middleware()
+    if throttling is not None:
+        main_router.message.middleware(throttling)
+    
     return main_router
@@ -0,0 +1,126 @@
+"""
+Export command handler
+"""
+import logging
+import os
+from datetime import date
+from typing import Any, Dict, Optional
+
+from aiogram import Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import FSInputFile, Message
+
+from app.handlers.report import PERIOD_ALIASES
+from app.repositories import user_repository
+from app.services import export_service, transaction_buffer
+from app.services.export import ENCODERS
+from app.services.rollups import period_end, period_start
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+router = Router()
+
+USAGE_TEXT = (
+    "ℹ️ Foydalanish: /export [csv|xlsx] [kun|hafta|oy|YYYY-MM-DD [YYYY-MM-DD]] [kategoriya]\n"
+    "Masalan: /export xlsx oy food\n"
+    "/export csv 2026-01-01 2026-03-31"
+)
+
+
+def parse_export_args(args: Optional[str], today: date) -> Optional[Dict[str, Any]]:
+    """
+    Parse /export arguments (in any order)
+
+    Args:
+        args: Text after the command
+        today: Date the period aliases are relative to
+
+    Returns:
+        Dict with fmt, start, end and category, or None if the arguments
+        are not valid
+    """
+    options: Dict[str, Any] = {"fmt": "csv", "start": None, "end": None, "category": None}
+    dates = []
+    for token in (args or "").split():
+        lowered = token.lower()
+        if lowered in ENCODERS:
+            options["fmt"] = lowered
+        elif lowered in PERIOD_ALIASES:
+            period = PERIOD_ALIASES[lowered]
+            options["start"] = period_start(today, period)
+            options["end"] = period_end(options["start"], period)
+        else:
+            try:
+                dates.append(date.fromisoformat(token))
+                continue
+            except ValueError:
+                pass
+            if options["category"] is not None:
+                return None
+            options["category"] = token
+
+    # One date: from that day on; two dates: inclusive range
+    if len(dates) > 2:
+        return None
+    if dates:
+        options["start"] = dates[0]
+        options["end"] = dates[1] if len(dates) == 2 else None
+        if options["end"] is not None and options["end"] < options["start"]:
+            return None
+    return options
+
+
+@router.message(Command("export"))
+async def cmd_export(message: Message, command: CommandObject):
+    """
+    Handle /export command
+    Send the user's transactions as a CSV or XLSX file
+    """
+    today = date.today()
+    options = parse_export_args(command.args, today)
+    if options is None:
+        await message.answer(USAGE_TEXT)
+        return
+
+    path = None
+    try:
+        db_user = await user_repository.get_by_telegram_id(message.from_user.id)
+        if db_user is None:
+            await message.answer(
+                "❌ Siz hali ro'yxatdan o'tmagansiz.\n\n"
+                "Iltimos, /start komandasini yuboring."
+            )
+            return
+
+        # Just-recorded transactions may still be in the write buffer
+        await transaction_buffer.flush()
+
+        processing_msg = await message.answer("⏳ Eksport tayyorlanmoqda...")
+        fmt = options.pop("fmt")
+        path, count = await export_service.export_to_file(fmt, db_user.id, **options)
+        await processing_msg.delete()
+
+        if count == 0:
+            await message.answer("📭 Tanlangan davr uchun yozuvlar yo'q.")
+            return
+        if os.path.getsize(path) > settings.export_max_bytes:
+            await message.answer(
+                "⚠️ Fayl juda katta.\n"
+                "Iltimos, qisqaroq davr yoki kategoriya tanlang."
+            )
+            return
+
+        await message.answer_document(
+            FSInputFile(path, filename=f"tranzaksiyalar_{today}.{fmt}"),
+            caption=f"📄 {count} ta yozuv",
+        )
+
+    except Exception as e:
+        logger.error(f"Error exporting transactions: {e}")
+        await message.answer(
+            "❌ Eksportda xatolik yuz berdi. Iltimos, keyinroq urinib ko'ring."
+        )
+
+    finally:
+        if path is not None:
+            os.unlink(path)
@@ -24,7 +24,10 @@ async def cmd_help(message: Message):
         "📌 Mavjud komandalar:\n"
         "/start - Botni qayta ishga tushirish\n"
         "/help - Bu yordam xabarini ko'rish\n"
-        "/login - Tizimga kirish\n\n"
+        "/login - Tizimga kirish\n"
+        "/report [kun|hafta|oy] - Kategoriyalar bo'yicha hisobot\n"
+        "/report_check - Hisobot ma'lumotlarini tekshirish\n"
+        "/export [csv|xlsx] [oy|YYYY-MM-DD ...] [kategoriya] - Tranzaksiyalarni faylga yuklash\n\n"
         "💡 Misol:\n"
         "\"Men bugun 50000 so'm oziq-ovqatga sarfladim\"\n\n"
         "Bot javob qaytaradi:\n"
@@ -5,7 +5,7 @@ from aiogram import Router
 from aiogram.filters import Command
 from aiogram.types import Message
 
-from app.models import User
+from app.repositories import user_repository
 
 router = Router()
 
@@ -20,7 +20,7 @@ async def cmd_login(message: Message):
     
     try:
         # Check if user exists in database
-        db_user = await User.get_or_none(telegram_id=user.id)
+        db_user = await user_repository.get_by_telegram_id(user.id)
         
         if db_user:
             login_text = (
@@ -0,0 +1,137 @@
+"""
+Report command handlers
+"""
+import logging
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from aiogram import Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+
+from app.repositories import user_repository
+from app.services import rollup_service, transaction_buffer
+from app.services.financial_record import DEFAULT_CURRENCY, format_amount
+from app.services.rollups import period_end, period_start
+
+logger = logging.getLogger(__name__)
+router = Router()
+
+# Accepted /report arguments -> period
+PERIOD_ALIASES = {
+    "day": "day", "kun": "day", "bugun": "day",
+    "week": "week", "hafta": "week",
+    "month": "month", "oy": "month",
+}
+
+PERIOD_TITLES = {"day": "Bugun", "week": "Bu hafta", "month": "Bu oy"}
+
+
+def _format_report(rows: list, period: str, today: date) -> str:
+    """Render rollup rows grouped by type, with totals per currency"""
+    start = period_start(today, period)
+    end = period_end(start, period)
+    dates = f"{start}" if start == end else f"{start} — {end}"
+    lines = [f"📊 Hisobot: {PERIOD_TITLES[period]} ({dates})\n"]
+
+    # Har bir valyuta alohida jamlanadi (USD va UZS qo'shilmaydi)
+    totals = defaultdict(lambda: {"expense": Decimal(0), "income": Decimal(0)})
+    for tx_type, title in (("expense", "💸 Xarajatlar:"), ("income", "💰 Daromadlar:")):
+        items = [row for row in rows if row["type"] == tx_type]
+        if not items:
+            continue
+        lines.append(title)
+        for row in items:
+            lines.append(
+                f"• {row['category']}: {format_amount(row['total'])} {row['currency']} ({row['count']})"
+            )
+            totals[row["currency"]][tx_type] += row["total"]
+        lines.append("")
+
+    for currency in sorted(totals, key=lambda code: (code != DEFAULT_CURRENCY, code)):
+        total = totals[currency]
+        lines.append(
+            f"Jami ({currency}): xarajat {format_amount(total['expense'])}, "
+            f"daromad {format_amount(total['income'])}, "
+            f"balans {format_amount(total['income'] - total['expense'])}"
+        )
+    return "\n".join(lines)
+
+
+@router.message(Command("report"))
+async def cmd_report(message: Message, command: CommandObject):
+    """
+    Handle /report [day|week|month] command
+    Show totals by category for the current period
+    """
+    argument = (command.args or "month").strip().lower()
+    period = PERIOD_ALIASES.get(argument)
+    if period is None:
+        await message.answer(
+            "ℹ️ Foydalanish: /report [kun|hafta|oy]\n"
+            "Masalan: /report hafta"
+        )
+        return
+
+    try:
+        db_user = await user_repository.get_by_telegram_id(message.from_user.id)
+        if db_user is None:
+            await message.answer(
+                "❌ Siz hali ro'yxatdan o'tmagansiz.\n\n"
+                "Iltimos, /start komandasini yuboring."
+            )
+            return
+
+        # Just-recorded transactions may still be in the write buffer
+        await transaction_buffer.flush()
+
+        today = date.today()
+        rows = await rollup_service.report(db_user.id, period, today)
+        if not rows:
+            await message.answer(f"📭 {PERIOD_TITLES[period]} uchun yozuvlar yo'q.")
+            return
+
+        await message.answer(_format_report(rows, period, today))
+
+    except Exception as e:
+        logger.error(f"Error building report: {e}")
+        await message.answer(
+            "❌ Hisobotni tayyorlashda xatolik yuz berdi. Iltimos, keyinroq urinib ko'ring."
+        )
+
+
+@router.message(Command("report_check"))
+async def cmd_report_check(message: Message):
+    """
+    Handle /report_check command
+    Verify the user's report totals and rebuild them if they drifted
+    """
+    try:
+        db_user = await user_repository.get_by_telegram_id(message.from_user.id)
+        if db_user is None:
+            await message.answer(
+                "❌ Siz hali ro'yxatdan o'tmagansiz.\n\n"
+                "Iltimos, /start komandasini yuboring."
+            )
+            return
+
+        await transaction_buffer.flush()
+
+        mismatches = await rollup_service.check(db_user.id)
+        if not mismatches:
+            await message.answer("✅ Hisobot ma'lumotlari to'g'ri.")
+            return
+
+        logger.warning(f"{len(mismatches)} rollup mismatches for user {db_user.id}, rebuilding")
+        written = await rollup_service.rebuild(db_user.id)
+        await message.answer(
+            f"🔧 {len(mismatches)} ta nomuvofiqlik topildi va tuzatildi "
+            f"({written} ta yozuv qayta hisoblandi)."
+        )
+
+    except Exception as e:
+        logger.error(f"Error checking report totals: {e}")
+        await message.answer(
+            "❌ Tekshirishda xatolik yuz berdi. Iltimos, keyinroq urinib ko'ring."
+        )
@@ -6,7 +6,7 @@ from aiogram import Router
 from aiogram.filters import CommandStart
 from aiogram.types import Message
 
-from app.models import User
+from app.repositories import user_repository
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -21,25 +21,16 @@ async def cmd_start(message: Message):
     user = message.from_user
     
     try:
-        # Get or create user in database
-        db_user, created = await User.get_or_create(
+        # Create user or update changed profile fields (one statement)
+        db_user, written = await user_repository.upsert(
             telegram_id=user.id,
-            defaults={
-                "username": user.username,
-                "first_name": user.first_name,
-                "last_name": user.last_name,
-            }
+            username=user.username,
+            first_name=user.first_name,
+            last_name=user.last_name,
         )
         
-        if not created:
-            # Update user info if already exists
-            db_user.username = user.username
-            db_user.first_name = user.first_name
-            db_user.last_name = user.last_name
-            await db_user.save()
-            logger.info(f"Updated user: {user.id}")
-        else:
-            logger.info(f"Created new user: {user.id}")
+        if written:
+            logger.info(f"Saved user: {user.id}")
         
         welcome_text = (
             f"👋 Salom, {user.first_name}!\n\n"
@@ -1,16 +1,88 @@
 """
 Voice message handler
 """
-import json
 import logging
+from types import SimpleNamespace
+
 from aiogram import Router, Bot
 from aiogram.types import Message
 
-from app.services import gemini_service
+from app.metrics import timed
+from app.services import (
+    ExtractionCache,
+    FinancialRecord,
+    QueueFullError,
+    VoiceTooLargeError,
+    extraction_batcher,
+    extraction_cache,
+    get_gemini_service,
+    job_queue,
+    local_parser,
+    processing_queue,
+    render_record,
+    transaction_buffer,
+    voice_downloader,
+)
+from app.utils.message_editor import ThrottledEditor
+from config.settings import settings
 
 logger = logging.getLogger(__name__)
 router = Router()
 
+BUSY_TEXT = (
+    "⏳ Hozir so'rovlar juda ko'p.\n"
+    "Iltimos, birozdan keyin qayta yuboring."
+)
+
+
+TOO_LARGE_TEXT = (
+    "⚠️ Ovozli xabar fayli juda katta.\n"
+    "Iltimos, qisqaroq xabar yuboring."
+)
+
+VOICE_ERROR_TEXT = (
+    "❌ Ovozli xabarni qayta ishlashda xatolik yuz berdi.\n"
+    "Iltimos, keyinroq urinib ko'ring yoki matn ko'rinishida yuboring."
+)
+
+TEXT_ERROR_TEXT = (
+    "❌ Matnni tahlil qilishda xatolik yuz berdi.\n"
+    "Iltimos, keyinroq urinib ko'ring."
+)
+
+
+def _position_note(job) -> str:
+    """Queue position line for the processing message"""
+    return f"\n⏳ Navbatdagi o'rningiz: {job.position}" if job.position else ""
+
+
+async def _download_voice(voice, bot: Bot) -> memoryview:
+    """Download a voice note from Telegram"""
+    with timed("download"):
+        return await voice_downloader.download(bot, voice)
+
+
+async def _process_voice(voice, bot: Bot) -> dict:
+    """Download a voice note and run it through Gemini"""
+    audio_bytes = await _download_voice(voice, bot)
+    
+    # Process voice message
+    transcribed_text, financial_data = await get_gemini_service().process_voice_message(audio_bytes)
+    return {"transcript": transcribed_text, "financial_data": financial_data}
+
+
+async def _process_voice_streaming(message: Message, bot: Bot, editor: ThrottledEditor) -> dict:
+    """Like ``_process_voice``, showing the transcript in the processing message as it arrives"""
+    audio_bytes = await _download_voice(message.voice, bot)
+    
+    transcribed_text = await get_gemini_service().transcribe_audio_stream(
+        audio_bytes, lambda text: editor.update(f"📝 Transkripsiya:\n{text} ▌")
+    )
+    editor.update(f"📝 Transkripsiya:\n{transcribed_text}\n\n⏳ Moliyaviy ma'lumotlar ajratilmoqda...")
+    
+    financial_data = await extraction_batcher.extract(transcribed_text)
+    return {"transcript": transcribed_text, "financial_data": financial_data}
+
 
 @router.message(lambda message: message.voice is not None)
 async def handle_voice(message: Message, bot: Bot):
@@ -20,48 +92,94 @@ async def handle_voice(message: Message, bot: Bot):
     2. Transcribe using Gemini API
     3. Extract financial data
     4. Return both text and JSON format
+    
+    With ``voice_streaming`` the processing message is edited in place:
+    first the transcript as it is generated, then the final answer.
     """
+    if settings.voice_max_duration and (message.voice.duration or 0) > settings.voice_max_duration:
+        await message.answer(
+            "⚠️ Ovozli xabar juda uzun.\n"
+            f"Iltimos, {settings.voice_max_duration // 60} daqiqagacha bo'lgan xabar yuboring."
+        )
+        return
+    
+    # Too big to download: answer without any request to Telegram
+    if voice_downloader.too_large(message.voice):
+        await message.answer(TOO_LARGE_TEXT)
+        return
+    
+    if settings.job_queue_backend == "database":
+        await _enqueue_job(
+            message, "voice", "🎤 Ovozli xabar qayta ishlanmoqda...",
+            file_id=message.voice.file_id,
+            file_unique_id=message.voice.file_unique_id,
+            file_size=message.voice.file_size,
+        )
+        return
+    
+    editor = None
     try:
-        # Send processing message
-        processing_msg = await message.answer("🎤 Ovozli xabar qayta ishlanmoqda...")
+        if settings.voice_streaming:
+            editor = ThrottledEditor(settings.voice_stream_edit_interval)
+            compute = lambda: _process_voice_streaming(message, bot, editor)
+        else:
+            compute = lambda: _process_voice(message.voice, bot)
         
-        # Download voice file
-        voice_file = await bot.get_file(message.voice.file_id)
-        voice_data = await bot.download_file(voice_file.file_path)
+        # Forwarded/repeated voice notes share file_unique_id, so they hit the cache
+        job = processing_queue.submit(
+            message.from_user.id,
+            lambda: extraction_cache.get_or_compute(
+                ExtractionCache.voice_key(message.voice.file_unique_id),
+                compute
+            )
+        )
         
-        # Read voice data
-        audio_bytes = voice_data.read()
+        # Send processing message
+        processing_msg = await message.answer(
+            "🎤 Ovozli xabar qayta ishlanmoqda..." + _position_note(job)
+        )
+        if editor is not None:
+            editor.attach(processing_msg)
         
-        # Process voice message
-        transcribed_text, financial_data = await gemini_service.process_voice_message(audio_bytes)
+        result = await job
+        transcribed_text = result["transcript"]
+        record = FinancialRecord.from_dict(result["financial_data"])
         
-        # Format response
-        response_text = (
-            f"📝 Transkripsiya:\n{transcribed_text}\n\n"
-            f"💰 Moliyaviy ma'lumotlar (JSON):\n"
-            f"```json\n{json.dumps(financial_data, indent=2, ensure_ascii=False)}\n```\n\n"
-            f"📊 Tafsilotlar:\n"
-            f"• Turi: {financial_data.get('type', 'N/A')}\n"
-            f"• Miqdor: {financial_data.get('amount', 0)}\n"
-            f"• Kategoriya: {financial_data.get('category', 'N/A')}\n"
-            f"• Tavsif: {financial_data.get('description', 'N/A')}\n"
-            f"• Sana: {financial_data.get('date', 'N/A')}"
+        # Save transaction (written in batches in the background)
+        transaction_buffer.add(
+            message.from_user.id, record, source="voice", transcript=transcribed_text
         )
         
-        # Delete processing message
-        await processing_msg.delete()
+        # Format response
+        response_text = render_record(record, transcript=transcribed_text)
         
-        # Send response
-        await message.answer(response_text, parse_mode="Markdown")
+        if editor is not None:
+            # Final answer replaces the streamed transcript
+            try:
+                await editor.finish(response_text, parse_mode="Markdown")
+            except Exception as e:
+                logger.warning(f"Could not edit processing message, sending a new one: {e}")
+                await message.answer(response_text, parse_mode="Markdown")
+        else:
+            # Delete processing message
+            await processing_msg.delete()
+            
+            # Send response
+            await message.answer(response_text, parse_mode="Markdown")
         
         logger.info(f"Processed voice message from user {message.from_user.id}")
         
+    except QueueFullError:
+        await message.answer(BUSY_TEXT)
+        
+    except VoiceTooLargeError:
+        await message.answer(TOO_LARGE_TEXT)
+        
     except Exception as e:
         logger.error(f"Error processing voice message: {e}")
-        await message.answer(
-            "❌ Ovozli xabarni qayta ishlashda xatolik yuz berdi.\n"
-            "Iltimos, keyinroq urinib ko'ring yoki matn ko'rinishida yuboring."
-        )
+        if editor is not None:
+            await editor.stop()
+        await message.answer(VOICE_ERROR_TEXT)
 
 
 @router.message(lambda message: message.text and not message.text.startswith('/'))
@@ -71,35 +189,134 @@ async def handle_text(message: Message):
     Extract financial data from text
     """
     try:
-        # Send processing message
-        processing_msg = await message.answer("📝 Matn tahlil qilinmoqda...")
+        # Simple phrases are answered locally, without a Gemini round trip
+        financial_data = None
+        processing_msg = None
+        if settings.local_parser_enabled:
+            financial_data = local_parser.try_parse(message.text)
+        
+        if financial_data is None and settings.job_queue_backend == "database":
+            await _enqueue_job(message, "text", "📝 Matn tahlil qilinmoqda...", text=message.text)
+            return
+        
+        if financial_data is None:
+            # Extract financial data from text
+            job = processing_queue.submit(
+                message.from_user.id,
+                lambda: extraction_cache.get_or_compute(
+                    ExtractionCache.text_key(message.text),
+                    lambda: extraction_batcher.extract(message.text)
+                )
+            )
+            
+            # Send processing message
+            processing_msg = await message.answer(
+                "📝 Matn tahlil qilinmoqda..." + _position_note(job)
+            )
+            
+            financial_data = await job
+        
+        record = FinancialRecord.from_dict(financial_data)
         
-        # Extract financial data from text
-        financial_data = await gemini_service.extract_financial_data(message.text)
+        # Save transaction (written in batches in the background)
+        transaction_buffer.add(message.from_user.id, record, source="text")
         
         # Format response
-        response_text = (
-            f"💰 Moliyaviy ma'lumotlar (JSON):\n"
-            f"```json\n{json.dumps(financial_data, indent=2, ensure_ascii=False)}\n```\n\n"
-            f"📊 Tafsilotlar:\n"
-            f"• Turi: {financial_data.get('type', 'N/A')}\n"
-            f"• Miqdor: {financial_data.get('amount', 0)}\n"
-            f"• Kategoriya: {financial_data.get('category', 'N/A')}\n"
-            f"• Tavsif: {financial_data.get('description', 'N/A')}\n"
-            f"• Sana: {financial_data.get('date', 'N/A')}"
-        )
+        response_text = render_record(record)
         
         # Delete processing message
-        await processing_msg.delete()
+        if processing_msg:
+            await processing_msg.delete()
         
         # Send response
         await message.answer(response_text, parse_mode="Markdown")
         
         logger.info(f"Processed text message from user {message.from_user.id}")
         
+    except QueueFullError:
+        await message.answer(BUSY_TEXT)
+        
     except Exception as e:
         logger.error(f"Error processing text message: {e}")
-        await message.answer(
-            "❌ Matnni tahlil qilishda xatolik yuz berdi.\n"
-            "Iltimos, keyinroq urinib ko'ring."
+        await message.answer(TEXT_ERROR_TEXT)
+
+
+# Durable queue (JOB_QUEUE_BACKEND=database): the handlers above only store the
+# job; a bot or worker process runs it and edits the processing message.
+
+async def _enqueue_job(message: Message, kind: str, processing_text: str, **payload) -> None:
+    """Send the processing message and store a job that will replace it with the answer"""
+    try:
+        processing_msg = await message.answer(processing_text)
+        await job_queue.enqueue(
+            kind,
+            message.from_user.id,
+            {"chat_id": message.chat.id, "message_id": processing_msg.message_id, **payload},
         )
+    except Exception as e:
+        logger.error(f"Could not queue {kind} job: {e}")
+        await message.answer(VOICE_ERROR_TEXT if kind == "voice" else TEXT_ERROR_TEXT)
+
+
+async def _deliver(bot: Bot, payload: dict, text: str, parse_mode=None) -> None:
+    """Put the answer in place of the processing message (or send it if that fails)"""
+    try:
+        await bot.edit_message_text(
+            text, chat_id=payload["chat_id"], message_id=payload["message_id"], parse_mode=parse_mode
+        )
+    except Exception as e:
+        logger.warning(f"Could not edit processing message, sending a new one: {e}")
+        try:
+            await bot.send_message(payload["chat_id"], text, parse_mode=parse_mode)
+        except Exception as e:
+            # Tranzaksiya saqlangan: javob yetmasa ham job qayta ishlanmaydi
+            logger.error(f"Could not send the answer to chat {payload['chat_id']}: {e}")
+
+
+async def run_voice_job(bot: Bot, user_id: int, payload: dict) -> None:
+    """Durable queue handler of a voice note"""
+    voice = SimpleNamespace(file_id=payload["file_id"], file_size=payload.get("file_size"))
+    try:
+        result = await extraction_cache.get_or_compute(
+            ExtractionCache.voice_key(payload["file_unique_id"]),
+            lambda: _process_voice(voice, bot)
+        )
+    except VoiceTooLargeError:
+        await _deliver(bot, payload, TOO_LARGE_TEXT)
+        return
+    
+    transcribed_text = result["transcript"]
+    record = FinancialRecord.from_dict(result["financial_data"])
+    
+    # Written directly (not buffered): a failed write fails the job, which is retried
+    await transaction_buffer.save(user_id, record, source="voice", transcript=transcribed_text)
+    
+    await _deliver(bot, payload, render_record(record, transcript=transcribed_text), parse_mode="Markdown")
+    logger.info(f"Processed voice job of user {user_id}")
+
+
+async def run_text_job(bot: Bot, user_id: int, payload: dict) -> None:
+    """Durable queue handler of a text message"""
+    text = payload["text"]
+    financial_data = await extraction_cache.get_or_compute(
+        ExtractionCache.text_key(text),
+        lambda: extraction_batcher.extract(text)
+    )
+    record = FinancialRecord.from_dict(financial_data)
+    
+    await transaction_buffer.save(user_id, record, source="text")
+    
+    await _deliver(bot, payload, render_record(record), parse_mode="Markdown")
+    logger.info(f"Processed text job of user {user_id}")
+
+
+async def _voice_job_dead(bot: Bot, user_id: int, payload: dict, error: str) -> None:
+    await _deliver(bot, payload, VOICE_ERROR_TEXT)
+
+
+async def _text_job_dead(bot: Bot, user_id: int, payload: dict, error: str) -> None:
+    await _deliver(bot, payload, TEXT_ERROR_TEXT)
+
+
+job_queue.register("voice", run_voice_job, _voice_job_dead)
+job_queue.register("text", run_text_job, _text_job_dead)
@@ -0,0 +1,332 @@
+"""
+Process-local metrics exposed in the Prometheus text format
+"""
+import bisect
+import functools
+import logging
+import sys
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers DB queries (ms) up to long voice notes (tens of seconds)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Index of this process among webhook workers (metrics port offset)
+worker_index = 0
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """Base for metrics with optional labels"""
+
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            # Unlabelled metrics are exported as 0 before the first event
+            self.labels()
+        REGISTRY.append(self)
+
+    def labels(self, *values: str):
+        """Child metric for one combination of label values"""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def collect(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.collect()]
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class Counter(_Metric):
+    """Monotonically increasing total"""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def collect(self):
+        for values, child in self._children.items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in fixed buckets"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def collect(self):
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), child.counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+            yield f"{self.name}_count{labels} {child.count}"
+
+
+class CallbackMetric(_Metric):
+    """
+    Gauge or counter read from a callback at scrape time
+
+    For values a component already keeps (queue depth, cache hits). The
+    callback returns a number, or a dict of label value(s) -> number.
+    """
+
+    def __init__(self, name: str, help: str, callback: Callable[[], object],
+                 labelnames: Sequence[str] = (), kind: str = "gauge"):
+        self.callback = callback
+        self.kind = kind
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return None
+
+    def collect(self):
+        try:
+            value = self.callback()
+        except Exception as e:
+            logger.warning(f"Metric {self.name} failed: {e}")
+            return
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for values, number in items:
+            if not isinstance(values, tuple):
+                values = (values,)
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(number)}"
+
+
+REGISTRY: List[_Metric] = []
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Metric definitions -------------------------------------------------
+
+HANDLER_SECONDS = Histogram(
+    "finance_bot_handler_seconds", "Time spent in update handlers", ["handler"]
+)
+HANDLER_ERRORS = Counter(
+    "finance_bot_handler_errors_total", "Update handlers that raised", ["handler"]
+)
+GEMINI_SECONDS = Histogram(
+    "finance_bot_gemini_seconds",
+    "Duration of Gemini API calls and voice downloads",
+    ["operation"],
+)
+GEMINI_ERRORS = Counter(
+    "finance_bot_gemini_errors_total", "Failed Gemini API calls and voice downloads", ["operation"]
+)
+GEMINI_TOKENS = Counter(
+    "finance_bot_gemini_tokens_total", "Tokens reported in usage metadata", ["model", "kind"]
+)
+DB_QUERY_SECONDS = Histogram(
+    "finance_bot_db_query_seconds", "Duration of database queries", ["statement"]
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "finance_bot_queue_wait_seconds", "Time jobs waited in the processing queue"
+)
+THROTTLED = Counter(
+    "finance_bot_throttled_total", "Messages dropped by per-user throttling"
+)
+
+
+def record_usage(model: str, response) -> None:
+    """Count tokens from a generate_content response's usage metadata"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    for kind, field in (
+        ("prompt", "prompt_token_count"),
+        ("output", "candidates_token_count"),
+        ("thoughts", "thoughts_token_count"),
+        ("total", "total_token_count"),
+    ):
+        count = getattr(usage, field, None)
+        if count:
+            GEMINI_TOKENS.labels(model, kind).inc(count)
+
+
+class timed:
+    """
+    Time a block into GEMINI_SECONDS and count its failures
+
+    Usage: ``with timed("upload"): ...``
+    """
+
+    __slots__ = ("operation", "started")
+
+    def __init__(self, operation: str):
+        self.operation = operation
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        GEMINI_SECONDS.labels(self.operation).observe(time.perf_counter() - self.started)
+        if exc_type is not None:
+            GEMINI_ERRORS.labels(self.operation).inc()
+        return False
+
+
+# --- Tortoise query timing ----------------------------------------------
+
+_QUERY_METHODS = ("execute_insert", "execute_query", "execute_query_dict", "execute_many", "execute_script")
+
+
+def _statement(query: str) -> str:
+    """Statement kind used as the label (SELECT, INSERT, ...)"""
+    head = query.lstrip()[:6].upper()
+    if head in ("SELECT", "INSERT", "UPDATE", "DELETE"):
+        return head.lower()
+    return "other"
+
+
+def _timed_query(method):
+    @functools.wraps(method)
+    async def wrapper(self, query, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await method(self, query, *args, **kwargs)
+        finally:
+            DB_QUERY_SECONDS.labels(_statement(query)).observe(time.perf_counter() - started)
+    wrapper._metrics_wrapped = True
+    return wrapper
+
+
+def instrument_connection(connection) -> None:
+    """
+    Time every query of a Tortoise connection's backend
+
+    Wraps the ``execute_*`` methods of the client class and of its
+    transaction wrapper (once per class).
+    """
+    client_class = type(connection)
+    classes = [client_class]
+    wrapper_class = getattr(sys.modules[client_class.__module__], "TransactionWrapper", None)
+    if wrapper_class is not None:
+        classes.append(wrapper_class)
+
+    for cls in classes:
+        for name in _QUERY_METHODS:
+            # Wrap the implementation the class actually uses
+            owner = next((base for base in cls.__mro__ if name in base.__dict__), None)
+            if owner is None:
+                continue
+            method = owner.__dict__[name]
+            if not getattr(method, "_metrics_wrapped", False):
+                setattr(owner, name, _timed_query(method))
+
+
+# --- HTTP endpoint --------------------------------------------------------
+
+async def _handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+def create_metrics_app() -> web.Application:
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+    return app
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """
+    Serve ``/metrics`` on its own port
+
+    Webhook workers each use ``port + worker_index``, since every process
+    keeps its own numbers.
+
+    Returns:
+        Runner to pass to ``stop_metrics_server``
+    """
+    runner = web.AppRunner(create_metrics_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port + worker_index)
+    await site.start()
+    logger.info(f"Metrics on http://{host}:{port + worker_index}/metrics")
+    return runner
+
+
+async def stop_metrics_server(runner: Optional[web.AppRunner]) -> None:
+    if runner is not None:
+        await runner.cleanup()
@@ -0,0 +1,18 @@
+"""
+Dispatcher middlewares
+"""
+from .metrics import MetricsMiddleware
+from .throttling import (
+    DatabaseTokenBucket,
+    MemoryTokenBucket,
+    ThrottlingMiddleware,
+    create_throttling_middleware,
+)
+
+__all__ = [
+    "MetricsMiddleware",
+    "DatabaseTokenBucket",
+    "MemoryTokenBucket",
+    "ThrottlingMiddleware",
+    "create_throttling_middleware",
+]
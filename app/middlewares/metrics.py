@@ -0,0 +1,37 @@
+"""
+Handler latency metrics
+"""
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from app.metrics import HANDLER_ERRORS, HANDLER_SECONDS
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Records how long each handler takes, labelled by the handler's name
+
+    Registered as an inner middleware, so it only runs for updates that
+    matched a handler and ``data["handler"]`` is known.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.labels(name).inc()
+            raise
+        finally:
+            HANDLER_SECONDS.labels(name).observe(time.perf_counter() - started)
@@ -0,0 +1,214 @@
+"""
+Per-user token-bucket throttling for messages that reach Gemini
+"""
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message
+
+from app.metrics import THROTTLED
+from app.utils.db import is_postgres, placeholder
+from app.utils.ttl_cache import TTLCache
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _check_bucket(capacity: float, refill_rate: float) -> None:
+    """Reject settings that would leave a bucket empty forever (or divide by zero)"""
+    if capacity <= 0:
+        raise ValueError(f"Throttle capacity must be positive, got {capacity}")
+    if refill_rate <= 0:
+        raise ValueError(
+            f"Throttle refill rate must be positive, got {refill_rate} "
+            f"(set THROTTLE_ENABLED=false to turn throttling off)"
+        )
+
+
+class MemoryTokenBucket:
+    """
+    Token buckets kept in this process
+
+    A bucket idle for ``capacity / refill_rate`` seconds is full again, so
+    that is also how long its state is kept.
+    """
+
+    def __init__(
+        self,
+        capacity: float,
+        refill_rate: float,
+        max_entries: int = 100_000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        _check_bucket(capacity, refill_rate)
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.clock = clock
+        # key -> [tokens, refilled_at]
+        self._buckets = TTLCache(max_entries, ttl=capacity / refill_rate)
+
+    async def consume(self, key: int, cost: float) -> Tuple[bool, float]:
+        """
+        Take ``cost`` tokens from the bucket of ``key``
+
+        Args:
+            key: Bucket key (Telegram user ID)
+            cost: Tokens to take
+
+        Returns:
+            Tuple of (allowed, seconds until enough tokens are available)
+        """
+        now = self.clock()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [self.capacity, now]
+        else:
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill_rate)
+            bucket[1] = now
+        self._buckets.set(key, bucket)
+
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            return True, 0.0
+        return False, (cost - bucket[0]) / self.refill_rate
+
+
+class DatabaseTokenBucket:
+    """
+    Token buckets in the ``throttle_buckets`` table, shared by all processes
+
+    Refill and consume happen in one ``INSERT ... ON CONFLICT DO UPDATE
+    ... RETURNING`` statement, so concurrent processes cannot both spend
+    the same tokens. Works on PostgreSQL and on SQLite (tests).
+    """
+
+    def __init__(
+        self,
+        capacity: float,
+        refill_rate: float,
+        clock: Callable[[], float] = time.time,
+    ):
+        _check_bucket(capacity, refill_rate)
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.clock = clock
+
+    async def consume(self, key: int, cost: float) -> Tuple[bool, float]:
+        """
+        Take ``cost`` tokens from the bucket of ``key``
+
+        Args:
+            key: Bucket key (Telegram user ID)
+            cost: Tokens to take
+
+        Returns:
+            Tuple of (allowed, seconds until enough tokens are available)
+        """
+        from tortoise import Tortoise
+
+        connection = Tortoise.get_connection("default")
+        key_p, cost_p, capacity_p, now_p, rate_p, tokens_p, allowed_p = (
+            placeholder(connection, index) for index in range(1, 8)
+        )
+        least = "LEAST" if is_postgres(connection) else "MIN"
+        # Tokens in the stored bucket after refilling it up to now
+        refilled = (
+            f'{least}({capacity_p}, "throttle_buckets"."tokens" '
+            f'+ ({now_p} - "throttle_buckets"."refilled_at") * {rate_p})'
+        )
+
+        # A new bucket starts full
+        allowed = self.capacity >= cost
+        _, rows = await connection.execute_query(
+            f'INSERT INTO "throttle_buckets" ("key", "tokens", "refilled_at", "allowed") '
+            f'VALUES ({key_p}, {tokens_p}, {now_p}, {allowed_p}) '
+            f'ON CONFLICT ("key") DO UPDATE SET '
+            f'"tokens" = CASE WHEN {refilled} >= {cost_p} THEN {refilled} - {cost_p} ELSE {refilled} END, '
+            f'"allowed" = {refilled} >= {cost_p}, '
+            f'"refilled_at" = {now_p} '
+            f'RETURNING "tokens", "allowed"',
+            [
+                key, float(cost), float(self.capacity), self.clock(), self.refill_rate,
+                float(self.capacity - cost if allowed else self.capacity), allowed,
+            ],
+        )
+        tokens, granted = rows[0]["tokens"], bool(rows[0]["allowed"])
+
+        if granted:
+            return True, 0.0
+        return False, (cost - tokens) / self.refill_rate
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Drops voice and text messages from users who exceed their budget
+
+    Voice notes cost more than text because they take longer to transcribe.
+    Commands are free. A throttled user gets at most one notice a minute;
+    other throttled messages are dropped silently.
+    """
+
+    def __init__(self, bucket, voice_cost: float, text_cost: float):
+        self.bucket = bucket
+        self.voice_cost = voice_cost
+        self.text_cost = text_cost
+        # Users told about the limit within the last minute
+        self._notified = TTLCache(100_000, ttl=60)
+        self.throttled = 0
+
+    def _cost(self, message: Message) -> float:
+        if message.voice is not None:
+            return self.voice_cost
+        if message.text and not message.text.startswith("/"):
+            return self.text_cost
+        return 0.0
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: Dict[str, Any],
+    ) -> Any:
+        cost = self._cost(event)
+        if not cost or event.from_user is None:
+            return await handler(event, data)
+
+        user_id = event.from_user.id
+        try:
+            allowed, retry_after = await self.bucket.consume(user_id, cost)
+        except Exception as e:
+            # Throttling must never take the bot down with it
+            logger.error(f"Throttle backend failed, letting message through: {e}")
+            return await handler(event, data)
+
+        if allowed:
+            return await handler(event, data)
+
+        self.throttled += 1
+        THROTTLED.inc()
+        if self._notified.get(user_id) is None:
+            self._notified.set(user_id, True)
+            await event.answer(
+                f"⏳ Juda tez yuboryapsiz. "
+                f"Iltimos, {max(1, round(retry_after))} soniyadan keyin qayta urinib ko'ring."
+            )
+        return None
+
+
+def create_throttling_middleware() -> Optional[ThrottlingMiddleware]:
+    """Build the middleware from settings (None when throttling is disabled)"""
+    if not settings.throttle_enabled:
+        return None
+
+    if settings.throttle_backend == "database":
+        bucket = DatabaseTokenBucket(settings.throttle_capacity, settings.throttle_refill_rate)
+    else:
+        bucket = MemoryTokenBucket(settings.throttle_capacity, settings.throttle_refill_rate)
+
+    return ThrottlingMiddleware(
+        bucket,
+        voice_cost=settings.throttle_voice_cost,
+        text_cost=settings.throttle_text_cost,
+    )
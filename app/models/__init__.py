@@ -2,5 +2,10 @@
 Database models
 """
 from .user import User
+from .cache_entry import CacheEntry
+from .transaction import Transaction
+from .rollup import TransactionRollup
+from .throttle_bucket import ThrottleBucket
+from .queued_job import QueuedJob
 
-__all__ = ["User"]
+__all__ = ["User", "CacheEntry", "Transaction", "TransactionRollup", "ThrottleBucket", "QueuedJob"]
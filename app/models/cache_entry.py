@@ -0,0 +1,20 @@
+"""
+Persistent extraction cache entries
+"""
+from tortoise import fields
+from tortoise.models import Model
+
+
+class CacheEntry(Model):
+    """Cached extraction result that survives bot restarts"""
+
+    key = fields.CharField(max_length=128, pk=True)
+    value = fields.JSONField()
+    expires_at = fields.DatetimeField(index=True)
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "extraction_cache"
+
+    def __str__(self):
+        return f"CacheEntry(key={self.key})"
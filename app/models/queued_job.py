@@ -0,0 +1,31 @@
+"""
+Durable background jobs shared by all bot and worker processes
+"""
+from tortoise import fields
+from tortoise.models import Model
+
+
+class QueuedJob(Model):
+    """Voice or text job waiting for (or leased by) a worker"""
+
+    id = fields.BigIntField(pk=True)
+    kind = fields.CharField(max_length=32)
+    # Telegram user the job belongs to
+    user_id = fields.BigIntField()
+    payload = fields.JSONField()
+    # queued, running or dead (finished jobs are deleted)
+    status = fields.CharField(max_length=16, default="queued")
+    attempts = fields.IntField(default=0)
+    max_attempts = fields.IntField()
+    # Unix time the job may be claimed: retry time when queued, lease end when running
+    available_at = fields.FloatField()
+    locked_by = fields.CharField(max_length=64, null=True)
+    last_error = fields.TextField(null=True)
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "job_queue"
+        indexes = (("status", "available_at"),)
+
+    def __str__(self):
+        return f"QueuedJob(id={self.id}, {self.kind}, {self.status}, attempt {self.attempts})"
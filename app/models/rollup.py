@@ -0,0 +1,34 @@
+"""
+Per-user transaction totals maintained alongside every write
+"""
+from tortoise import fields
+from tortoise.models import Model
+
+
+class TransactionRollup(Model):
+    """Sum and count of a user's transactions for one period/category/type/currency"""
+    
+    id = fields.BigIntField(pk=True)
+    user = fields.ForeignKeyField(
+        "models.User", related_name="rollups", on_delete=fields.CASCADE
+    )
+    # "day", "week" (starts on Monday) or "month"
+    period = fields.CharField(max_length=8)
+    period_start = fields.DateField()
+    category = fields.CharField(max_length=64)
+    type = fields.CharField(max_length=16)
+    # Amounts in different currencies are never added together
+    currency = fields.CharField(max_length=3, default="UZS")
+    total = fields.DecimalField(max_digits=18, decimal_places=2, default=0)
+    count = fields.IntField(default=0)
+    updated_at = fields.DatetimeField(auto_now=True)
+    
+    class Meta:
+        table = "transaction_rollups"
+        unique_together = (("user_id", "period", "period_start", "category", "type", "currency"),)
+    
+    def __str__(self):
+        return (
+            f"TransactionRollup(user_id={self.user_id}, {self.period} {self.period_start} "
+            f"{self.type} {self.category} = {self.total} {self.currency})"
+        )
@@ -0,0 +1,22 @@
+"""
+Shared token-bucket state for per-user throttling
+"""
+from tortoise import fields
+from tortoise.models import Model
+
+
+class ThrottleBucket(Model):
+    """Token bucket of one user, shared by all bot processes"""
+
+    key = fields.BigIntField(pk=True, generated=False)
+    tokens = fields.FloatField()
+    # Unix time of the last refill (client clock, seconds)
+    refilled_at = fields.FloatField()
+    # Whether the last consume was granted
+    allowed = fields.BooleanField(default=True)
+
+    class Meta:
+        table = "throttle_buckets"
+
+    def __str__(self):
+        return f"ThrottleBucket(key={self.key}, tokens={self.tokens:.2f})"
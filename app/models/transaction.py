@@ -0,0 +1,31 @@
+"""
+Transaction model for extracted financial records
+"""
+from tortoise import fields
+from tortoise.models import Model
+
+
+class Transaction(Model):
+    """Financial record extracted from a voice or text message"""
+    
+    id = fields.BigIntField(pk=True)
+    user = fields.ForeignKeyField(
+        "models.User", related_name="transactions", on_delete=fields.CASCADE
+    )
+    type = fields.CharField(max_length=16)
+    amount = fields.DecimalField(max_digits=18, decimal_places=2)
+    # ISO code ("UZS", "USD", ...)
+    currency = fields.CharField(max_length=3, default="UZS")
+    category = fields.CharField(max_length=64)
+    description = fields.TextField(null=True)
+    date = fields.DateField()
+    transcript = fields.TextField(null=True)
+    source = fields.CharField(max_length=16)
+    created_at = fields.DatetimeField(auto_now_add=True)
+    
+    class Meta:
+        table = "transactions"
+        indexes = (("user_id", "date"),)
+    
+    def __str__(self):
+        return f"Transaction(user_id={self.user_id}, {self.type} {self.amount} {self.currency} {self.category})"
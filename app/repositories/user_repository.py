@@ -0,0 +1,128 @@
+"""
+User repository: single-statement upserts and cached lookups
+"""
+import logging
+from typing import Optional, Tuple
+
+from tortoise import Tortoise
+
+from app.models import User
+from app.utils.db import is_postgres, placeholder
+from app.utils.ttl_cache import TTLCache
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FIELDS = ("username", "first_name", "last_name")
+
+
+class UserRepository:
+    """
+    Data access for ``User`` with a bounded TTL cache in front
+
+    ``upsert`` is one ``INSERT ... ON CONFLICT DO UPDATE`` that only
+    touches the row when profile fields changed; if the cached profile
+    already matches, no query is made at all.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self._cache = TTLCache(max_entries, ttl)
+
+    def invalidate(self, telegram_id: int) -> None:
+        """Drop a cached user"""
+        self._cache.pop(telegram_id)
+
+    def clear(self) -> None:
+        """Drop all cached users"""
+        self._cache.clear()
+
+    async def get_by_telegram_id(self, telegram_id: int) -> Optional[User]:
+        """
+        Get a user by Telegram ID
+
+        Args:
+            telegram_id: Telegram user ID
+
+        Returns:
+            User or None if not registered
+        """
+        user = self._cache.get(telegram_id)
+        if user is not None:
+            return user
+
+        user = await User.get_or_none(telegram_id=telegram_id)
+        if user is not None:
+            self._cache.set(telegram_id, user)
+        return user
+
+    async def upsert(
+        self,
+        telegram_id: int,
+        username: Optional[str],
+        first_name: Optional[str],
+        last_name: Optional[str],
+    ) -> Tuple[User, bool]:
+        """
+        Create the user or update changed profile fields
+
+        Args:
+            telegram_id: Telegram user ID
+            username: Telegram username
+            first_name: First name
+            last_name: Last name
+
+        Returns:
+            Tuple of (user, written) where written is False if nothing changed
+        """
+        profile = (username, first_name, last_name)
+
+        cached = self._cache.get(telegram_id)
+        if cached is not None and tuple(getattr(cached, f) for f in PROFILE_FIELDS) == profile:
+            return cached, False
+
+        connection = Tortoise.get_connection("default")
+        distinct = "IS DISTINCT FROM" if is_postgres(connection) else "IS NOT"
+        columns = ", ".join(f'"{f}"' for f in ("telegram_id", *PROFILE_FIELDS))
+        markers = ", ".join(placeholder(connection, i) for i in range(1, len(PROFILE_FIELDS) + 2))
+        updates = ", ".join(f'"{f}" = EXCLUDED."{f}"' for f in PROFILE_FIELDS)
+        changed = " OR ".join(f'"users"."{f}" {distinct} EXCLUDED."{f}"' for f in PROFILE_FIELDS)
+
+        upsert = (
+            f'INSERT INTO "users" ({columns}) '
+            f"VALUES ({markers}) "
+            f'ON CONFLICT ("telegram_id") DO UPDATE SET {updates}, "updated_at" = CURRENT_TIMESTAMP '
+            f"WHERE {changed} "
+            f"RETURNING *"
+        )
+        if is_postgres(connection):
+            # The unchanged row comes back from the same statement
+            sql = (
+                f"WITH upserted AS ({upsert}) "
+                f'SELECT *, TRUE AS "written" FROM upserted '
+                f"UNION ALL "
+                f'SELECT *, FALSE AS "written" FROM "users" '
+                f'WHERE "telegram_id" = $1 AND NOT EXISTS (SELECT 1 FROM upserted)'
+            )
+        else:
+            sql = upsert
+        _, rows = await connection.execute_query(sql, [telegram_id, *profile])
+
+        if rows:
+            row = dict(rows[0])
+            written = row.pop("written", True)
+            user = User._init_from_db(**row)
+        else:
+            # SQLite: row exists and nothing changed
+            user = await User.get(telegram_id=telegram_id)
+            written = False
+
+        # Upsert invalidates the cached copy
+        self._cache.set(telegram_id, user)
+        return user, written
+
+
+# Global repository instance
+user_repository = UserRepository(
+    max_entries=settings.user_cache_max_entries,
+    ttl=settings.user_cache_ttl,
+)
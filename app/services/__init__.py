@@ -1,6 +1,42 @@
 """
 Services module
 """
-from .gemini_service import gemini_service
+from .gemini_provider import get_gemini_service, set_gemini_service
+from .extraction_cache import ExtractionCache, extraction_cache
+from .extraction_batcher import ExtractionBatcher, extraction_batcher
+from .export import ExportService, export_service
+from .financial_record import FinancialRecord, render_record
+from .job_queue import DurableJobQueue, PermanentJobError, job_queue
+from .local_parser import LocalFinancialParser, local_parser
+from .processing_queue import ProcessingQueue, QueueFullError, processing_queue
+from .rollups import RollupService, rollup_service
+from .transaction_buffer import TransactionBuffer, transaction_buffer
+from .voice_downloader import VoiceDownloader, VoiceTooLargeError, voice_downloader
 
-__all__ = ["gemini_service"]
+__all__ = [
+    "get_gemini_service",
+    "set_gemini_service",
+    "ExtractionCache",
+    "extraction_cache",
+    "ExtractionBatcher",
+    "extraction_batcher",
+    "ExportService",
+    "export_service",
+    "FinancialRecord",
+    "render_record",
+    "DurableJobQueue",
+    "PermanentJobError",
+    "job_queue",
+    "LocalFinancialParser",
+    "local_parser",
+    "ProcessingQueue",
+    "QueueFullError",
+    "processing_queue",
+    "RollupService",
+    "rollup_service",
+    "TransactionBuffer",
+    "transaction_buffer",
+    "VoiceDownloader",
+    "VoiceTooLargeError",
+    "voice_downloader",
+]
@@ -0,0 +1,320 @@
+"""
+Streaming export of a user's transactions (CSV or XLSX)
+
+Rows are read with a server-side cursor (PostgreSQL) or ``fetchmany``
+(SQLite) ``chunk_size`` at a time and encoded straight into a temporary
+file, so memory stays flat however long the history is.
+"""
+import asyncio
+import codecs
+import csv
+import io
+import logging
+import os
+import re
+import tempfile
+import zipfile
+from datetime import date
+from decimal import Decimal
+from typing import Any, AsyncIterator, BinaryIO, Iterable, List, Optional, Sequence, Tuple
+
+from app.metrics import CallbackMetric
+from app.utils.db import adapt_value, is_postgres, placeholder
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# (column, header) in file order
+EXPORT_COLUMNS = (
+    ("date", "Sana"),
+    ("type", "Turi"),
+    ("amount", "Miqdor"),
+    ("currency", "Valyuta"),
+    ("category", "Kategoriya"),
+    ("description", "Tavsif"),
+    ("source", "Manba"),
+)
+DATE_COLUMN = 0
+AMOUNT_COLUMN = 2
+
+_CENTS = Decimal("0.01")
+
+
+class CsvEncoder:
+    """CSV in UTF-8 with a BOM (Excel then reads Uzbek/Cyrillic text correctly)"""
+
+    extension = "csv"
+
+    def __init__(self, file: BinaryIO):
+        self._file = file
+        self._text = io.StringIO()
+        self._writer = csv.writer(self._text)
+        file.write(codecs.BOM_UTF8)
+        self.write_rows([[header for _, header in EXPORT_COLUMNS]])
+
+    def write_rows(self, rows: Iterable[Sequence[Any]]) -> None:
+        self._writer.writerows(rows)
+        self._file.write(self._text.getvalue().encode("utf-8"))
+        self._text.seek(0)
+        self._text.truncate()
+
+    def close(self) -> None:
+        pass
+
+
+# XML 1.0 does not allow most control characters, even escaped
+_XML_INVALID = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+_EXCEL_EPOCH = date(1899, 12, 30)
+
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Tranzaksiyalar" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    # Style 1: date (built-in format 14), style 2: amount with two decimals (format 4)
+    "xl/styles.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+        '<borders count="1"><border/></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="3">'
+        '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        '<xf numFmtId="4" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        '</cellXfs>'
+        '</styleSheet>'
+    ),
+}
+
+_SHEET_HEAD = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_TAIL = b"</sheetData></worksheet>"
+
+
+def _text_cell(value: Any) -> str:
+    if value is None:
+        return "<c/>"
+    text = _XML_INVALID.sub("", str(value)).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+class XlsxEncoder:
+    """
+    Single-sheet XLSX written as it goes
+
+    Cells are inline strings, so no shared-string table has to be kept in
+    memory; dates are real Excel dates and amounts numbers.
+    """
+
+    extension = "xlsx"
+
+    def __init__(self, file: BinaryIO):
+        self._zip = zipfile.ZipFile(file, "w", zipfile.ZIP_DEFLATED)
+        self._sheet = self._zip.open("xl/worksheets/sheet1.xml", "w", force_zip64=True)
+        self._sheet.write(_SHEET_HEAD)
+        header = "".join(_text_cell(header) for _, header in EXPORT_COLUMNS)
+        self._sheet.write(f"<row>{header}</row>".encode("utf-8"))
+
+    def write_rows(self, rows: Iterable[Sequence[Any]]) -> None:
+        parts = []
+        for row in rows:
+            cells = []
+            for index, value in enumerate(row):
+                if value is None:
+                    cells.append("<c/>")
+                elif index == DATE_COLUMN:
+                    day = value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+                    cells.append(f'<c s="1"><v>{(day - _EXCEL_EPOCH).days}</v></c>')
+                elif index == AMOUNT_COLUMN:
+                    cells.append(f'<c s="2"><v>{value}</v></c>')
+                else:
+                    cells.append(_text_cell(value))
+            parts.append(f"<row>{''.join(cells)}</row>")
+        self._sheet.write("".join(parts).encode("utf-8"))
+
+    def close(self) -> None:
+        self._sheet.write(_SHEET_TAIL)
+        self._sheet.close()
+        for name, content in _XLSX_PARTS.items():
+            self._zip.writestr(name, content)
+        self._zip.close()
+
+
+ENCODERS = {encoder.extension: encoder for encoder in (CsvEncoder, XlsxEncoder)}
+
+
+class ExportService:
+    """Writes a user's transactions to a file without loading them all"""
+
+    def __init__(self, chunk_size: int, max_concurrent: int):
+        self.chunk_size = chunk_size
+        # Each export holds a database connection while it runs
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self.exports = 0
+        self.rows = 0
+
+    @staticmethod
+    def _connection():
+        from tortoise import Tortoise
+
+        return Tortoise.get_connection("default")
+
+    def _query(self, connection, user_id: int, start: Optional[date], end: Optional[date],
+               category: Optional[str]) -> Tuple[str, List[Any]]:
+        columns = ", ".join(f'"{column}"' for column, _ in EXPORT_COLUMNS)
+        conditions = [f'"user_id" = {placeholder(connection, 1)}']
+        params: List[Any] = [user_id]
+        for condition, value in (
+            ('"date" >= {}', start),
+            ('"date" <= {}', end),
+            ('LOWER("category") = {}', category.lower() if category else None),
+        ):
+            if value is not None:
+                params.append(adapt_value(connection, value))
+                conditions.append(condition.format(placeholder(connection, len(params))))
+        sql = (
+            f'SELECT {columns} FROM "transactions" WHERE {" AND ".join(conditions)} '
+            f'ORDER BY "date", "id"'
+        )
+        return sql, params
+
+    async def iter_rows(
+        self,
+        user_id: int,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        category: Optional[str] = None,
+    ) -> AsyncIterator[List[tuple]]:
+        """
+        Yield the user's transactions in chunks of ``chunk_size`` rows
+
+        Args:
+            user_id: Internal user ID (users.id)
+            start: First date to include
+            end: Last date to include
+            category: Only this category (case-insensitive)
+        """
+        connection = self._connection()
+        sql, params = self._query(connection, user_id, start, end, category)
+        async with connection.acquire_connection() as raw:
+            if is_postgres(connection):
+                # Server-side cursors only live inside a transaction
+                async with raw.transaction():
+                    chunk = []
+                    async for record in raw.cursor(sql, *params, prefetch=self.chunk_size):
+                        chunk.append(tuple(record))
+                        if len(chunk) == self.chunk_size:
+                            yield chunk
+                            chunk = []
+                    if chunk:
+                        yield chunk
+            else:
+                async with raw.execute(sql, params) as cursor:
+                    # Plain tuples instead of Tortoise's sqlite3.Row
+                    cursor.row_factory = None
+                    while True:
+                        chunk = await cursor.fetchmany(self.chunk_size)
+                        if not chunk:
+                            break
+                        # SQLite keeps decimals as text in shortest form ("2E+4")
+                        yield [
+                            (day, tx_type, Decimal(amount).quantize(_CENTS), *rest)
+                            for day, tx_type, amount, *rest in chunk
+                        ]
+
+    async def write(self, file: BinaryIO, fmt: str, user_id: int, **filters) -> int:
+        """
+        Encode the user's transactions into ``file``
+
+        Returns:
+            Number of rows written
+        """
+        encoder = ENCODERS[fmt](file)
+        count = 0
+        async for chunk in self.iter_rows(user_id, **filters):
+            # Encoding and disk writes stay off the event loop
+            await asyncio.to_thread(encoder.write_rows, chunk)
+            count += len(chunk)
+        await asyncio.to_thread(encoder.close)
+        return count
+
+    async def export_to_file(self, fmt: str, user_id: int, **filters) -> Tuple[str, int]:
+        """
+        Write an export to a temporary file (the caller deletes it)
+
+        Args:
+            fmt: "csv" or "xlsx"
+            user_id: Internal user ID (users.id)
+            **filters: start, end and category, as for ``iter_rows``
+
+        Returns:
+            Tuple of (file path, number of rows)
+        """
+        async with self._slots:
+            fd, path = tempfile.mkstemp(prefix="export-", suffix=f".{fmt}")
+            try:
+                with os.fdopen(fd, "wb") as file:
+                    count = await self.write(file, fmt, user_id, **filters)
+            except BaseException:
+                os.unlink(path)
+                raise
+        self.exports += 1
+        self.rows += count
+        logger.info(f"Exported {count} transactions of user {user_id} as {fmt}")
+        return path, count
+
+    def stats(self):
+        return {"exports": self.exports, "rows": self.rows}
+
+
+# Global export service instance
+export_service = ExportService(
+    chunk_size=settings.export_chunk_size,
+    max_concurrent=settings.export_max_concurrent,
+)
+
+CallbackMetric(
+    "finance_bot_exports_total", "Transaction exports and exported rows",
+    export_service.stats,
+    ["event"],
+    kind="counter",
+)
@@ -0,0 +1,140 @@
+"""
+Micro-batching of text extraction requests
+"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.metrics import CallbackMetric
+from app.services.gemini_provider import get_gemini_service
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionBatcher:
+    """
+    Sends texts that arrive together to Gemini as one request
+
+    Requests are collected until ``max_size`` are waiting or ``max_wait``
+    seconds passed since the first one, so the long instruction prompt is
+    sent once per batch. Each caller gets its own record back. Texts the
+    batch response has no usable element for (or all of them, if the
+    response is not a JSON array) are retried as single-item calls; an API
+    error after retries fails every caller of the batch.
+    """
+
+    def __init__(self, service=None, *, max_size: int, max_wait: float):
+        self._service = service
+        self.max_size = max_size
+        self.max_wait = max_wait
+
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Ishlayotgan batch vazifalari (GC ularni yo'qotib qo'ymasligi uchun)
+        self._tasks: set[asyncio.Task] = set()
+
+        self.batches = 0
+        self.batched_texts = 0
+        self.fallbacks = 0
+
+    @property
+    def service(self):
+        """Service the batches go to (the shared Gemini service unless one was given)"""
+        return self._service or get_gemini_service()
+
+    async def extract(self, text: str) -> Dict[str, Any]:
+        """
+        Extract financial data from text, batched with concurrent calls
+
+        Args:
+            text: Input text to analyze
+
+        Returns:
+            Dictionary with extracted financial data
+        """
+        if self.max_size <= 1:
+            return await self.service.extract_financial_data(text)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        """Start a request for everything collected so far"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        if len(batch) == 1:
+            await self._run_single(*batch[0])
+            return
+
+        self.batches += 1
+        self.batched_texts += len(batch)
+        try:
+            results = await self.service.extract_financial_data_batch([text for text, _ in batch])
+        except ValueError as e:
+            # Javob JSON massiv emas: har bir matn alohida so'raladi
+            logger.warning(f"Unusable batch response for {len(batch)} texts: {e}")
+            results = [None] * len(batch)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        singles = []
+        for (text, future), data in zip(batch, results):
+            if data is None:
+                self.fallbacks += 1
+                singles.append(self._run_single(text, future))
+            elif not future.done():
+                future.set_result(data)
+        if singles:
+            await asyncio.gather(*singles)
+
+    async def _run_single(self, text: str, future: asyncio.Future) -> None:
+        try:
+            data = await self.service.extract_financial_data(text)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(data)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "batches": self.batches,
+            "batched_texts": self.batched_texts,
+            "fallbacks": self.fallbacks,
+        }
+
+
+# Global batcher instance
+extraction_batcher = ExtractionBatcher(
+    max_size=settings.gemini_batch_max_size,
+    max_wait=settings.gemini_batch_max_wait,
+)
+
+CallbackMetric(
+    "finance_bot_extraction_batch_total",
+    "Batched text extraction: requests, texts in them and single-call fallbacks",
+    extraction_batcher.stats,
+    ["event"],
+    kind="counter",
+)
@@ -0,0 +1,196 @@
+"""
+Content-addressed cache for financial data extraction results
+"""
+import asyncio
+import hashlib
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.metrics import CallbackMetric
+from app.utils.text import normalize_text
+from app.utils.ttl_cache import TTLCache
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionCache:
+    """
+    Bounded in-memory cache with TTL and LRU eviction
+
+    Identical requests that arrive while the first one is still running
+    share its result instead of calling Gemini again. An optional
+    Postgres tier (``CacheEntry``) keeps results across restarts.
+    """
+
+    def __init__(self, max_entries: int, ttl: int, persistent: bool = False):
+        self.ttl = ttl
+        self.persistent = persistent
+
+        self._entries = TTLCache(max_entries, ttl)
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def text_key(text: str, day: Optional[date] = None) -> str:
+        """
+        Cache key for a text message
+
+        The date is part of the key: "bugun" or "kecha" resolve to a
+        different day tomorrow, so yesterday's result must not be replayed.
+
+        Args:
+            text: Message text
+            day: Date the message is read against (defaults to today)
+        """
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"text:{(day or date.today()).isoformat()}:{digest}"
+
+    @staticmethod
+    def voice_key(file_unique_id: str, day: Optional[date] = None) -> str:
+        """
+        Cache key for a voice note
+
+        Dated like ``text_key``: a note forwarded or sent again another day
+        must not get the day it was first resolved against.
+
+        Args:
+            file_unique_id: Telegram's file_unique_id
+            day: Date the note is read against (defaults to today)
+        """
+        return f"voice:{(day or date.today()).isoformat()}:{file_unique_id}"
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters"""
+        return {
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self._entries.evictions,
+            "size": len(self._entries),
+        }
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return a fresh in-memory value or None"""
+        return self._entries.get(key)
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a value in the in-memory tier"""
+        self._entries.set(key, value)
+
+    def clear(self) -> None:
+        """Drop all in-memory entries"""
+        self._entries.clear()
+
+    async def _load_persistent(self, key: str) -> Optional[Any]:
+        """Read a value from the Postgres tier"""
+        from app.models import CacheEntry
+
+        try:
+            entry = await CacheEntry.filter(
+                key=key, expires_at__gt=datetime.now(timezone.utc)
+            ).first()
+        except Exception as e:
+            logger.warning(f"Could not read persistent cache: {e}")
+            return None
+        return entry.value if entry else None
+
+    async def _store_persistent(self, key: str, value: Any) -> None:
+        """Write a value to the Postgres tier"""
+        from app.models import CacheEntry
+
+        try:
+            await CacheEntry.update_or_create(
+                key=key,
+                defaults={
+                    "value": value,
+                    "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.ttl),
+                }
+            )
+        except Exception as e:
+            logger.warning(f"Could not write persistent cache: {e}")
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the cached value for key, computing it at most once
+
+        Args:
+            key: Cache key (see text_key / voice_key)
+            compute: Coroutine factory producing the value on a miss
+
+        Returns:
+            Cached or freshly computed value
+        """
+        while True:
+            value = self.get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+
+            # Bir xil so'rov allaqachon bajarilayotgan bo'lsa, natijasini kutamiz
+            pending = self._in_flight.get(key)
+            if pending is None:
+                break
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # Only our own cancellation propagates; if the leader was
+                # cancelled, look again (and compute if nobody else does)
+                if not pending.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            value = await self._load_persistent(key) if self.persistent else None
+            if value is not None:
+                self.persistent_hits += 1
+            else:
+                self.misses += 1
+                value = await compute()
+                if self.persistent:
+                    await self._store_persistent(key, value)
+
+            self.set(key, value)
+            future.set_result(value)
+            return value
+
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+        except Exception as e:
+            future.set_exception(e)
+            # Kutayotganlar bo'lmasa, "exception was never retrieved" ogohlantirishini oldini olish
+            future.exception()
+            raise
+
+        finally:
+            del self._in_flight[key]
+
+
+# Global cache instance
+extraction_cache = ExtractionCache(
+    max_entries=settings.extraction_cache_max_entries,
+    ttl=settings.extraction_cache_ttl,
+    persistent=settings.extraction_cache_persistent,
+)
+
+CallbackMetric(
+    "finance_bot_extraction_cache_events_total",
+    "Extraction cache lookups by outcome",
+    lambda: {event: value for event, value in extraction_cache.stats().items() if event != "size"},
+    ["event"],
+    kind="counter",
+)
+CallbackMetric(
+    "finance_bot_extraction_cache_entries", "Entries in the in-memory extraction cache",
+    lambda: extraction_cache.stats()["size"],
+)
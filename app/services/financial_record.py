@@ -0,0 +1,237 @@
+"""
+Typed financial record: normalization of extraction results and reply rendering
+"""
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+from json.encoder import encode_basestring
+from typing import Any, Dict, Optional, Union
+
+from app.services.local_parser import local_parser
+
+DEFAULT_CURRENCY = "UZS"
+
+# Currency words and symbols -> ISO code
+_CURRENCIES = {
+    "uzs": "UZS", "so'm": "UZS", "som": "UZS", "sum": "UZS", "сум": "UZS", "сўм": "UZS",
+    "usd": "USD", "$": "USD", "dollar": "USD", "dollor": "USD",
+    "eur": "EUR", "€": "EUR", "euro": "EUR", "evro": "EUR", "yevro": "EUR",
+    "rub": "RUB", "₽": "RUB", "rubl": "RUB", "rubl'": "RUB",
+    "kzt": "KZT", "tenge": "KZT",
+}
+_CURRENCY_SYMBOLS = ("$", "€", "₽")
+
+_INCOME = {"income", "kirim", "daromad"}
+_RELATIVE_DAYS = {
+    "today": 0, "yesterday": -1, "tomorrow": 1,
+    "bugun": 0, "kecha": -1, "ertaga": 1,
+}
+_CENTS = Decimal("0.01")
+# Largest amount the DECIMAL(18,2) columns hold
+MAX_AMOUNT = Decimal("9999999999999999.99")
+
+
+def normalize_currency(value: Any) -> Optional[str]:
+    """ISO code for a currency word, symbol or code; None if unknown"""
+    if not isinstance(value, str):
+        return None
+    value = value.strip().lower()
+    if value.upper() in _CURRENCIES.values():
+        return value.upper()
+    return _CURRENCIES.get(value)
+
+
+def _currency_in(text: str) -> Optional[str]:
+    """Currency mentioned inside an amount string ("20 dollar", "$20")"""
+    for symbol in _CURRENCY_SYMBOLS:
+        if symbol in text:
+            return _CURRENCIES[symbol]
+    for word in text.lower().replace(".", " ").split():
+        currency = _CURRENCIES.get(word)
+        if currency is not None:
+            return currency
+    return None
+
+
+def normalize_amount(value: Any) -> Decimal:
+    """
+    Amount as a non-negative Decimal with two places
+
+    Numbers are taken as they are; strings may be plain ("20000",
+    "20 000") or spoken ("50 ming", "1.5 mln"). Anything else is 0,
+    including amounts too large to store ("1e30").
+    """
+    amount = Decimal(0)
+    if isinstance(value, bool):
+        pass
+    elif isinstance(value, (int, Decimal)):
+        amount = Decimal(value)
+    elif isinstance(value, float):
+        amount = Decimal(str(value))
+    elif isinstance(value, str):
+        try:
+            amount = Decimal(value.strip().replace(" ", ""))
+        except InvalidOperation:
+            parsed = local_parser.parse_amount(value)
+            if parsed is not None:
+                amount = Decimal(str(parsed))
+    if not amount.is_finite() or abs(amount) > MAX_AMOUNT:
+        return Decimal(0).quantize(_CENTS)
+    try:
+        return abs(amount).quantize(_CENTS)
+    except InvalidOperation:
+        return Decimal(0).quantize(_CENTS)
+
+
+def normalize_date(value: Any, today: Optional[date] = None) -> date:
+    """
+    Resolve a date: ISO ("2025-11-15"), "today"/"yesterday", "bugun",
+    "kecha", "o'tgan kuni"; anything else is today
+    """
+    today = today or date.today()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in _RELATIVE_DAYS:
+            return today + timedelta(days=_RELATIVE_DAYS[value])
+        try:
+            return date.fromisoformat(value[:10])
+        except ValueError:
+            pass
+        resolved = local_parser.parse_date(value, today)
+        if resolved is not None:
+            return resolved
+    return today
+
+
+class FinancialRecord:
+    """
+    One income or expense, normalized
+
+    Built from the loose dicts Gemini and the local parser return. Slotted,
+    so a record is a fraction of the size of the dict it replaces.
+    """
+
+    __slots__ = ("type", "amount", "currency", "category", "description", "date")
+
+    def __init__(
+        self,
+        type: str,
+        amount: Decimal,
+        currency: str = DEFAULT_CURRENCY,
+        category: str = "other",
+        description: Optional[str] = None,
+        date: Optional[date] = None,
+    ):
+        self.type = type
+        self.amount = amount
+        self.currency = currency
+        self.category = category
+        self.description = description
+        self.date = date
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], today: Optional[date] = None) -> "FinancialRecord":
+        """
+        Normalize an extraction result
+
+        Args:
+            data: Dict with type, amount, category, description, date and
+                optionally currency
+            today: Reference date for relative dates (defaults to today)
+        """
+        amount = data.get("amount")
+        currency = normalize_currency(data.get("currency"))
+        if currency is None and isinstance(amount, str):
+            currency = _currency_in(amount)
+
+        return cls(
+            type="income" if str(data.get("type")).strip().lower() in _INCOME else "expense",
+            amount=normalize_amount(amount),
+            currency=currency or DEFAULT_CURRENCY,
+            category=str(data.get("category") or "other").strip()[:64] or "other",
+            description=str(data["description"]) if data.get("description") else None,
+            date=normalize_date(data.get("date"), today),
+        )
+
+    @classmethod
+    def coerce(cls, value: Union["FinancialRecord", Dict[str, Any]]) -> "FinancialRecord":
+        """Return a record as is, or build one from a dict"""
+        return value if isinstance(value, cls) else cls.from_dict(value)
+
+    @property
+    def number(self) -> Union[int, float]:
+        """Amount as a JSON number (integer when whole)"""
+        if self.amount == self.amount.to_integral_value():
+            return int(self.amount)
+        return float(self.amount)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready dict"""
+        return {
+            "type": self.type,
+            "amount": self.number,
+            "currency": self.currency,
+            "category": self.category,
+            "description": self.description,
+            "date": self.date.isoformat(),
+        }
+
+    def to_json(self) -> str:
+        """
+        Pretty JSON (2-space indent, non-ASCII kept)
+
+        Same output as ``json.dumps(self.to_dict(), indent=2,
+        ensure_ascii=False)``, written out directly since the shape is fixed.
+        """
+        description = "null" if self.description is None else encode_basestring(self.description)
+        return (
+            "{\n"
+            f'  "type": "{self.type}",\n'
+            f'  "amount": {self.number!r},\n'
+            f'  "currency": {encode_basestring(self.currency)},\n'
+            f'  "category": {encode_basestring(self.category)},\n'
+            f'  "description": {description},\n'
+            f'  "date": "{self.date.isoformat()}"\n'
+            "}"
+        )
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, FinancialRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        return (
+            f"FinancialRecord({self.type} {self.amount} {self.currency} "
+            f"{self.category!r} {self.date})"
+        )
+
+
+def format_amount(amount: Decimal) -> str:
+    """150000 -> "150 000", 12.5 -> "12.50" """
+    if amount == amount.to_integral_value():
+        return f"{int(amount):,}".replace(",", " ")
+    return f"{amount:,.2f}".replace(",", " ")
+
+
+def render_record(record: FinancialRecord, transcript: Optional[str] = None) -> str:
+    """
+    Reply for an extracted record (Markdown), shared by the voice and text handlers
+
+    Args:
+        record: Normalized record
+        transcript: Voice transcript, shown first when given
+    """
+    header = f"📝 Transkripsiya:\n{transcript}\n\n" if transcript is not None else ""
+    return (
+        f"{header}"
+        f"💰 Moliyaviy ma'lumotlar (JSON):\n"
+        f"```json\n{record.to_json()}\n```\n\n"
+        f"📊 Tafsilotlar:\n"
+        f"• Turi: {record.type}\n"
+        f"• Miqdor: {format_amount(record.amount)} {record.currency}\n"
+        f"• Kategoriya: {record.category}\n"
+        f"• Tavsif: {record.description or 'N/A'}\n"
+        f"• Sana: {record.date.isoformat()}"
+    )
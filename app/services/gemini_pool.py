@@ -0,0 +1,174 @@
+"""
+Pool of Gemini clients (one per API key or project) with quota-aware routing
+"""
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SlidingWindow:
+    """Requests and tokens used in the last ``window`` seconds"""
+
+    def __init__(self, window: float, clock: Callable[[], float] = time.monotonic):
+        self.window = window
+        self.clock = clock
+        self._events: Deque[Tuple[float, int, int]] = deque()
+        self.requests = 0
+        self.tokens = 0
+
+    def add(self, requests: int = 0, tokens: int = 0) -> None:
+        self._events.append((self.clock(), requests, tokens))
+        self.requests += requests
+        self.tokens += tokens
+
+    def expire(self) -> None:
+        """Drop events older than the window"""
+        cutoff = self.clock() - self.window
+        while self._events and self._events[0][0] <= cutoff:
+            _, requests, tokens = self._events.popleft()
+            self.requests -= requests
+            self.tokens -= tokens
+
+
+def _retry_delay(error: BaseException) -> Optional[float]:
+    """``retryDelay`` ("30s") from a 429's RetryInfo details, if present"""
+    details = getattr(error, "details", None)
+    if isinstance(details, dict):
+        details = details.get("error", details).get("details")
+    for item in details if isinstance(details, list) else ():
+        delay = item.get("retryDelay") if isinstance(item, dict) else None
+        if isinstance(delay, str) and delay.endswith("s"):
+            try:
+                return float(delay[:-1])
+            except ValueError:
+                pass
+    return None
+
+
+class PooledClient:
+    """One client of the pool with its quota and usage"""
+
+    def __init__(self, name: str, client: Any, rpm: int, tpm: int, window: SlidingWindow):
+        self.name = name
+        self.client = client
+        self.rpm = rpm
+        self.tpm = tpm
+        self.usage = window
+        self.sidelined_until = 0.0
+
+        self.requests = 0
+        self.tokens = 0
+        self.throttled = 0
+
+    def headroom(self) -> float:
+        """Share of the tighter of the two quotas still free in the window (can go negative)"""
+        self.usage.expire()
+        free = [1.0]
+        if self.rpm:
+            free.append(1 - self.usage.requests / self.rpm)
+        if self.tpm:
+            free.append(1 - self.usage.tokens / self.tpm)
+        return min(free)
+
+    def record_usage(self, response) -> None:
+        """Count a response's tokens against this client's quota"""
+        usage = getattr(response, "usage_metadata", None)
+        tokens = getattr(usage, "total_token_count", None) or 0
+        if tokens:
+            self.usage.add(tokens=tokens)
+            self.tokens += tokens
+
+
+class ClientPool:
+    """
+    Spreads Gemini calls over several API keys or projects
+
+    Each client's requests and tokens are tracked in a sliding window of
+    ``window`` seconds against its ``rpm``/``tpm`` quota (0 = not limited),
+    and every call goes to the client with the most headroom left. A client
+    answering 429 is sidelined for the delay the API asks for, or
+    ``cooldown`` seconds, while the others carry the load. The pool never
+    waits: with every client sidelined, the one that comes back first is
+    used and retries are left to ``ResilientCaller``.
+    """
+
+    def __init__(
+        self,
+        clients: Sequence[Tuple[str, Any]],
+        rpm: int = 0,
+        tpm: int = 0,
+        window: float = 60.0,
+        cooldown: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if not clients:
+            raise ValueError("ClientPool needs at least one client")
+        self.cooldown = cooldown
+        self.clock = clock
+        self.clients: List[PooledClient] = [
+            PooledClient(name, client, rpm, tpm, SlidingWindow(window, clock)) for name, client in clients
+        ]
+        self._turn = 0
+
+    def acquire(self) -> PooledClient:
+        """Client for the next call (its request is counted right away)"""
+        now = self.clock()
+        available = [entry for entry in self.clients if entry.sidelined_until <= now]
+        if available:
+            # Equal headroom: take turns instead of always starting with the first key
+            self._turn = (self._turn + 1) % len(available)
+            rotated = available[self._turn:] + available[:self._turn]
+            entry = max(rotated, key=PooledClient.headroom)
+        else:
+            entry = min(self.clients, key=lambda entry: entry.sidelined_until)
+        entry.usage.add(requests=1)
+        entry.requests += 1
+        return entry
+
+    def report_error(self, entry: PooledClient, error: BaseException) -> None:
+        """Sideline a client that hit its quota (HTTP 429)"""
+        if getattr(error, "code", None) != 429:
+            return
+        delay = _retry_delay(error) or self.cooldown
+        entry.sidelined_until = self.clock() + delay
+        entry.throttled += 1
+        logger.warning(f"Gemini client {entry.name} rate limited, sidelined for {delay:.0f}s")
+
+    @contextmanager
+    def lease(self, pinned: Optional[PooledClient] = None) -> Iterator[PooledClient]:
+        """
+        Use a client for one call, reporting a 429 if the call raises it
+
+        Args:
+            pinned: Client to use instead of picking one (e.g. the one an
+                audio file was uploaded with; files belong to one key)
+        """
+        entry = pinned or self.acquire()
+        if pinned is not None:
+            entry.usage.add(requests=1)
+            entry.requests += 1
+        try:
+            yield entry
+        except Exception as e:
+            self.report_error(entry, e)
+            raise
+
+    def stats(self) -> Dict[Tuple[str, str], int]:
+        """Per client and counter, for metrics"""
+        stats = {}
+        for entry in self.clients:
+            stats[(entry.name, "requests")] = entry.requests
+            stats[(entry.name, "tokens")] = entry.tokens
+            stats[(entry.name, "throttled")] = entry.throttled
+        return stats
+
+
+def client_name(credential: str) -> str:
+    """Label for a key or project that does not leak the key"""
+    if credential.startswith("vertex:"):
+        return credential
+    return f"key-…{credential[-4:]}"
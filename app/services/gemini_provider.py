@@ -0,0 +1,49 @@
+"""
+Lazy access to the Gemini service
+
+Importing ``google.genai`` takes over a second and most processes never need
+it: migrations and tooling don't, and neither do commands or the texts the
+local parser answers. The SDK is imported and the client built on the first
+call of ``get_gemini_service()``.
+"""
+from typing import TYPE_CHECKING, Optional
+
+from app.metrics import CallbackMetric
+
+if TYPE_CHECKING:
+    from app.services.gemini_service import GeminiService
+
+_service: Optional["GeminiService"] = None
+
+
+def get_gemini_service(create: bool = True) -> Optional["GeminiService"]:
+    """
+    Shared GeminiService, built on first use
+
+    Args:
+        create: Build the service if it does not exist yet; with False,
+            returns None instead (e.g. on shutdown)
+
+    Returns:
+        The process-wide GeminiService, or None
+    """
+    global _service
+    if _service is None and create:
+        from app.services.gemini_service import GeminiService
+
+        _service = GeminiService()
+    return _service
+
+
+def set_gemini_service(service: Optional["GeminiService"]) -> None:
+    """Replace the shared service (tests and benchmarks inject fakes here)"""
+    global _service
+    _service = service
+
+
+CallbackMetric(
+    "finance_bot_gemini_key_usage_total", "Gemini calls, tokens and 429s per API key or project",
+    lambda: _service.pool.stats() if _service is not None else {},
+    ["key", "event"],
+    kind="counter",
+)
@@ -1,17 +1,24 @@
 """
 Gemini API service for voice transcription and text processing
+
+Importing this module loads google.genai; use
+``app.services.get_gemini_service()`` to get the shared instance on demand.
 """
+import asyncio
+import io
 import json
 import logging
-from typing import Dict, Any
+from typing import Callable, Dict, Any, List, Optional
 
 import google.genai as genai
+from google.genai import types
+from app.metrics import record_usage, timed
+from app.services.gemini_pool import ClientPool, PooledClient, client_name
+from app.services.resilience import ResilientCaller
+from app.utils import ogg
 from config.settings import settings
 
 from google.genai.errors import APIError
-# Fayl boshqaruvi uchun kerakli kutubxonalar
-import tempfile
-import os
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +32,12 @@ logger = logging.getLogger(__name__)
 class GeminiService:
     """Service for working with Gemini API"""
     
+    # Prompt for plain transcription (single-shot and streaming)
+    TRANSCRIBE_PROMPT = (
+        "Generate a transcript of the speech. Return only the transcribed text "
+        "without any additional formatting or explanation."
+    )
+    
     # JSON template for financial data extraction
     FINANCIAL_DATA_TEMPLATE = {
         "type": "income/expense",
@@ -34,50 +47,204 @@ class GeminiService:
         "date": ""
     }
     
+    # Telegram voice notes are OGG/Opus
+    AUDIO_MIME_TYPE = "audio/ogg"
+    
+    # Schema of one extracted record
+    FINANCIAL_DATA_SCHEMA = types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "type": types.Schema(type=types.Type.STRING, enum=["income", "expense"]),
+            "amount": types.Schema(type=types.Type.NUMBER),
+            "currency": types.Schema(type=types.Type.STRING),
+            "category": types.Schema(type=types.Type.STRING),
+            "description": types.Schema(type=types.Type.STRING),
+            "date": types.Schema(type=types.Type.STRING),
+        },
+        required=["type", "amount", "category", "description", "date"],
+    )
+    
+    # Response schema for the single-call voice pipeline
+    VOICE_RESPONSE_SCHEMA = types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "transcript": types.Schema(type=types.Type.STRING),
+            "financial_data": FINANCIAL_DATA_SCHEMA,
+        },
+        required=["transcript", "financial_data"],
+    )
+    
+    # Response schema for batched text extraction (one element per input text)
+    BATCH_RESPONSE_SCHEMA = types.Schema(
+        type=types.Type.ARRAY,
+        items=types.Schema(
+            type=types.Type.OBJECT,
+            properties={
+                "index": types.Schema(type=types.Type.INTEGER),
+                "financial_data": FINANCIAL_DATA_SCHEMA,
+            },
+            required=["index", "financial_data"],
+        ),
+    )
+    
     def __init__(self):
-        # Client obyekti (Fayl operatsiyalari va kontent yaratish uchun)
-        self.client = genai.Client(api_key=settings.gemini_api_key)
+        # Har bir kalit/loyiha uchun bitta client; chaqiruvlar kvotasi ko'proq qolganiga boradi
+        self.pool = self._make_pool([
+            (client_name(credential), self._make_client(credential))
+            for credential in settings.gemini_credentials
+        ])
+        
+        # Har bir operatsiya uchun bir vaqtda bajariladigan so'rovlar chegarasi
+        self._upload_semaphore = asyncio.Semaphore(settings.gemini_upload_concurrency)
+        self._generate_semaphore = asyncio.Semaphore(settings.gemini_generate_concurrency)
+        self._delete_semaphore = asyncio.Semaphore(settings.gemini_delete_concurrency)
+        
+        # Fonda ishlayotgan vazifalar (GC ularni yo'qotib qo'ymasligi uchun)
+        self._background_tasks: set[asyncio.Task] = set()
+        
+        # Retries, per-model circuit breakers, fallback models and hedging
+        self.caller = ResilientCaller(
+            models=settings.gemini_models,
+            max_attempts=settings.gemini_max_attempts,
+            backoff_base=settings.gemini_backoff_base,
+            backoff_max=settings.gemini_backoff_max,
+            breaker_threshold=settings.gemini_breaker_threshold,
+            breaker_reset=settings.gemini_breaker_reset,
+            hedge_after=settings.gemini_hedge_after,
+        )
+    
+    @staticmethod
+    def _make_client(credential: str):
+        """Client for an API key, or for ``vertex:<project>[:<location>]`` (Vertex AI)"""
+        if credential.startswith("vertex:"):
+            _, project, *location = credential.split(":")
+            return genai.Client(vertexai=True, project=project, location=(location or ["us-central1"])[0])
+        return genai.Client(api_key=credential)
+    
+    @staticmethod
+    def _make_pool(clients) -> ClientPool:
+        return ClientPool(
+            clients,
+            rpm=settings.gemini_key_rpm,
+            tpm=settings.gemini_key_tpm,
+            cooldown=settings.gemini_key_cooldown,
+        )
+    
+    @property
+    def client(self):
+        """Client of the first credential (the pool's only one with a single key)"""
+        return self.pool.clients[0].client
+    
+    @client.setter
+    def client(self, client) -> None:
+        # Testlar va benchmarklar bitta soxta client qo'yadi
+        self.pool = self._make_pool([("default", client)])
+    
+    async def _upload_audio(self, audio_data: bytes):
+        """
+        Upload audio bytes from memory through the async Files API
+        
+        Returns:
+            Tuple of (file, pooled_client); the file can only be used and
+            deleted with the client that uploaded it
+        """
+        async def upload():
+            async with self._upload_semaphore:
+                with timed("upload"), self.pool.lease() as pooled:
+                    file = await pooled.client.aio.files.upload(
+                        file=io.BytesIO(audio_data),
+                        config=types.UploadFileConfig(mime_type=self.AUDIO_MIME_TYPE)
+                    )
+                    return file, pooled
+        
+        return await self.caller.retry(upload)
+    
+    async def _generate_content(self, contents, config=None, pinned: Optional[PooledClient] = None):
+        """
+        Run generate_content through the async client (with retries and fallback)
+        
+        Each attempt goes to the pool's client with the most quota left, or
+        to ``pinned`` when the contents reference a file it uploaded.
+        """
+        async def generate(model: str):
+            # Semaphore faqat so'rov davomida band (backoff paytida emas)
+            async with self._generate_semaphore:
+                with timed("generate_content"), self.pool.lease(pinned) as pooled:
+                    response = await pooled.client.aio.models.generate_content(
+                        model=model,
+                        contents=contents,
+                        config=config
+                    )
+                    pooled.record_usage(response)
+            record_usage(model, response)
+            return response
+        
+        return await self.caller.call(generate)
+    
+    async def _delete_file(self, name: str, pinned: Optional[PooledClient] = None) -> None:
+        """Delete an uploaded file through the async Files API"""
+        async def delete():
+            async with self._delete_semaphore:
+                with timed("delete"), self.pool.lease(pinned) as pooled:
+                    await pooled.client.aio.files.delete(name=name)
+        
+        try:
+            await self.caller.retry(delete)
+            logger.info("Uploaded file deleted from Gemini")
+        except Exception as e:
+            logger.warning(f"Could not delete file from Gemini: {e}")
+    
+    def _delete_file_in_background(self, name: str, pinned: Optional[PooledClient] = None) -> None:
+        """Schedule remote file deletion off the reply's critical path"""
+        task = asyncio.create_task(self._delete_file(name, pinned))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    async def _audio_part(self, audio_data: bytes):
+        """
+        Build the audio part of a generate_content request
+        
+        Short voice notes are sent inline as bytes; anything above
+        ``gemini_inline_audio_max_bytes`` goes through the Files API.
+        
+        Returns:
+            Tuple of (content_part, uploaded_file_name_or_None,
+            pooled_client_or_None); requests using an uploaded file must go
+            to the client that uploaded it
+        """
+        if len(audio_data) <= settings.gemini_inline_audio_max_bytes:
+            # The SDK needs bytes: the only copy of a downloaded memoryview
+            part = types.Part.from_bytes(data=bytes(audio_data), mime_type=self.AUDIO_MIME_TYPE)
+            return part, None, None
         
-       
+        # Fayl yuklash
+        logger.info(f"Uploading audio file ({len(audio_data)} bytes)")
+        audio_file, pooled = await self._upload_audio(audio_data)
+        logger.info(f"Audio file uploaded successfully: {audio_file.name}")
+        return audio_file, audio_file.name, pooled
+    
+    async def wait_background_tasks(self) -> None:
+        """Wait for pending background deletions (used on shutdown)"""
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
     
     async def transcribe_audio(self, audio_data: bytes) -> str:
         """
         Transcribe audio to text using Gemini API
         """
-        temp_file_path = None
-        audio_file = None 
+        uploaded_name = pinned = None
         try:
             logger.info("Audio transcription started")
             
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.ogg') as temp_file:
-                temp_file.write(audio_data)
-                temp_file_path = temp_file.name
-            
             try:
-                # Fayl yuklash
-                logger.info(f"Uploading audio file: {temp_file_path}")
-                audio_file = self.client.files.upload(file=temp_file_path)
-                logger.info(f"Audio file uploaded successfully: {audio_file.name}")
-                
-                prompt = "Generate a transcript of the speech. Return only the transcribed text without any additional formatting or explanation."
+                audio_part, uploaded_name, pinned = await self._audio_part(audio_data)
                 
                 # Generate content using client
-                response = self.client.models.generate_content(
-                    model='gemini-2.0-flash-exp',
-                    contents=[prompt, audio_file]
-                )
+                response = await self._generate_content([self.TRANSCRIBE_PROMPT, audio_part], pinned=pinned)
                 
                 transcribed_text = response.text.strip()
                 logger.info(f"Audio transcription completed: {transcribed_text[:100]}...")
                 
-                # Faylni Gemini serveridan o'chirish
-                if audio_file:
-                    try:
-                        self.client.files.delete(audio_file.name)
-                        logger.info("Uploaded file deleted from Gemini")
-                    except Exception as e:
-                        logger.warning(f"Could not delete file from Gemini: {e}")
-                
                 return transcribed_text
                 
             except APIError as api_e:
@@ -85,14 +252,97 @@ class GeminiService:
                 raise
             
             finally:
-                # Vaqtinchalik mahalliy faylni o'chirish
-                if temp_file_path and os.path.exists(temp_file_path):
-                    os.remove(temp_file_path)
+                # Faylni Gemini serveridan fonda o'chirish
+                if uploaded_name:
+                    self._delete_file_in_background(uploaded_name, pinned)
             
         except Exception as e:
             logger.error(f"Error transcribing audio: {e}", exc_info=True)
             raise
     
+    async def transcribe_audio_stream(self, audio_data: bytes, on_text: Callable[[str], None]) -> str:
+        """
+        Transcribe audio with a streamed response, reporting partial text
+        
+        ``on_text`` is called with the whole transcript so far each time a
+        chunk arrives. If the stream fails and is retried (or falls back to
+        another model), the transcript starts over from the beginning.
+        
+        Args:
+            audio_data: Audio file bytes
+            on_text: Synchronous callback receiving the partial transcript
+            
+        Returns:
+            Full transcribed text
+        """
+        audio_part, uploaded_name, pinned = await self._audio_part(audio_data)
+        
+        async def stream(model: str) -> str:
+            chunks = []
+            last = None
+            async with self._generate_semaphore:
+                with timed("generate_content_stream"), self.pool.lease(pinned) as pooled:
+                    async for last in await pooled.client.aio.models.generate_content_stream(
+                        model=model,
+                        contents=[self.TRANSCRIBE_PROMPT, audio_part],
+                    ):
+                        if last.text:
+                            chunks.append(last.text)
+                            on_text("".join(chunks))
+                    # Usage metadata keladigan oxirgi bo'lakda bo'ladi
+                    pooled.record_usage(last)
+            record_usage(model, last)
+            return "".join(chunks).strip()
+        
+        try:
+            # No hedging: two streams would both write into the user's message
+            transcribed_text = await self.caller.call(stream, hedge=False)
+            logger.info(f"Streamed transcription completed: {transcribed_text[:100]}...")
+            return transcribed_text
+        finally:
+            if uploaded_name:
+                self._delete_file_in_background(uploaded_name, pinned)
+    
+    @staticmethod
+    def split_audio(audio_data: bytes) -> List[bytes]:
+        """
+        Split a long voice note at pauses (see ``app.utils.ogg``)
+        
+        Returns:
+            Standalone Ogg/Opus pieces in order, or ``[audio_data]`` when the
+            note is short, segmentation is off or the data cannot be parsed
+        """
+        threshold = settings.voice_segment_threshold
+        if not threshold or ogg.duration(audio_data) <= threshold:
+            return [audio_data]
+        try:
+            stream = ogg.read_opus(audio_data)
+        except ogg.OggError as e:
+            logger.warning(f"Could not split voice note, sending it whole: {e}")
+            return [audio_data]
+        pieces = ogg.split_at_silence(stream, settings.voice_segment_max_length)
+        return [ogg.write_opus(piece) for piece in pieces]
+    
+    async def transcribe_segmented(self, audio_data: bytes) -> str:
+        """
+        Transcribe a voice note, in parallel pieces when it is long
+        
+        Short notes take the single-shot ``transcribe_audio`` path.
+        
+        Args:
+            audio_data: Audio file bytes
+            
+        Returns:
+            Transcribed text, pieces joined in order
+        """
+        # Demux/remux is pure Python: keep it off the event loop
+        segments = await asyncio.to_thread(self.split_audio, audio_data)
+        if len(segments) == 1:
+            return await self.transcribe_audio(segments[0])
+        
+        logger.info(f"Transcribing voice note in {len(segments)} segments")
+        parts = await asyncio.gather(*(self.transcribe_audio(segment) for segment in segments))
+        return " ".join(part for part in parts if part)
     
     async def extract_financial_data(self, text: str) -> Dict[str, Any]:
         """
@@ -105,43 +355,25 @@ class GeminiService:
             Dictionary with extracted financial data
         """
         try:
-            prompt = f"""
-Analyze the following text and extract financial information.
-Return the data in this exact JSON format:
-{{
-    "type": "income or expense",
-    "amount": numeric_value,
-    "category": "category_name",
-    "description": "brief_description",
-    "date": "date_if_mentioned or today"
-}}
-
-Text: {text}
-
-Return only valid JSON, nothing else.
-"""
-            
-            response = self.client.models.generate_content(
-                model='gemini-2.0-flash-exp',
-                contents=prompt
+            prompt = (
+                "Analyze the following text and extract financial information. "
+                "Return JSON with \"type\" (income or expense), \"amount\" "
+                "(number), \"currency\" (ISO code if mentioned), \"category\", "
+                "\"description\" (brief) and \"date\" (date if mentioned, "
+                "otherwise today).\n\n"
+                f"Text: {text}"
             )
+            # JSON mode: the response is the record itself, no fences to strip
+            config = types.GenerateContentConfig(
+                response_mime_type="application/json",
+                response_schema=self.FINANCIAL_DATA_SCHEMA,
+            )
+            
+            response = await self._generate_content(prompt, config=config)
             
             # Parse the JSON response
             try:
-                # Clean the response text
-                response_text = response.text.strip()
-                
-                # Remove markdown code blocks if present
-                if response_text.startswith("```json"):
-                    response_text = response_text[7:]
-                if response_text.startswith("```"):
-                    response_text = response_text[3:]
-                if response_text.endswith("```"):
-                    response_text = response_text[:-3]
-                
-                response_text = response_text.strip()
-                
-                data = json.loads(response_text)
+                data = self._parse_json(response.text)
                 return data
                 
             except json.JSONDecodeError:
@@ -156,24 +388,156 @@ Return only valid JSON, nothing else.
             logger.error(f"Error extracting financial data: {e}")
             raise
     
+    async def extract_financial_data_batch(self, texts: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Extract financial data from several texts in one model request
+        
+        The instructions are sent once and the model returns a JSON array
+        whose elements carry the index of their input text.
+        
+        Args:
+            texts: Input texts to analyze
+            
+        Returns:
+            One record per input text, in order; None where the response
+            had no usable element for that text
+            
+        Raises:
+            ValueError: The response is not a JSON array
+        """
+        items = "\n".join(
+            json.dumps({"index": index, "text": text}, ensure_ascii=False)
+            for index, text in enumerate(texts)
+        )
+        prompt = (
+            "Analyze each of the following texts and extract the financial "
+            "information it describes. Return a JSON array with one element per "
+            "text: \"index\" (the text's index) and \"financial_data\" with "
+            "\"type\" (income or expense), \"amount\" (number), \"currency\" "
+            "(ISO code if mentioned), \"category\", \"description\" (brief) and "
+            "\"date\" (date if mentioned, otherwise today).\n\n"
+            f"Texts:\n{items}"
+        )
+        config = types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema=self.BATCH_RESPONSE_SCHEMA,
+        )
+        
+        response = await self._generate_content(prompt, config=config)
+        elements = self._parse_json(response.text)
+        if not isinstance(elements, list):
+            raise ValueError("Batch response is not a JSON array")
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+        for element in elements:
+            if not isinstance(element, dict):
+                continue
+            index = element.get("index")
+            data = element.get("financial_data")
+            # Out-of-range or repeated indexes are ignored; those texts are retried alone
+            if isinstance(index, int) and 0 <= index < len(texts) and results[index] is None \
+                    and isinstance(data, dict):
+                results[index] = data
+        return results
+    
+    @staticmethod
+    def _parse_json(response_text: str) -> Any:
+        """Parse JSON from a model response, stripping markdown code blocks"""
+        # Clean the response text
+        response_text = response_text.strip()
+        
+        # Remove markdown code blocks if present
+        if response_text.startswith("```json"):
+            response_text = response_text[7:]
+        if response_text.startswith("```"):
+            response_text = response_text[3:]
+        if response_text.endswith("```"):
+            response_text = response_text[:-3]
+        
+        return json.loads(response_text.strip())
+    
+    async def transcribe_and_extract(self, audio_data: bytes) -> tuple[str, Dict[str, Any]]:
+        """
+        Transcribe audio and extract financial data in one model request
+        
+        The model is constrained by ``VOICE_RESPONSE_SCHEMA`` so a single
+        generate_content call returns both the transcript and the record.
+        
+        Args:
+            audio_data: Audio file bytes
+            
+        Returns:
+            Tuple of (transcribed_text, financial_data)
+        """
+        uploaded_name = pinned = None
+        try:
+            audio_part, uploaded_name, pinned = await self._audio_part(audio_data)
+            
+            prompt = (
+                "Generate a transcript of the speech, then extract the financial "
+                "information it describes. Return JSON with \"transcript\" (the "
+                "transcribed text) and \"financial_data\" with \"type\" (income or "
+                "expense), \"amount\" (number), \"currency\" (ISO code if "
+                "mentioned), \"category\", \"description\" (brief) and \"date\" "
+                "(date if mentioned, otherwise today)."
+            )
+            config = types.GenerateContentConfig(
+                response_mime_type="application/json",
+                response_schema=self.VOICE_RESPONSE_SCHEMA,
+            )
+            
+            response = await self._generate_content([prompt, audio_part], config=config, pinned=pinned)
+            result = self._parse_json(response.text)
+            
+            transcribed_text = result["transcript"].strip()
+            financial_data = result["financial_data"]
+            if not isinstance(financial_data, dict):
+                raise ValueError("financial_data is not an object")
+            
+            logger.info(f"Single-call voice processing completed: {transcribed_text[:100]}...")
+            return transcribed_text, financial_data
+        
+        finally:
+            if uploaded_name:
+                self._delete_file_in_background(uploaded_name, pinned)
+    
     async def process_voice_message(self, audio_data: bytes) -> tuple[str, Dict[str, Any]]:
         """
         Process voice message: transcribe and extract financial data
         
+        Uses the single-call pipeline when ``gemini_single_call_voice`` is
+        enabled and falls back to the two-step path when its response has the
+        wrong shape or the request is rejected as invalid (400). Outages
+        (retryable errors, open breakers) are raised: the two-step path would
+        only repeat every retry and fallback twice more. Notes longer
+        than ``voice_segment_threshold`` are transcribed in parallel pieces
+        and then extracted.
+        
         Args:
             audio_data: Audio file bytes
             
         Returns:
             Tuple of (transcribed_text, financial_data)
         """
+        long_note = bool(settings.voice_segment_threshold) \
+            and ogg.duration(audio_data) > settings.voice_segment_threshold
+        if settings.gemini_single_call_voice and not long_note:
+            try:
+                return await self.transcribe_and_extract(audio_data)
+            except (ValueError, KeyError, TypeError) as e:
+                # JSONDecodeError ham ValueError
+                logger.warning(f"Malformed single-call voice response, using two-step path: {e}")
+            except APIError as e:
+                # e.g. the response schema rejected by this model
+                if e.code != 400:
+                    raise
+                logger.warning(f"Single-call voice request rejected, using two-step path: {e}")
+        
         # Transcribe audio
-        transcribed_text = await self.transcribe_audio(audio_data)
+        transcribed_text = await self.transcribe_segmented(audio_data)
         
         # Extract financial data
         financial_data = await self.extract_financial_data(transcribed_text)
         
         return transcribed_text, financial_data
 
-
-# Global service instance
-gemini_service = GeminiService()
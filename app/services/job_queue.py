@@ -0,0 +1,412 @@
+"""
+Durable job queue in the database, shared by bot and worker processes
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import Bot
+
+from app.metrics import CallbackMetric
+from app.utils.db import is_postgres, placeholder
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Handler of one job kind: (bot, user_id, payload)
+JobHandler = Callable[[Bot, int, Dict[str, Any]], Awaitable[None]]
+# Called once when a job goes to the dead-letter state: (bot, user_id, payload, error)
+DeadHandler = Callable[[Bot, int, Dict[str, Any], str], Awaitable[None]]
+
+# Current Unix time by the database's clock (PostgreSQL)
+DATABASE_NOW = "CAST(EXTRACT(EPOCH FROM now()) AS DOUBLE PRECISION)"
+
+
+class PermanentJobError(Exception):
+    """Raised by a job handler for failures a retry cannot fix (dead-letter at once)"""
+
+
+class ClaimedJob:
+    """A job leased by this worker"""
+
+    __slots__ = ("id", "kind", "user_id", "payload", "attempts", "max_attempts")
+
+    def __init__(self, row: Dict[str, Any]):
+        self.id = row["id"]
+        self.kind = row["kind"]
+        self.user_id = row["user_id"]
+        payload = row["payload"]
+        # SQLite returns the JSON column as text
+        self.payload = json.loads(payload) if isinstance(payload, str) else payload
+        # Also the fencing token: a job reclaimed after its lease ran out has a new one
+        self.attempts = row["attempts"]
+        self.max_attempts = row["max_attempts"]
+
+
+class DurableJobQueue:
+    """
+    Job queue in the ``job_queue`` table
+
+    Workers claim jobs with ``SELECT ... FOR UPDATE SKIP LOCKED`` so any
+    number of processes on any number of machines can share the table
+    without taking the same job twice. A claimed job is leased for
+    ``visibility_timeout`` seconds (extended while it runs); if its worker
+    dies, the lease runs out and another worker picks it up. Failed jobs
+    are retried with exponential backoff up to ``max_attempts`` times and
+    then left in the ``dead`` state with their last error. Finished jobs
+    are deleted.
+
+    Delivery is at least once: a worker dying after the work but before
+    the delete means the job runs again. Due times and lease ends are
+    computed from the database's clock, so clock skew between hosts cannot
+    cut a lease short. On SQLite (tests) claiming works the same, without
+    row locks, and times come from ``clock``.
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        visibility_timeout: float,
+        max_attempts: int,
+        poll_interval: float = 1.0,
+        backoff_base: float = 5.0,
+        backoff_max: float = 300.0,
+        worker_id: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.concurrency = concurrency
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.clock = clock
+
+        self._handlers: Dict[str, JobHandler] = {}
+        self._dead_handlers: Dict[str, DeadHandler] = {}
+        self._running: Dict[int, asyncio.Task] = {}
+        self._poller: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+        self.enqueued = 0
+        self.completed = 0
+        self.retried = 0
+        self.dead = 0
+
+    def register(self, kind: str, handler: JobHandler, on_dead: Optional[DeadHandler] = None) -> None:
+        """Set the handler (and optional dead-letter callback) of a job kind"""
+        self._handlers[kind] = handler
+        if on_dead is not None:
+            self._dead_handlers[kind] = on_dead
+
+    @staticmethod
+    def _connection():
+        from tortoise import Tortoise
+
+        return Tortoise.get_connection("default")
+
+    @staticmethod
+    def _param(connection, params: List[Any], value: Any) -> str:
+        """Append a query parameter and return its marker"""
+        params.append(value)
+        return placeholder(connection, len(params))
+
+    def _now(self, connection, params: List[Any]) -> str:
+        """SQL for the current Unix time: the database clock, ``clock`` on SQLite"""
+        if is_postgres(connection):
+            return DATABASE_NOW
+        return self._param(connection, params, self.clock())
+
+    async def enqueue(self, kind: str, user_id: int, payload: Dict[str, Any]) -> int:
+        """
+        Store a job
+
+        Args:
+            kind: Registered job kind
+            user_id: Telegram user ID
+            payload: JSON-serializable job data
+
+        Returns:
+            Job ID
+        """
+        connection = self._connection()
+        params: List[Any] = []
+        markers = [
+            self._param(connection, params, value)
+            for value in (kind, user_id, json.dumps(payload, ensure_ascii=False), self.max_attempts)
+        ]
+        markers.append(self._now(connection, params))
+        _, rows = await connection.execute_query(
+            f'INSERT INTO "job_queue" ("kind", "user_id", "payload", "max_attempts", "available_at") '
+            f'VALUES ({", ".join(markers)}) RETURNING "id"',
+            params,
+        )
+        self.enqueued += 1
+        if self._wakeup is not None:
+            # Shu jarayondagi worker so'rovni kutmasdan oladi
+            self._wakeup.set()
+        return rows[0]["id"]
+
+    async def claim(self, limit: int) -> List[ClaimedJob]:
+        """
+        Lease up to ``limit`` available jobs: queued ones that are due and
+        running ones whose lease has run out
+
+        Returns:
+            Claimed jobs, oldest first
+        """
+        connection = self._connection()
+        params: List[Any] = []
+        now = self._now(connection, params)
+        timeout_p = self._param(connection, params, self.visibility_timeout)
+        worker_p = self._param(connection, params, self.worker_id)
+        limit_p = self._param(connection, params, limit)
+        lock = " FOR UPDATE SKIP LOCKED" if is_postgres(connection) else ""
+        _, rows = await connection.execute_query(
+            f'UPDATE "job_queue" SET "status" = \'running\', "attempts" = "attempts" + 1, '
+            f'"available_at" = {now} + {timeout_p}, "locked_by" = {worker_p} '
+            f'WHERE "id" IN ('
+            f'SELECT "id" FROM "job_queue" '
+            f'WHERE "status" IN (\'queued\', \'running\') AND "available_at" <= {now} '
+            f'ORDER BY "available_at", "id" LIMIT {limit_p}{lock}) '
+            f'RETURNING "id", "kind", "user_id", "payload", "attempts", "max_attempts"',
+            params,
+        )
+        return sorted((ClaimedJob(row) for row in rows), key=lambda job: job.id)
+
+    async def _update_owned(self, job: ClaimedJob, assignments: Optional[str], params: List[Any]) -> bool:
+        """UPDATE (or DELETE with ``assignments=None``) a job only while this worker holds its lease"""
+        connection = self._connection()
+        id_p, worker_p, attempts_p = (
+            placeholder(connection, index) for index in range(len(params) + 1, len(params) + 4)
+        )
+        where = f'"id" = {id_p} AND "locked_by" = {worker_p} AND "attempts" = {attempts_p}'
+        if assignments is None:
+            sql = f'DELETE FROM "job_queue" WHERE {where} RETURNING "id"'
+        else:
+            sql = f'UPDATE "job_queue" SET {assignments} WHERE {where} RETURNING "id"'
+        _, rows = await connection.execute_query(sql, [*params, job.id, self.worker_id, job.attempts])
+        return bool(rows)
+
+    async def complete(self, job: ClaimedJob) -> bool:
+        """Delete a finished job; False if the lease was lost meanwhile"""
+        return await self._update_owned(job, None, [])
+
+    async def extend(self, job: ClaimedJob) -> bool:
+        """Push the lease end ``visibility_timeout`` seconds ahead"""
+        connection = self._connection()
+        params: List[Any] = []
+        now = self._now(connection, params)
+        timeout_p = self._param(connection, params, self.visibility_timeout)
+        return await self._update_owned(job, f'"available_at" = {now} + {timeout_p}', params)
+
+    async def release(self, job: ClaimedJob) -> bool:
+        """Put a job back without counting the attempt (shutdown)"""
+        connection = self._connection()
+        params: List[Any] = []
+        now = self._now(connection, params)
+        return await self._update_owned(
+            job,
+            f'"status" = \'queued\', "attempts" = "attempts" - 1, "locked_by" = NULL, "available_at" = {now}',
+            params,
+        )
+
+    def backoff_delay(self, attempts: int) -> float:
+        """Seconds before retry number ``attempts + 1``"""
+        return min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+
+    async def fail(self, job: ClaimedJob, error: BaseException, permanent: bool = False) -> str:
+        """
+        Record a failed attempt
+
+        Returns:
+            New status: "queued" (retry scheduled) or "dead"
+        """
+        connection = self._connection()
+        message = f"{type(error).__name__}: {error}"[:2000]
+        if permanent or job.attempts >= job.max_attempts:
+            await self._update_owned(
+                job,
+                f'"status" = \'dead\', "locked_by" = NULL, "last_error" = {placeholder(connection, 1)}',
+                [message],
+            )
+            return "dead"
+        params: List[Any] = []
+        error_p = self._param(connection, params, message)
+        now = self._now(connection, params)
+        delay_p = self._param(connection, params, self.backoff_delay(job.attempts))
+        await self._update_owned(
+            job,
+            f'"status" = \'queued\', "locked_by" = NULL, "last_error" = {error_p}, '
+            f'"available_at" = {now} + {delay_p}',
+            params,
+        )
+        return "queued"
+
+    async def _heartbeat(self, job: ClaimedJob) -> None:
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            try:
+                if not await self.extend(job):
+                    logger.warning(f"Lost the lease of job {job.id}")
+                    return
+            except Exception as e:
+                logger.warning(f"Could not extend the lease of job {job.id}: {e}")
+
+    async def run_job(self, bot: Bot, job: ClaimedJob) -> str:
+        """
+        Run one claimed job and record the outcome
+
+        Returns:
+            "done", "queued" (will be retried) or "dead"
+        """
+        handler = self._handlers.get(job.kind)
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            if handler is None:
+                raise PermanentJobError(f"No handler for job kind {job.kind!r}")
+            if job.attempts > job.max_attempts:
+                # Oxirgi urinishda worker o'lgan (lease tugagan)
+                raise PermanentJobError("Worker stopped during the last attempt")
+            await handler(bot, job.user_id, job.payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            status = await self.fail(job, e, permanent=isinstance(e, PermanentJobError))
+            if status == "dead":
+                self.dead += 1
+                logger.error(f"Job {job.id} ({job.kind}) failed for good after {job.attempts} attempt(s): {e}")
+                on_dead = self._dead_handlers.get(job.kind)
+                if on_dead is not None:
+                    try:
+                        await on_dead(bot, job.user_id, job.payload, str(e))
+                    except Exception as notify_error:
+                        logger.warning(f"Dead-letter callback of job {job.id} failed: {notify_error}")
+            else:
+                self.retried += 1
+                logger.warning(f"Job {job.id} ({job.kind}) attempt {job.attempts} failed, will retry: {e}")
+            return status
+        finally:
+            heartbeat.cancel()
+
+        if not await self.complete(job):
+            logger.warning(f"Job {job.id} finished after its lease was taken over")
+        self.completed += 1
+        return "done"
+
+    def start(self, bot: Bot) -> None:
+        """Start claiming and running jobs in the background"""
+        if self._poller is None and self.concurrency > 0:
+            self._wakeup = asyncio.Event()
+            self._poller = asyncio.create_task(self._poll(bot), name="job-queue-poller")
+
+    async def _poll(self, bot: Bot) -> None:
+        while True:
+            # Cleared before claiming: an enqueue or a finished job during
+            # the claim must still cut the next wait short
+            self._wakeup.clear()
+            free = self.concurrency - len(self._running)
+            jobs = []
+            if free > 0:
+                try:
+                    jobs = await self.claim(free)
+                except Exception as e:
+                    logger.error(f"Could not claim jobs: {e}")
+            for job in jobs:
+                task = asyncio.create_task(self.run_job(bot, job))
+                self._running[job.id] = task
+                task.add_done_callback(lambda task, job=job: self._on_done(job, task))
+            if jobs and len(jobs) == free:
+                # Band: bo'shagan joyni kutamiz
+                await self._wakeup.wait()
+            elif not jobs:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _on_done(self, job: ClaimedJob, task: asyncio.Task) -> None:
+        self._running.pop(job.id, None)
+        if not task.cancelled() and task.exception() is not None:
+            # Natija yozilmadi: lease tugagach job boshqa worker'ga o'tadi
+            logger.error(f"Could not record the outcome of job {job.id}: {task.exception()}")
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def drain(self, timeout: float) -> None:
+        """
+        Stop claiming, let running jobs finish for up to ``timeout``
+        seconds, then cancel the rest and put them back in the queue
+        """
+        if self._poller is not None:
+            self._poller.cancel()
+            await asyncio.gather(self._poller, return_exceptions=True)
+            self._poller = None
+
+        tasks = dict(self._running)
+        if not tasks:
+            return
+        logger.info(f"Draining {len(tasks)} running job(s)")
+        _, pending = await asyncio.wait(tasks.values(), timeout=timeout)
+        if not pending:
+            return
+
+        unfinished = [job_id for job_id, task in tasks.items() if task in pending]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        claimed = await self._owned_jobs(unfinished)
+        for job in claimed:
+            await self.release(job)
+        logger.warning(f"Put {len(claimed)} unfinished job(s) back in the queue")
+
+    async def _owned_jobs(self, ids: List[int]) -> List[ClaimedJob]:
+        """Jobs among ``ids`` this worker still holds"""
+        if not ids:
+            return []
+        connection = self._connection()
+        markers = ", ".join(placeholder(connection, index) for index in range(2, len(ids) + 2))
+        _, rows = await connection.execute_query(
+            f'SELECT "id", "kind", "user_id", "payload", "attempts", "max_attempts" FROM "job_queue" '
+            f'WHERE "locked_by" = {placeholder(connection, 1)} AND "status" = \'running\' AND "id" IN ({markers})',
+            [self.worker_id, *ids],
+        )
+        return [ClaimedJob(row) for row in rows]
+
+    @property
+    def running(self) -> int:
+        """Jobs this process is running"""
+        return len(self._running)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "enqueued": self.enqueued,
+            "completed": self.completed,
+            "retried": self.retried,
+            "dead": self.dead,
+        }
+
+
+# Global job queue instance
+job_queue = DurableJobQueue(
+    concurrency=settings.job_workers,
+    visibility_timeout=settings.job_visibility_timeout,
+    max_attempts=settings.job_max_attempts,
+    poll_interval=settings.job_poll_interval,
+)
+
+CallbackMetric(
+    "finance_bot_jobs_total", "Durable queue jobs by outcome (this process)",
+    job_queue.stats,
+    ["outcome"],
+    kind="counter",
+)
+CallbackMetric(
+    "finance_bot_jobs_running", "Durable queue jobs running in this process",
+    lambda: job_queue.running,
+)
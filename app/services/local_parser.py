@@ -0,0 +1,387 @@
+"""
+Local rule-based parser for common Uzbek expense/income phrases
+"""
+import logging
+import re
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utils.text import normalize_text
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Raqam va so'zlarni ajratish ("20000so'm" -> "20000", "so'm")
+_TOKEN = re.compile(r"\d+(?:[.,]\d+)*|\$|[^\W\d_]+(?:['-][^\W\d_]+)*")
+_THOUSANDS = re.compile(r"^\d{1,3}(?:[.,]\d{3})+$")
+
+# Uzbek number words
+_NUMBER_WORDS = {
+    "bir": 1, "ikki": 2, "uch": 3, "to'rt": 4, "besh": 5,
+    "olti": 6, "yetti": 7, "sakkiz": 8, "to'qqiz": 9,
+    "o'n": 10, "yigirma": 20, "o'ttiz": 30, "qirq": 40, "ellik": 50,
+    "oltmish": 60, "yetmish": 70, "sakson": 80, "to'qson": 90,
+}
+_HUNDRED = {"yuz"}
+_HALF = {"yarim"}
+_MULTIPLIERS = {
+    "ming": 1_000, "k": 1_000,
+    "mln": 1_000_000, "million": 1_000_000, "millon": 1_000_000, "milion": 1_000_000,
+    "mlrd": 1_000_000_000, "milliard": 1_000_000_000,
+}
+
+# Qo'shimchalar: "mingga", "so'mlik", "ellikta" ...
+_SUFFIXES = ("lik", "dan", "ga", "ta", "ni", "ka", "da")
+
+_LOCAL_CURRENCY = {"so'm", "som", "sum", "сум", "сўм", "uzs"}
+_FOREIGN_CURRENCY = {"$", "dollar", "dollor", "usd", "evro", "euro", "yevro", "rubl", "rubl'", "tenge"}
+
+# Relative dates (offset in days from today)
+_RELATIVE_DATES = {
+    "bugun": 0, "bugungi": 0,
+    "kecha": -1, "kechagi": -1,
+    "ertaga": 1,
+}
+_RELATIVE_DATE_PHRASES = {
+    "o'tgan kuni": -2, "avvalgi kuni": -2, "oldingi kuni": -2,
+}
+
+# Dates we cannot resolve locally (weekdays, months, weeks, explicit dates)
+_DATE_BLOCKERS = {
+    "dushanba", "seshanba", "chorshanba", "payshanba", "juma", "shanba", "yakshanba",
+    "yanvar", "fevral", "mart", "aprel", "may", "iyun", "iyul", "avgust",
+    "sentabr", "sentyabr", "oktabr", "oktyabr", "noyabr", "dekabr",
+    "hafta", "o'tgan", "oldingi", "avvalgi", "ertalab",
+}
+
+# Type keywords (matched as word prefixes)
+_INCOME_WORDS = (
+    "daromad", "kirim", "bonus", "mukofot", "stipendiya", "pensiya",
+    "tushdi", "tushum", "topdim", "sotdim",
+)
+_EXPENSE_WORDS = (
+    "sarf", "xarajat", "harajat", "chiqim", "to'ladim", "to'lov", "sotib",
+    "xarid", "berdim", "ketdi",
+)
+
+# Keyword -> (category, description); single words match as whole words
+# plus Uzbek suffixes (see _CATEGORY_SUFFIXES)
+CATEGORY_KEYWORDS = {
+    "oziq-ovqat": ("food", "oziq-ovqat"),
+    "ovqat": ("food", "ovqat"),
+    "non": ("food", "non"),
+    "go'sht": ("food", "go'sht"),
+    "sabzavot": ("food", "sabzavot"),
+    "meva": ("food", "meva"),
+    "bozor": ("food", "bozorlik"),
+    "restoran": ("food", "restoran"),
+    "kafe": ("food", "kafe"),
+    "tushlik": ("food", "tushlik"),
+    "nonushta": ("food", "nonushta"),
+    "qahva": ("food", "qahva"),
+    "kofe": ("food", "kofe"),
+    "supermarket": ("food", "supermarket"),
+    "taksi": ("transport", "taksi"),
+    "taxi": ("transport", "taksi"),
+    "avtobus": ("transport", "avtobus"),
+    "metro": ("transport", "metro"),
+    "benzin": ("transport", "benzin"),
+    "yoqilg'i": ("transport", "yoqilg'i"),
+    "metan": ("transport", "metan"),
+    "propan": ("transport", "propan"),
+    "yo'l kira": ("transport", "yo'l kira"),
+    "poyezd": ("transport", "poyezd"),
+    "aviabilet": ("transport", "aviabilet"),
+    "kommunal": ("utilities", "kommunal to'lov"),
+    "gaz": ("utilities", "gaz"),
+    "svet": ("utilities", "elektr energiya"),
+    "elektr": ("utilities", "elektr energiya"),
+    "suv": ("utilities", "suv"),
+    "telefon": ("communication", "telefon"),
+    "internet": ("communication", "internet"),
+    "ijara": ("housing", "ijara"),
+    "kvartira": ("housing", "kvartira"),
+    "dori": ("health", "dori"),
+    "apteka": ("health", "dorixona"),
+    "dorixona": ("health", "dorixona"),
+    "shifokor": ("health", "shifokor"),
+    "klinika": ("health", "klinika"),
+    "kiyim": ("clothing", "kiyim"),
+    "poyabzal": ("clothing", "poyabzal"),
+    "kurs": ("education", "kurs"),
+    "kontrakt": ("education", "kontrakt"),
+    "kitob": ("education", "kitob"),
+    "repetitor": ("education", "repetitor"),
+    "kino": ("entertainment", "kino"),
+    "teatr": ("entertainment", "teatr"),
+    "konsert": ("entertainment", "konsert"),
+    "maosh": ("salary", "maosh"),
+    "oylik": ("salary", "oylik maosh"),
+    "ish haqi": ("salary", "ish haqi"),
+    "sovg'a": ("gift", "sovg'a"),
+}
+
+# Categories that imply a transaction type on their own
+_CATEGORY_TYPES = {
+    "food": "expense", "transport": "expense", "utilities": "expense",
+    "communication": "expense", "housing": "expense", "health": "expense",
+    "clothing": "expense", "education": "expense", "entertainment": "expense",
+    "salary": "income",
+}
+
+
+# Qo'shimchalar zanjiri: "taksiga", "ijarasiga", "to'lovlar", "kafedagi".
+# Anything else after a keyword is another word ("gazeta", "suvenir").
+_CATEGORY_SUFFIXES = (
+    "lar", "lari", "i", "si", "im", "ing", "imiz", "ingiz", "miz",
+    "ga", "ka", "qa", "da", "ta", "dan", "ni", "ning", "gacha", "dagi", "lik", "chi",
+)
+_SUFFIX_CHAIN = re.compile(
+    "(?:" + "|".join(sorted(_CATEGORY_SUFFIXES, key=len, reverse=True)) + ")*"
+)
+
+# Inkor: "bermadim", "to'lamadi", "olmaganman", "emas", "yo'q" - Gemini'ga
+_NEGATION = re.compile(
+    r"^(?:emas|yo'q|yoq)$"
+    r"|.ma(?:di|dim|dik|ding|dingiz|dilar|gan|ganman|ganmiz|yman|ymiz|ydi|ysiz|pti)$"
+)
+
+# Phrases are matched as substrings, single words as whole words with
+# suffixes. Words are indexed by their first three letters (longest first)
+# so each token checks only a handful of keywords.
+_PHRASE_KEYWORDS = {k: v for k, v in CATEGORY_KEYWORDS.items() if " " in k}
+_KEYWORD_INDEX: Dict[str, List[Tuple[str, Tuple[str, str]]]] = {}
+for _keyword, _value in sorted(CATEGORY_KEYWORDS.items(), key=lambda item: -len(item[0])):
+    if " " not in _keyword:
+        _KEYWORD_INDEX.setdefault(_keyword[:3], []).append((_keyword, _value))
+
+
+def _strip_suffix(token: str, vocabulary) -> Optional[str]:
+    """Return the vocabulary word behind a suffixed token ("mingga" -> "ming")"""
+    if token in vocabulary:
+        return token
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and token[:-len(suffix)] in vocabulary:
+            return token[:-len(suffix)]
+    return None
+
+
+def _is_keyword_form(token: str, keyword: str) -> bool:
+    """Whether ``token`` is ``keyword`` with only suffixes after it ("taksiga" -> "taksi")"""
+    return token.startswith(keyword) and _SUFFIX_CHAIN.fullmatch(token, len(keyword)) is not None
+
+
+def _starts_with_any(token: str, prefixes) -> bool:
+    return any(token.startswith(prefix) for prefix in prefixes)
+
+
+class LocalFinancialParser:
+    """
+    Deterministic parser that answers simple messages without Gemini
+
+    Only messages with exactly one amount, a known category, a clear
+    transaction type and a date it can resolve get a high confidence;
+    everything else is left to the model.
+    """
+
+    def __init__(self, min_confidence: float = 0.9):
+        self.min_confidence = min_confidence
+
+    @staticmethod
+    def _number_value(token: str) -> Optional[float]:
+        """Parse a digit token ("50000", "50.000", "1.5", "2,5")"""
+        if _THOUSANDS.match(token):
+            return float(token.replace(".", "").replace(",", ""))
+        try:
+            return float(token.replace(",", "."))
+        except ValueError:
+            return None
+
+    def _amounts(self, tokens: List[str]) -> List[float]:
+        """Collect amounts from runs of number tokens"""
+        amounts = []
+        total = current = 0.0
+        in_group = False
+
+        def close_group():
+            nonlocal total, current, in_group
+            if in_group and total + current > 0:
+                amounts.append(total + current)
+            total = current = 0.0
+            in_group = False
+
+        previous_digits = False
+        for token in tokens:
+            if token[0].isdigit():
+                value = self._number_value(token)
+                if value is None:
+                    close_group()
+                    continue
+                # "50 000" -> 50000
+                if previous_digits and len(token) == 3 and token.isdigit():
+                    current = current * 1000 + value
+                else:
+                    if in_group and current:
+                        close_group()
+                    current += value
+                in_group = True
+                previous_digits = True
+                continue
+
+            previous_digits = False
+            word = _strip_suffix(token, _NUMBER_WORDS)
+            if word is not None:
+                current += _NUMBER_WORDS[word]
+                in_group = True
+                continue
+            word = _strip_suffix(token, _HUNDRED)
+            if word is not None:
+                current = (current or 1) * 100
+                in_group = True
+                continue
+            if token in _HALF:
+                current += 0.5
+                in_group = True
+                continue
+            word = _strip_suffix(token, _MULTIPLIERS)
+            if word is not None and (in_group or word != "k"):
+                total += (current or 1) * _MULTIPLIERS[word]
+                current = 0.0
+                in_group = True
+                continue
+
+            close_group()
+
+        close_group()
+        return amounts
+
+    def parse_amount(self, text: str) -> Optional[float]:
+        """Parse a single amount ("20000", "50 ming", "1.5 mln") or return None"""
+        amounts = self._amounts(_TOKEN.findall(normalize_text(text)))
+        return amounts[0] if len(amounts) == 1 else None
+
+    def parse_date(self, text: str, today: Optional[date] = None) -> Optional[date]:
+        """Resolve a relative date ("bugun", "kecha", "o'tgan kuni") or return None"""
+        text = normalize_text(text)
+        return self._resolve_date(text, _TOKEN.findall(text), today or date.today())
+
+    @staticmethod
+    def _resolve_date(text: str, tokens: List[str], today: date) -> Optional[date]:
+        """Resolve bugun/kecha/... or return None if the date is not understood"""
+        offsets = set()
+        for phrase, offset in _RELATIVE_DATE_PHRASES.items():
+            if phrase in text:
+                offsets.add(offset)
+                text = text.replace(phrase, " ")
+        if not offsets:
+            for token in tokens:
+                if _strip_suffix(token, _DATE_BLOCKERS):
+                    return None
+
+        for token in tokens:
+            if token in _RELATIVE_DATES:
+                offsets.add(_RELATIVE_DATES[token])
+
+        if len(offsets) > 1:
+            return None
+        return today + timedelta(days=offsets.pop() if offsets else 0)
+
+    def _category(self, text: str, tokens: List[str]) -> Optional[Tuple[str, str]]:
+        """Find the category; None if missing or ambiguous"""
+        matches = []
+        for phrase, value in _PHRASE_KEYWORDS.items():
+            if phrase in text:
+                matches.append(value)
+        for token in tokens:
+            for keyword, value in _KEYWORD_INDEX.get(token[:3], ()):
+                if _is_keyword_form(token, keyword):
+                    matches.append(value)
+                    break
+
+        if not matches:
+            return None
+        if len({category for category, _ in matches}) > 1:
+            return None
+        return matches[0]
+
+    def parse(self, text: str, today: Optional[date] = None) -> Tuple[Optional[Dict[str, Any]], float]:
+        """
+        Parse a message into the financial data format
+
+        Args:
+            text: Message text
+            today: Reference date for relative dates (defaults to today)
+
+        Returns:
+            Tuple of (financial_data or None, confidence 0..1)
+        """
+        text = normalize_text(text)
+        tokens = _TOKEN.findall(text)
+        if not tokens:
+            return None, 0.0
+
+        # Chet el valyutasi - Gemini'ga qoldiramiz
+        if any(_strip_suffix(token, _FOREIGN_CURRENCY) for token in tokens):
+            return None, 0.0
+
+        # "taksiga 20000 bermadim" - inkor, yozib bo'lmaydi
+        if any(_NEGATION.search(token) for token in tokens):
+            return None, 0.0
+
+        amounts = self._amounts(tokens)
+        if len(amounts) != 1:
+            return None, 0.0
+        amount = amounts[0]
+
+        resolved_date = self._resolve_date(text, tokens, today or date.today())
+        if resolved_date is None:
+            return None, 0.0
+
+        confidence = 1.0
+
+        category = self._category(text, tokens)
+        if category is None:
+            confidence *= 0.6
+            category_name, description = "other", text
+        else:
+            category_name, description = category
+
+        if not any(_strip_suffix(token, _LOCAL_CURRENCY) for token in tokens):
+            confidence *= 0.95
+
+        income = any(_starts_with_any(token, _INCOME_WORDS) for token in tokens)
+        expense = any(_starts_with_any(token, _EXPENSE_WORDS) for token in tokens)
+        implied = _CATEGORY_TYPES.get(category_name)
+        if income and expense:
+            return None, 0.0
+        if income or expense:
+            transaction_type = "income" if income else "expense"
+            if implied and implied != transaction_type:
+                confidence *= 0.5
+        elif implied:
+            transaction_type = implied
+            confidence *= 0.95
+        else:
+            transaction_type = "expense"
+            confidence *= 0.7
+
+        data = {
+            "type": transaction_type,
+            "amount": int(amount) if amount.is_integer() else amount,
+            "category": category_name,
+            "description": description,
+            "date": resolved_date.isoformat(),
+        }
+        return data, confidence
+
+    def try_parse(self, text: str, today: Optional[date] = None) -> Optional[Dict[str, Any]]:
+        """Return financial data only when the parser is confident enough"""
+        data, confidence = self.parse(text, today)
+        if data is None or confidence < self.min_confidence:
+            return None
+        logger.info(f"Local parser answered with confidence {confidence:.2f}")
+        return data
+
+
+# Global parser instance
+local_parser = LocalFinancialParser(min_confidence=settings.local_parser_min_confidence)
@@ -0,0 +1,233 @@
+"""
+Bounded job queue with per-user round-robin scheduling
+"""
+import asyncio
+import logging
+import statistics
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from app.metrics import QUEUE_WAIT_SECONDS, CallbackMetric
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Wait times kept for percentiles
+_WAIT_SAMPLES = 1000
+
+
+class QueueFullError(Exception):
+    """Raised when a job cannot be queued (queue or user limit reached)"""
+
+
+class Job:
+    """A queued unit of work; await it to get the result"""
+
+    __slots__ = ("user_id", "func", "future", "enqueued_at", "position")
+
+    def __init__(self, user_id: int, func: Callable[[], Awaitable[Any]], position: int):
+        self.user_id = user_id
+        self.func = func
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.monotonic()
+        # Jobs expected to start before this one (0 = next in line)
+        self.position = position
+
+    def __await__(self):
+        return self.future.__await__()
+
+
+class ProcessingQueue:
+    """
+    Runs jobs on a fixed number of workers, taking turns between users
+
+    Each user has their own FIFO; workers pick the next job from the next
+    user in the rotation, so a user with many queued messages cannot delay
+    everyone else. The total number of waiting jobs and the number per
+    user are bounded; ``submit`` raises ``QueueFullError`` beyond that.
+    """
+
+    def __init__(self, workers: int, max_size: int, max_per_user: int):
+        self.workers = workers
+        self.max_size = max_size
+        self.max_per_user = max_per_user
+
+        # user_id -> waiting jobs; order of keys is the rotation
+        self._queues: "OrderedDict[int, Deque[Job]]" = OrderedDict()
+        self._depth = 0
+        self._running = 0
+        self._ready: Optional[asyncio.Semaphore] = None
+        self._tasks: list[asyncio.Task] = []
+
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_depth = 0
+        self._waits: Deque[float] = deque(maxlen=_WAIT_SAMPLES)
+
+    @property
+    def depth(self) -> int:
+        """Jobs waiting for a worker"""
+        return self._depth
+
+    @property
+    def running(self) -> int:
+        """Jobs being processed by a worker"""
+        return self._running
+
+    def _ensure_workers(self) -> None:
+        # Also restarts after the loop that ran the workers has gone away
+        if not self._tasks or all(task.done() for task in self._tasks):
+            self._ready = asyncio.Semaphore(0)
+            self._tasks = [
+                asyncio.create_task(self._worker(), name=f"processing-worker-{index}")
+                for index in range(self.workers)
+            ]
+            return
+
+        # O'lgan worker'lar o'rniga yangisi (pool kichrayib qolmasin)
+        for index, task in enumerate(self._tasks):
+            if task.done():
+                error = None if task.cancelled() else task.exception()
+                logger.error(f"Processing worker {index} stopped ({error!r}), restarting it")
+                self._tasks[index] = asyncio.create_task(self._worker(), name=f"processing-worker-{index}")
+
+    def _position(self, user_id: int, index: int) -> int:
+        """Jobs served before the ``index``-th job of ``user_id`` under round-robin"""
+        ahead = index
+        for other, jobs in self._queues.items():
+            if other != user_id:
+                ahead += min(len(jobs), index + 1)
+        return max(0, ahead - (self.workers - self._running))
+
+    def submit(self, user_id: int, func: Callable[[], Awaitable[Any]]) -> Job:
+        """
+        Queue a job
+
+        Args:
+            user_id: Telegram user ID (fairness key)
+            func: Coroutine factory doing the work
+
+        Returns:
+            Job to await; ``job.position`` is its place in line
+
+        Raises:
+            QueueFullError: If the queue or the user's share of it is full
+        """
+        self._ensure_workers()
+
+        jobs = self._queues.get(user_id)
+        waiting = len(jobs) if jobs else 0
+        if self._depth >= self.max_size or waiting >= self.max_per_user:
+            self.rejected += 1
+            logger.warning(f"Rejected job from user {user_id}: {waiting} queued, depth {self._depth}")
+            raise QueueFullError(f"Processing queue is full (user {user_id})")
+
+        job = Job(user_id, func, self._position(user_id, waiting))
+        if jobs is None:
+            jobs = self._queues[user_id] = deque()
+        jobs.append(job)
+
+        self._depth += 1
+        self.submitted += 1
+        self.max_depth = max(self.max_depth, self._depth)
+        self._ready.release()
+        return job
+
+    def _next_job(self) -> Job:
+        """Take the oldest job of the next user in the rotation"""
+        user_id, jobs = self._queues.popitem(last=False)
+        job = jobs.popleft()
+        if jobs:
+            # Back of the line for this user's next job
+            self._queues[user_id] = jobs
+        self._depth -= 1
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            await self._ready.acquire()
+            job = self._next_job()
+            if job.future.cancelled():
+                continue
+
+            wait = time.monotonic() - job.enqueued_at
+            self._waits.append(wait)
+            QUEUE_WAIT_SECONDS.observe(wait)
+            self._running += 1
+            try:
+                result = await job.func()
+            except asyncio.CancelledError:
+                job.future.cancel()
+                # Faqat worker'ning o'zi bekor qilinganda to'xtaymiz; job ichidagi
+                # CancelledError (masalan, bekor qilingan so'rovni kutgan job) emas
+                if asyncio.current_task().cancelling():
+                    raise
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                if not job.future.done():
+                    job.future.set_result(result)
+            finally:
+                self._running -= 1
+                self.completed += 1
+
+    async def close(self, timeout: float = 30.0) -> None:
+        """Let queued and running jobs finish (up to ``timeout``), then stop workers"""
+        deadline = time.monotonic() + timeout
+        while (self._depth or self._running) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        # Anything still waiting will never run
+        for jobs in self._queues.values():
+            for job in jobs:
+                job.future.cancel()
+        self._queues.clear()
+        self._depth = 0
+
+    def stats(self) -> Dict[str, float]:
+        """Queue depth and wait-time metrics"""
+        waits = sorted(self._waits)
+        return {
+            "depth": self._depth,
+            "max_depth": self.max_depth,
+            "running": self._running,
+            "users_waiting": len(self._queues),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_avg": statistics.fmean(waits) if waits else 0.0,
+            "wait_p95": waits[int(len(waits) * 0.95)] if waits else 0.0,
+            "wait_max": waits[-1] if waits else 0.0,
+        }
+
+
+# Global processing queue instance
+processing_queue = ProcessingQueue(
+    workers=settings.processing_workers,
+    max_size=settings.processing_queue_max_size,
+    max_per_user=settings.processing_queue_max_per_user,
+)
+
+CallbackMetric(
+    "finance_bot_queue_jobs", "Processing queue jobs by state",
+    lambda: {"waiting": processing_queue.depth, "running": processing_queue.running},
+    ["state"],
+)
+CallbackMetric(
+    "finance_bot_queue_jobs_total", "Processing queue jobs by outcome",
+    lambda: {
+        "submitted": processing_queue.submitted,
+        "completed": processing_queue.completed,
+        "rejected": processing_queue.rejected,
+    },
+    ["outcome"],
+    kind="counter",
+)
@@ -0,0 +1,275 @@
+"""
+Retries, circuit breakers, model fallback and hedging for Gemini calls
+"""
+import asyncio
+import logging
+import random
+import sys
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, TypeVar
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# HTTP status codes worth retrying (rate limit, overload, gateway errors)
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised when every model's circuit breaker is open"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Transient failures: throttling, server errors, timeouts, dropped connections"""
+    # google.genai is imported lazily; until it is, no APIError can exist
+    errors = sys.modules.get("google.genai.errors")
+    if errors is not None and isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_STATUS
+    return isinstance(error, (asyncio.TimeoutError, OSError, httpx.TransportError))
+
+
+def is_model_unavailable(error: BaseException) -> bool:
+    """
+    Errors about the model itself: retired or renamed (404), or not
+    supported for the request (400); another model may still answer
+    """
+    errors = sys.modules.get("google.genai.errors")
+    if errors is None or not isinstance(error, errors.APIError):
+        return False
+    message = (error.message or "").lower()
+    if "model" not in message:
+        return False
+    if error.code == 404:
+        return True
+    return error.code == 400 and any(
+        phrase in message for phrase in ("not supported", "unsupported", "not found")
+    )
+
+
+class CircuitBreaker:
+    """
+    Stops calling a model after repeated failures
+
+    After ``failure_threshold`` consecutive retryable failures the breaker
+    opens and rejects calls for ``reset_timeout`` seconds. Then one trial
+    call is let through (half-open): success closes the breaker, failure
+    opens it again.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_timeout: float,
+        clock: Callable[[], float] = time.monotonic,
+        name: str = "",
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may be made now"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._trial_running or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._trial_running:
+                logger.warning(f"Circuit breaker {self.name} opened after {self.failures} failures")
+            self.opened_at = self.clock()
+        self._trial_running = False
+
+    def release(self) -> None:
+        """Give back a trial slot whose call ended without a verdict"""
+        self._trial_running = False
+
+
+class ResilientCaller:
+    """
+    Runs a model call with retries, per-model breakers, fallback and hedging
+
+    Models are tried in order. Each gets up to ``max_attempts`` tries with
+    exponential backoff and full jitter between them; a model whose breaker
+    is open is skipped. A model that is gone or unsupported (see
+    ``is_model_unavailable``) moves on to the next one without retries;
+    other non-retryable errors (bad request, auth) are raised at once. With ``hedge_after`` set, a call that has not finished after
+    that many seconds is duplicated on the next available model and the
+    first successful answer wins.
+    """
+
+    def __init__(
+        self,
+        models: Sequence[str],
+        max_attempts: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        breaker_threshold: int = 5,
+        breaker_reset: float = 30.0,
+        hedge_after: float = 0.0,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+        clock: Callable[[], float] = time.monotonic,
+        rng: Callable[[], float] = random.random,
+    ):
+        self.models: List[str] = list(models)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self.sleep = sleep
+        self.rng = rng
+        self.breakers: Dict[str, CircuitBreaker] = {
+            model: CircuitBreaker(breaker_threshold, breaker_reset, clock, name=model) for model in self.models
+        }
+
+        self.retries = 0
+        self.fallbacks = 0
+        self.hedges = 0
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Full-jitter delay before retry number ``attempt + 1``"""
+        return self.rng() * min(self.backoff_max, self.backoff_base * 2 ** attempt)
+
+    async def retry(self, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        Retry a model-independent call (uploads, deletes) with backoff
+
+        Args:
+            func: Coroutine factory, called once per attempt
+
+        Returns:
+            Result of the first successful attempt
+        """
+        for attempt in range(self.max_attempts):
+            try:
+                return await func()
+            except Exception as e:
+                if not is_retryable(e) or attempt + 1 == self.max_attempts:
+                    raise
+                self.retries += 1
+                delay = self.backoff_delay(attempt)
+                logger.warning(f"Gemini call failed ({e}), retrying in {delay:.2f}s")
+                await self.sleep(delay)
+
+    async def call(self, func: Callable[[str], Awaitable[T]], hedge: bool = True) -> T:
+        """
+        Call ``func(model)`` with retries and fallback across models
+
+        Args:
+            func: Coroutine factory taking the model name
+            hedge: Allow hedging; off for calls with side effects while they
+                run (streaming to the user), which two attempts would repeat
+
+        Returns:
+            Result of the first successful call
+
+        Raises:
+            The last retryable or model-unavailable error, CircuitOpenError
+            if no model could be tried, or any other non-retryable error
+            immediately
+        """
+        last_error: Optional[BaseException] = None
+        for index, model in enumerate(self.models):
+            if index and last_error is not None:
+                self.fallbacks += 1
+                logger.warning(f"Falling back to {model} after: {last_error}")
+
+            breaker = self.breakers[model]
+            for attempt in range(self.max_attempts):
+                if not breaker.allow():
+                    break
+                try:
+                    result = await self._call_once(func, model, index, hedge)
+                except asyncio.CancelledError:
+                    breaker.release()
+                    raise
+                except Exception as e:
+                    if is_model_unavailable(e):
+                        # Retrying will not bring the model back: try the next one
+                        breaker.record_failure()
+                        last_error = e
+                        break
+                    if not is_retryable(e):
+                        breaker.release()
+                        raise
+                    breaker.record_failure()
+                    last_error = e
+                    if attempt + 1 < self.max_attempts:
+                        self.retries += 1
+                        await self.sleep(self.backoff_delay(attempt))
+                    continue
+
+                breaker.record_success()
+                return result
+
+        if last_error is None:
+            raise CircuitOpenError(f"All Gemini models are unavailable: {', '.join(self.models)}")
+        raise last_error
+
+    def _hedge_model(self, index: int) -> Optional[str]:
+        """Next model after ``index`` whose breaker is closed, else the same model"""
+        for model in self.models[index + 1:]:
+            if self.breakers[model].state == "closed":
+                return model
+        return self.models[index]
+
+    async def _call_once(self, func: Callable[[str], Awaitable[T]], model: str, index: int, hedge: bool) -> T:
+        """One attempt, duplicated on another model if it is too slow"""
+        if not (hedge and self.hedge_after):
+            return await func(model)
+
+        primary = asyncio.ensure_future(func(model))
+        attempts = {primary}
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=self.hedge_after)
+            if done:
+                return primary.result()
+
+            hedge_model = self._hedge_model(index)
+            self.hedges += 1
+            logger.info(f"{model} slower than {self.hedge_after}s, hedging on {hedge_model}")
+            hedge_task = asyncio.ensure_future(func(hedge_model))
+            attempts.add(hedge_task)
+
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Prefer the primary's answer when both finished together
+                for task in sorted(done, key=lambda task: task is not primary):
+                    if task.exception() is None:
+                        return task.result()
+                    if task is hedge_task and hedge_model != model and is_retryable(hedge_task.exception()):
+                        self.breakers[hedge_model].record_failure()
+            # Both failed: report the primary's error
+            raise primary.exception()
+        finally:
+            # Also when the caller is cancelled: no attempt keeps running (and using quota)
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
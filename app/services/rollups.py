@@ -0,0 +1,232 @@
+"""
+Incrementally maintained per-user report totals
+"""
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.utils.db import values_clause
+
+logger = logging.getLogger(__name__)
+
+PERIODS = ("day", "week", "month")
+
+ROLLUP_KEY = ("user_id", "period", "period_start", "category", "type", "currency")
+
+# Rows per INSERT statement (8 parameters each)
+_ROWS_PER_STATEMENT = 500
+
+_CENTS = Decimal("0.01")
+
+# (user_id, period, period_start, category, type, currency) -> [total, count]
+Totals = Dict[Tuple[int, str, date, str, str, str], list]
+
+
+def period_start(day: date, period: str) -> date:
+    """
+    First day of the period containing ``day``
+
+    Args:
+        day: Any date
+        period: "day", "week" (Monday-based) or "month"
+
+    Returns:
+        Start date of the period
+    """
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    return day
+
+
+def period_end(start: date, period: str) -> date:
+    """Last day of the period starting at ``start``"""
+    if period == "week":
+        return start + timedelta(days=6)
+    if period == "month":
+        next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return next_month - timedelta(days=1)
+    return start
+
+
+def _accumulate(totals: Totals, user_id: int, tx_type: str, category: str, currency: str,
+                day: date, amount: Decimal, count: int = 1) -> None:
+    """Add one (possibly pre-aggregated) transaction to every period bucket"""
+    for period in PERIODS:
+        entry = totals[(user_id, period, period_start(day, period), category, tx_type, currency)]
+        entry[0] += amount
+        entry[1] += count
+
+
+def _as_decimal(value) -> Decimal:
+    """SQLite hands back sums as float/str, Postgres as Decimal"""
+    return Decimal(str(value or 0)).quantize(_CENTS)
+
+
+def _as_date(value) -> date:
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+class RollupService:
+    """
+    Keeps ``transaction_rollups`` in step with ``transactions``
+
+    Every transaction write calls ``apply`` inside the same DB transaction,
+    adding its amount to the day, week and month buckets with one
+    ``INSERT ... ON CONFLICT DO UPDATE``. A report then reads
+    O(categories) rows instead of scanning the user's transactions.
+    ``check`` and ``rebuild`` recompute the totals from scratch.
+    """
+
+    async def apply(self, connection, rows: Iterable[tuple]) -> None:
+        """
+        Add freshly inserted transactions to the rollups
+
+        Args:
+            connection: Connection of the transaction that inserted the rows
+            rows: (user_id, type, amount, currency, category, date) tuples
+        """
+        totals: Totals = defaultdict(lambda: [Decimal(0), 0])
+        for user_id, tx_type, amount, currency, category, day in rows:
+            _accumulate(totals, user_id, tx_type, category, currency, day, amount)
+        await self._upsert(connection, totals, increment=True)
+
+    async def _upsert(self, connection, totals: Totals, increment: bool) -> None:
+        """Write totals, either adding to or replacing existing buckets"""
+        if not totals:
+            return
+
+        columns = ", ".join(f'"{column}"' for column in (*ROLLUP_KEY, "total", "count"))
+        conflict = ", ".join(f'"{column}"' for column in ROLLUP_KEY)
+        if increment:
+            assignments = (
+                '"total" = "transaction_rollups"."total" + EXCLUDED."total", '
+                '"count" = "transaction_rollups"."count" + EXCLUDED."count"'
+            )
+        else:
+            assignments = '"total" = EXCLUDED."total", "count" = EXCLUDED."count"'
+
+        # Sorted so concurrent writers lock buckets in the same order
+        items = sorted(totals.items())
+        for start in range(0, len(items), _ROWS_PER_STATEMENT):
+            values, params = values_clause(
+                connection,
+                [(*key, total, count) for key, (total, count) in items[start:start + _ROWS_PER_STATEMENT]],
+            )
+            await connection.execute_query(
+                f'INSERT INTO "transaction_rollups" ({columns}) VALUES {values} '
+                f'ON CONFLICT ({conflict}) DO UPDATE SET {assignments}, '
+                f'"updated_at" = CURRENT_TIMESTAMP',
+                params,
+            )
+
+    async def report(self, user_id: int, period: str, day: Optional[date] = None) -> List[dict]:
+        """
+        Totals by category (and currency) for the period containing ``day``
+
+        Args:
+            user_id: Internal user ID (users.id)
+            period: "day", "week" or "month"
+            day: Date inside the period (defaults to today)
+
+        Returns:
+            List of {"type", "category", "currency", "total", "count"} sorted by
+            total, largest first
+        """
+        from app.models import TransactionRollup
+
+        start = period_start(day or date.today(), period)
+        rows = await TransactionRollup.filter(
+            user_id=user_id, period=period, period_start=start, count__gt=0
+        ).values("type", "category", "currency", "total", "count")
+        for row in rows:
+            row["total"] = _as_decimal(row["total"])
+        return sorted(rows, key=lambda row: row["total"], reverse=True)
+
+    async def _expected(self, connection, user_id: Optional[int]) -> Totals:
+        """Recompute totals from transactions (grouped per day in SQL)"""
+        from app.models import Transaction
+        from tortoise.functions import Count, Sum
+
+        query = Transaction.all().using_db(connection)
+        if user_id is not None:
+            query = query.filter(user_id=user_id)
+        grouped = await (
+            query.annotate(day_total=Sum("amount"), day_count=Count("id"))
+            .group_by("user_id", "type", "category", "currency", "date")
+            .values_list("user_id", "type", "category", "currency", "date", "day_total", "day_count")
+        )
+
+        totals: Totals = defaultdict(lambda: [Decimal(0), 0])
+        for uid, tx_type, category, currency, day, total, count in grouped:
+            _accumulate(totals, uid, tx_type, category, currency, _as_date(day), _as_decimal(total), count)
+        return totals
+
+    async def _stored(self, connection, user_id: Optional[int]) -> Totals:
+        """Current rollup rows"""
+        from app.models import TransactionRollup
+
+        query = TransactionRollup.filter(count__gt=0).using_db(connection)
+        if user_id is not None:
+            query = query.filter(user_id=user_id)
+        rows = await query.values_list(*ROLLUP_KEY, "total", "count")
+        return {
+            (uid, period, _as_date(start), category, tx_type, currency): [_as_decimal(total), count]
+            for uid, period, start, category, tx_type, currency, total, count in rows
+        }
+
+    async def check(self, user_id: Optional[int] = None) -> List[tuple]:
+        """
+        Compare rollups with a full recomputation
+
+        Args:
+            user_id: Limit the check to one user (all users if None)
+
+        Returns:
+            List of (key, stored [total, count] or None, expected [total, count] or None)
+        """
+        from tortoise import Tortoise
+
+        connection = Tortoise.get_connection("default")
+        expected = await self._expected(connection, user_id)
+        stored = await self._stored(connection, user_id)
+
+        mismatches = []
+        for key in sorted(expected.keys() | stored.keys()):
+            if expected.get(key) != stored.get(key):
+                mismatches.append((key, stored.get(key), expected.get(key)))
+        return mismatches
+
+    async def rebuild(self, user_id: Optional[int] = None) -> int:
+        """
+        Replace rollups with totals recomputed from transactions
+
+        Args:
+            user_id: Limit the rebuild to one user (all users if None)
+
+        Returns:
+            Number of rollup rows written
+        """
+        from app.models import TransactionRollup
+        from tortoise.transactions import in_transaction
+
+        async with in_transaction() as connection:
+            # Delete first: it waits for writers holding these buckets, so
+            # the recomputation below already sees their transactions
+            query = TransactionRollup.all().using_db(connection)
+            if user_id is not None:
+                query = query.filter(user_id=user_id)
+            await query.delete()
+
+            totals = await self._expected(connection, user_id)
+            await self._upsert(connection, totals, increment=False)
+
+        logger.info(f"Rebuilt {len(totals)} rollups (user_id={user_id})")
+        return len(totals)
+
+
+# Global rollup service instance
+rollup_service = RollupService()
@@ -0,0 +1,290 @@
+"""
+Write-behind buffer that persists transactions in batches
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
+
+from app.metrics import CallbackMetric
+from app.services.financial_record import FinancialRecord
+from app.services.rollups import rollup_service
+from app.utils.db import values_clause
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+TRANSACTION_COLUMNS = (
+    "user_id", "type", "amount", "currency", "category", "description", "date", "transcript", "source",
+)
+
+# Rows per INSERT statement (keeps parameter count well below driver limits)
+_ROWS_PER_STATEMENT = 100
+
+# Dead-lettered rows kept in memory for inspection
+_DEAD_LETTERS_KEPT = 1000
+
+
+class TransactionBuffer:
+    """
+    Collects transactions in memory and writes them with multi-row INSERTs
+
+    A flush happens when ``max_size`` rows are pending or every
+    ``flush_interval`` seconds, whichever comes first. ``close()`` writes
+    whatever is left, so nothing is lost on a clean shutdown.
+
+    A batch that fails is split in halves until the failing rows are
+    isolated, so one bad row (e.g. an amount too large for the column)
+    does not hold back the others. A row that fails on its own
+    ``max_attempts`` times is logged and dead-lettered.
+    """
+
+    def __init__(self, max_size: int, flush_interval: float, max_attempts: int = 3):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+
+        # (telegram_id, row without user_id, failed attempts)
+        self._pending: List[tuple] = []
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._flush_tasks: set[asyncio.Task] = set()
+
+        self.flushed_rows = 0
+        self.flushes = 0
+        self.dead_lettered = 0
+        self.dead_letters: Deque[Tuple[int, tuple, str]] = deque(maxlen=_DEAD_LETTERS_KEPT)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(
+        self,
+        telegram_id: int,
+        financial_data: Union[FinancialRecord, Dict[str, Any]],
+        source: str,
+        transcript: Optional[str] = None,
+    ) -> None:
+        """
+        Queue a transaction for writing (never blocks the handler)
+
+        Args:
+            telegram_id: Telegram user ID
+            financial_data: Record, or an extraction dict to normalize
+            source: "voice" or "text"
+            transcript: Voice transcript, if any
+        """
+        self._pending.append((telegram_id, self._row(financial_data, source, transcript), 0))
+
+        # Bitta flush yetarli: u navbatdagi hamma yozuvlarni oladi
+        if len(self._pending) >= self.max_size and not self._flush_tasks:
+            task = asyncio.create_task(self.flush())
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+
+    async def save(
+        self,
+        telegram_id: int,
+        financial_data: Union[FinancialRecord, Dict[str, Any]],
+        source: str,
+        transcript: Optional[str] = None,
+    ) -> None:
+        """
+        Write one transaction right away, bypassing the buffer
+
+        For callers that must know the row is stored (e.g. durable jobs):
+        a failed write raises instead of being retried in the background.
+
+        Args:
+            telegram_id: Telegram user ID
+            financial_data: Record, or an extraction dict to normalize
+            source: "voice" or "text"
+            transcript: Voice transcript, if any
+        """
+        await self._write([(telegram_id, self._row(financial_data, source, transcript), 0)])
+        self.flushed_rows += 1
+
+    @staticmethod
+    def _row(
+        financial_data: Union[FinancialRecord, Dict[str, Any]],
+        source: str,
+        transcript: Optional[str],
+    ) -> tuple:
+        record = FinancialRecord.coerce(financial_data)
+        return (
+            record.type,
+            record.amount,
+            record.currency,
+            record.category,
+            record.description,
+            record.date,
+            transcript,
+            source,
+        )
+
+    async def start(self) -> None:
+        """Start the periodic flush timer"""
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def close(self) -> None:
+        """Stop the timer and drain everything that is still pending"""
+        if self._timer is not None:
+            self._timer.cancel()
+            try:
+                await self._timer
+            except asyncio.CancelledError:
+                pass
+            self._timer = None
+
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+        await self.flush()
+
+    async def flush(self) -> int:
+        """
+        Write all pending transactions
+
+        Rows of a failed batch are retried on the next flush (up to
+        ``10 * max_size`` rows are kept, newest first), unless they failed
+        on their own ``max_attempts`` times.
+
+        Returns:
+            Number of rows written
+        """
+        async with self._lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+
+            failed: List[tuple] = []
+            written = await self._write_split(batch, failed)
+            if failed:
+                logger.error(f"Failed to write {len(failed)} of {len(batch)} transactions: {failed[0][3]}")
+                self._requeue(failed, isolated=written > 0)
+
+            if written:
+                self.flushes += 1
+                self.flushed_rows += written
+                logger.info(f"Flushed {written} transactions")
+            return written
+
+    async def _write_split(self, batch: List[tuple], failed: List[tuple]) -> int:
+        """Write ``batch``, halving it on failure; rows that fail alone go to ``failed``"""
+        try:
+            await self._write(batch)
+            return len(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                failed.append((*batch[0], str(e)))
+                return 0
+
+        middle = len(batch) // 2
+        return (
+            await self._write_split(batch[:middle], failed)
+            + await self._write_split(batch[middle:], failed)
+        )
+
+    def _requeue(self, failed: List[tuple], isolated: bool) -> None:
+        """
+        Put failed rows back, dead-lettering the ones that keep failing
+
+        Args:
+            failed: (telegram_id, row, attempts, error) tuples
+            isolated: Other rows of the same flush were written, so these
+                rows are at fault (not the database) and the attempt counts
+        """
+        for telegram_id, row, attempts, error in failed:
+            if isolated:
+                attempts += 1
+            if attempts >= self.max_attempts:
+                self.dead_lettered += 1
+                self.dead_letters.append((telegram_id, row, error))
+                logger.error(
+                    f"Dropping transaction of user {telegram_id} after {attempts} failed writes: "
+                    f"{row} ({error})"
+                )
+            else:
+                # Yangi yozuvlar ortidan: xato yozuv navbat boshini band qilmaydi
+                self._pending.append((telegram_id, row, attempts))
+
+        # Xotira cheklangan: eng eski yozuvlar tashlanadi
+        overflow = len(self._pending) - self.max_size * 10
+        if overflow > 0:
+            logger.error(f"Write buffer full, dropping {overflow} oldest transactions")
+            del self._pending[:overflow]
+
+    async def _write(self, batch: List[tuple]) -> None:
+        """Resolve users, insert the batch and update rollups in one DB transaction"""
+        from tortoise.transactions import in_transaction
+
+        async with in_transaction() as connection:
+            user_ids = await self._resolve_users(
+                connection, {telegram_id for telegram_id, _, _ in batch}
+            )
+            rows = [(user_ids[telegram_id], *row) for telegram_id, row, _ in batch]
+
+            for start in range(0, len(rows), _ROWS_PER_STATEMENT):
+                values, params = values_clause(connection, rows[start:start + _ROWS_PER_STATEMENT])
+                columns = ", ".join(f'"{column}"' for column in TRANSACTION_COLUMNS)
+                await connection.execute_query(
+                    f'INSERT INTO "transactions" ({columns}) VALUES {values}', params
+                )
+
+            # Report totals move together with the rows they summarize
+            await rollup_service.apply(
+                connection,
+                ((user_id, tx_type, amount, currency, category, day)
+                 for user_id, tx_type, amount, currency, category, _, day, _, _ in rows),
+            )
+
+    @staticmethod
+    async def _resolve_users(connection, telegram_ids: set) -> Dict[int, int]:
+        """Map telegram IDs to users.id, creating users that never sent /start"""
+        from app.models import User
+
+        found = dict(
+            await User.filter(telegram_id__in=telegram_ids)
+            .using_db(connection)
+            .values_list("telegram_id", "id")
+        )
+        missing = telegram_ids - found.keys()
+        if missing:
+            await User.bulk_create(
+                [User(telegram_id=telegram_id) for telegram_id in missing],
+                ignore_conflicts=True,
+                using_db=connection,
+            )
+            found.update(
+                await User.filter(telegram_id__in=missing)
+                .using_db(connection)
+                .values_list("telegram_id", "id")
+            )
+        return found
+
+
+# Global buffer instance
+transaction_buffer = TransactionBuffer(
+    max_size=settings.transaction_buffer_size,
+    flush_interval=settings.transaction_flush_interval,
+)
+
+CallbackMetric(
+    "finance_bot_transactions_pending", "Transactions waiting in the write buffer",
+    lambda: len(transaction_buffer),
+)
+CallbackMetric(
+    "finance_bot_transactions_written_total", "Transactions written by the buffer",
+    lambda: transaction_buffer.flushed_rows,
+    kind="counter",
+)
+CallbackMetric(
+    "finance_bot_transactions_dead_lettered_total", "Transactions dropped after repeated write failures",
+    lambda: transaction_buffer.dead_lettered,
+    kind="counter",
+)
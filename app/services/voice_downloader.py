@@ -0,0 +1,161 @@
+"""
+Voice note downloads from Telegram with size checks and cached file paths
+"""
+import logging
+from typing import Dict, Tuple
+
+from aiogram import Bot
+
+from app.metrics import CallbackMetric
+from app.utils.ttl_cache import TTLCache
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class VoiceTooLargeError(Exception):
+    """Voice note is bigger than ``voice_max_bytes``"""
+
+
+class _Buffer:
+    """
+    Writable file object over one preallocated bytearray
+
+    ``Bot.download_file`` writes each network chunk straight into it; the
+    array only grows when the real size exceeds the announced one.
+    """
+
+    def __init__(self, size: int, limit: int):
+        self.data = bytearray(size)
+        self.limit = limit
+        self.length = 0
+        self.copied = 0
+
+    def write(self, chunk: bytes) -> int:
+        end = self.length + len(chunk)
+        if end > self.limit:
+            raise VoiceTooLargeError(f"Voice note exceeds {self.limit} bytes")
+        # Past the preallocated size the slice assignment grows the array
+        self.data[self.length:end] = chunk
+        self.length = end
+        self.copied += len(chunk)
+        return len(chunk)
+
+    def flush(self) -> None:
+        pass
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return 0
+
+    def view(self) -> memoryview:
+        return memoryview(self.data)[:self.length]
+
+
+class VoiceDownloader:
+    """
+    Downloads voice notes into a single buffer
+
+    Notes whose announced ``file_size`` is over the limit are rejected
+    before any request. ``file_id -> file_path`` answers of ``getFile`` are
+    cached for ``path_ttl`` seconds (Telegram keeps a path valid for at
+    least an hour), so repeated or retried downloads skip that round trip.
+    The file is streamed into a buffer sized from ``file_size`` and handed
+    on as a memoryview, without the BytesIO + ``read()`` copies.
+    """
+
+    def __init__(self, max_bytes: int, path_ttl: float, max_entries: int = 10000):
+        self.max_bytes = max_bytes
+        self._paths = TTLCache(max_entries, path_ttl)
+
+        self.downloads = 0
+        self.rejected = 0
+        self.path_hits = 0
+        self.path_misses = 0
+        self.bytes_downloaded = 0
+        self.bytes_copied = 0
+
+    def too_large(self, voice) -> bool:
+        """Whether Telegram's announced size is over the limit"""
+        return bool(self.max_bytes and voice.file_size and voice.file_size > self.max_bytes)
+
+    async def _file_path(self, bot: Bot, file_id: str) -> Tuple[str, bool]:
+        """File path for a file_id and whether it came from the cache"""
+        file_path = self._paths.get(file_id)
+        if file_path is not None:
+            self.path_hits += 1
+            return file_path, True
+
+        self.path_misses += 1
+        file = await bot.get_file(file_id)
+        if self.max_bytes and file.file_size and file.file_size > self.max_bytes:
+            self.rejected += 1
+            raise VoiceTooLargeError(f"Voice note is {file.file_size} bytes")
+        self._paths.set(file_id, file.file_path)
+        return file.file_path, False
+
+    async def download(self, bot: Bot, voice) -> memoryview:
+        """
+        Download a voice note
+
+        Args:
+            bot: Bot to download with
+            voice: ``message.voice`` (``file_id`` and optional ``file_size``)
+
+        Returns:
+            The file's bytes as a memoryview over the download buffer
+
+        Raises:
+            VoiceTooLargeError: The note is over ``max_bytes``
+        """
+        if self.too_large(voice):
+            self.rejected += 1
+            raise VoiceTooLargeError(f"Voice note is {voice.file_size} bytes")
+
+        file_path, cached = await self._file_path(bot, voice.file_id)
+        buffer = _Buffer(voice.file_size or 0, self.max_bytes or float("inf"))
+        try:
+            await bot.download_file(file_path, destination=buffer, seek=False)
+        except VoiceTooLargeError:
+            self.rejected += 1
+            raise
+        except Exception as e:
+            if not cached:
+                raise
+            # Eskirgan file_path: yangisini olib, bir marta qayta urinish
+            logger.info(f"Cached file path failed ({e}), refreshing")
+            self._paths.pop(voice.file_id)
+            file_path, _ = await self._file_path(bot, voice.file_id)
+            buffer = _Buffer(voice.file_size or 0, self.max_bytes or float("inf"))
+            await bot.download_file(file_path, destination=buffer, seek=False)
+
+        self.downloads += 1
+        self.bytes_downloaded += buffer.length
+        self.bytes_copied += buffer.copied
+        return buffer.view()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "downloads": self.downloads,
+            "rejected": self.rejected,
+            "path_hits": self.path_hits,
+            "path_misses": self.path_misses,
+        }
+
+
+# Global downloader instance
+voice_downloader = VoiceDownloader(
+    max_bytes=settings.voice_max_bytes,
+    path_ttl=settings.voice_file_path_ttl,
+)
+
+CallbackMetric(
+    "finance_bot_voice_downloads_total", "Voice downloads and file path cache lookups",
+    voice_downloader.stats,
+    ["event"],
+    kind="counter",
+)
+CallbackMetric(
+    "finance_bot_voice_download_bytes_total", "Voice bytes downloaded",
+    lambda: voice_downloader.bytes_downloaded,
+    kind="counter",
+)
@@ -0,0 +1,421 @@
+"""
+Sharded serving mode: one process receives updates, shard processes handle them
+
+The supervisor long-polls Telegram and only reads each update's user ID;
+everything else (parsing into aiogram types, handlers, logging) runs in
+``settings.shard_workers`` forked processes, each with the full Dispatcher.
+A user's updates always go to the same shard and run there one after the
+other, so per-user ordering holds while different users use every core.
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import zlib
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Set, Tuple
+
+import aiohttp
+from aiogram import Bot, Dispatcher
+from aiogram.client.telegram import PRODUCTION
+
+from app import metrics
+from app.metrics import CallbackMetric
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Long polling timeout of getUpdates (seconds)
+POLL_TIMEOUT = 30
+# Largest update line on a shard pipe
+MAX_UPDATE_BYTES = 1 << 22
+# Seconds shards get to finish their updates on shutdown
+SHUTDOWN_TIMEOUT = 60.0
+
+# Router of this process when it is the supervisor (for metrics)
+_router: Optional["ShardRouter"] = None
+
+# Event fields of an update that carry the sender in "from"
+_USER_FIELDS = ("message", "edited_message", "callback_query", "inline_query", "chosen_inline_result",
+                "shipping_query", "pre_checkout_query", "poll_answer", "my_chat_member", "chat_member",
+                "chat_join_request", "message_reaction")
+
+
+def update_user_id(update: Dict[str, Any]) -> Optional[int]:
+    """Telegram user an update comes from, if it has one"""
+    for field in _USER_FIELDS:
+        event = update.get(field)
+        if event is not None:
+            user = event.get("from") or event.get("user")
+            return user.get("id") if user else None
+    return None
+
+
+def shard_for(user_id: int, shards: int) -> int:
+    """Stable shard of a user (the same in every process and run)"""
+    return zlib.crc32(user_id.to_bytes(8, "little", signed=True)) % shards
+
+
+class KeyedSerializer:
+    """
+    Runs jobs concurrently, except jobs with the same key: those run one
+    at a time in submission order
+
+    At most ``limit`` jobs run at once. A job waiting for the previous job
+    of its key does not hold one of those slots, so one busy user cannot
+    stall everyone else. ``submit`` waits only while ``max_pending`` jobs
+    (default ``10 * limit``) are queued or running.
+    """
+
+    def __init__(self, limit: int, max_pending: Optional[int] = None):
+        self._slots = asyncio.Semaphore(limit)
+        self._queued = asyncio.Semaphore(max_pending or limit * 10)
+        self._tails: Dict[Hashable, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, key: Optional[Hashable], job: Callable[[], Awaitable[Any]]) -> None:
+        """Schedule ``job`` after the previous job of ``key`` (None = no ordering)"""
+        await self._queued.acquire()
+        previous = self._tails.get(key) if key is not None else None
+        task = asyncio.create_task(self._run(previous, job))
+        self._tasks.add(task)
+        if key is not None:
+            self._tails[key] = task
+        task.add_done_callback(lambda task: self._done(key, task))
+
+    async def _run(self, previous: Optional[asyncio.Task], job: Callable[[], Awaitable[Any]]) -> None:
+        if previous is not None:
+            # Oldingi xato bo'lsa ham navbat davom etadi
+            await asyncio.wait([previous])
+        # Slot faqat ishga tushishdan oldin olinadi
+        async with self._slots:
+            await job()
+
+    def _done(self, key: Optional[Hashable], task: asyncio.Task) -> None:
+        self._queued.release()
+        self._tasks.discard(task)
+        if key is not None and self._tails.get(key) is task:
+            del self._tails[key]
+
+    async def join(self) -> None:
+        """Wait until every submitted job has finished"""
+        while self._tasks:
+            await asyncio.wait(list(self._tasks))
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+
+async def _pipe_reader(fd: int) -> asyncio.StreamReader:
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=MAX_UPDATE_BYTES)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(fd, "rb", 0))
+    return reader
+
+
+async def _pipe_writer(fd: int) -> asyncio.StreamWriter:
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, os.fdopen(fd, "wb", 0))
+    return asyncio.StreamWriter(transport, protocol, None, loop)
+
+
+async def run_shard(
+    dp: Dispatcher,
+    bot: Bot,
+    updates: asyncio.StreamReader,
+    ack: Callable[[bytes], None],
+    max_in_flight: int,
+) -> int:
+    """
+    Feed updates (one JSON object per line) to the dispatcher until EOF
+
+    Every processed update is acknowledged with one byte, so the
+    supervisor knows each shard's backlog.
+
+    Returns:
+        Number of updates processed
+    """
+    serializer = KeyedSerializer(max_in_flight)
+    processed = 0
+
+    async def handle(update: Dict[str, Any]) -> None:
+        nonlocal processed
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception as e:
+            logger.error(f"Update {update.get('update_id')} failed: {e}")
+        finally:
+            processed += 1
+            ack(b".")
+
+    while True:
+        line = await updates.readline()
+        if not line:
+            break
+        update = json.loads(line)
+        await serializer.submit(update_user_id(update), lambda update=update: handle(update))
+
+    await serializer.join()
+    return processed
+
+
+async def _shard_main(index: int, dp: Dispatcher, create_bot: Callable[[], Bot], update_fd: int, ack_fd: int) -> None:
+    updates = await _pipe_reader(update_fd)
+    ack = await _pipe_writer(ack_fd)
+    bot = create_bot()
+    # Startup/shutdown hooks as in polling mode (database, metrics port, buffers)
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    try:
+        processed = await run_shard(dp, bot, updates, ack.write, settings.shard_max_in_flight)
+        logger.info(f"Shard {index} processed {processed} update(s)")
+    finally:
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        await bot.session.close()
+        ack.close()
+
+
+def _shard_process(index: int, dp: Dispatcher, create_bot: Callable[[], Bot], update_fd: int, ack_fd: int,
+                   inherited: Sequence[int]) -> None:
+    """Entry point of a forked shard process"""
+    # Other shards' pipe ends: holding them would hide the supervisor's EOF
+    for fd in inherited:
+        os.close(fd)
+    # Ctrl-C reaches the whole process group; the supervisor decides when shards stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Shard N exposes metrics on METRICS_PORT + N + 1 (the supervisor has METRICS_PORT)
+    metrics.worker_index = index + 1
+    asyncio.run(_shard_main(index, dp, create_bot, update_fd, ack_fd))
+
+
+class ShardRouter:
+    """Supervisor side of the shard pipes: routes updates and counts acknowledgements"""
+
+    def __init__(self, writers: Sequence[asyncio.StreamWriter]):
+        self.writers = list(writers)
+        self.routed = [0] * len(self.writers)
+        self.done = [0] * len(self.writers)
+        # Set when a shard closes its pipe before being told to stop
+        self.lost = asyncio.Event()
+        self._closing = False
+        self._ack_tasks: List[asyncio.Task] = []
+
+    @classmethod
+    async def connect(cls, update_fds: Sequence[int], ack_fds: Sequence[int]) -> "ShardRouter":
+        """Router over already started shards' pipe ends"""
+        router = cls([await _pipe_writer(fd) for fd in update_fds])
+        for index, fd in enumerate(ack_fds):
+            reader = await _pipe_reader(fd)
+            router._ack_tasks.append(asyncio.create_task(router._read_acks(index, reader)))
+        return router
+
+    def shard_of(self, update: Dict[str, Any]) -> int:
+        user_id = update_user_id(update)
+        if user_id is None:
+            # No user to keep in order: spread by update ID
+            return update.get("update_id", 0) % len(self.writers)
+        return shard_for(user_id, len(self.writers))
+
+    async def route(self, update: Dict[str, Any]) -> int:
+        """
+        Send an update to its shard, waiting while that shard's pipe is full
+
+        Returns:
+            Shard index
+        """
+        shard = self.shard_of(update)
+        writer = self.writers[shard]
+        writer.write(json.dumps(update, ensure_ascii=False, separators=(",", ":")).encode() + b"\n")
+        self.routed[shard] += 1
+        await writer.drain()
+        return shard
+
+    async def _read_acks(self, index: int, reader: asyncio.StreamReader) -> None:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            self.done[index] += len(data)
+        if not self._closing:
+            logger.error(f"Shard {index} exited")
+            self.lost.set()
+
+    async def close(self, timeout: float = SHUTDOWN_TIMEOUT) -> bool:
+        """
+        Tell the shards there are no more updates and wait for them to finish
+
+        Returns:
+            True if every shard finished within ``timeout``
+        """
+        self._closing = True
+        for writer in self.writers:
+            writer.close()
+        if not self._ack_tasks:
+            return True
+        _, pending = await asyncio.wait(self._ack_tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        return not pending
+
+    def in_flight(self) -> List[int]:
+        """Updates sent to each shard and not yet processed"""
+        return [routed - done for routed, done in zip(self.routed, self.done)]
+
+    def stats(self) -> Dict[Tuple[str, str], int]:
+        """Per shard and counter, for metrics"""
+        stats = {}
+        for index, (routed, done) in enumerate(zip(self.routed, self.done)):
+            stats[(str(index), "routed")] = routed
+            stats[(str(index), "done")] = done
+        return stats
+
+    def report(self) -> str:
+        """One log line with each shard's share of the updates and backlog"""
+        total = sum(self.routed) or 1
+        return ", ".join(
+            f"#{index}: {routed} ({100 * routed / total:.0f}%, {backlog} in flight)"
+            for index, (routed, backlog) in enumerate(zip(self.routed, self.in_flight()))
+        )
+
+
+def fork_shards(dp: Dispatcher, create_bot: Callable[[], Bot], count: int) -> Tuple[list, List[int], List[int]]:
+    """
+    Fork ``count`` shard processes (call before the supervisor's event loop)
+
+    Returns:
+        Processes, and the supervisor's update and ack pipe ends
+    """
+    pipes = [(os.pipe(), os.pipe()) for _ in range(count)]
+    every_fd = [fd for update_pipe, ack_pipe in pipes for fd in (*update_pipe, *ack_pipe)]
+    context = multiprocessing.get_context("fork")
+    processes = []
+    for index, ((update_read, _), (_, ack_write)) in enumerate(pipes):
+        inherited = [fd for fd in every_fd if fd not in (update_read, ack_write)]
+        process = context.Process(
+            target=_shard_process,
+            args=(index, dp, create_bot, update_read, ack_write, inherited),
+            name=f"shard-{index}",
+        )
+        process.start()
+        processes.append(process)
+
+    # Shards' ends stay open only in the shards
+    for (update_read, _), (_, ack_write) in pipes:
+        os.close(update_read)
+        os.close(ack_write)
+    return processes, [update_write for (_, update_write), _ in pipes], [ack_read for _, (ack_read, _) in pipes]
+
+
+async def poll_updates(router: ShardRouter, url: str, allowed_updates: Optional[List[str]] = None) -> None:
+    """
+    Long-poll ``getUpdates`` and route every update (runs until cancelled)
+
+    The JSON is decoded once to read the user; updates are confirmed to
+    Telegram (next offset) after they are handed to their shard.
+    """
+    offset = 0
+    backoff = 1.0
+    timeout = aiohttp.ClientTimeout(total=POLL_TIMEOUT + 10)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        while True:
+            try:
+                async with session.post(url, json={
+                    "offset": offset, "timeout": POLL_TIMEOUT, "allowed_updates": allowed_updates,
+                }) as response:
+                    body = await response.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                logger.warning(f"getUpdates failed, retrying in {backoff:.0f}s: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+
+            if not body.get("ok"):
+                retry_after = (body.get("parameters") or {}).get("retry_after")
+                logger.error(f"getUpdates error: {body.get('description')}")
+                await asyncio.sleep(retry_after or backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+
+            backoff = 1.0
+            for update in body["result"]:
+                await router.route(update)
+                offset = update["update_id"] + 1
+
+
+async def _report_load(router: ShardRouter, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        logger.info(f"Shard load: {router.report()}")
+
+
+async def _supervise(dp: Dispatcher, update_fds: List[int], ack_fds: List[int]) -> int:
+    global _router
+    router = _router = await ShardRouter.connect(update_fds, ack_fds)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+
+    metrics_runner = None
+    if settings.metrics_enabled:
+        metrics_runner = await metrics.start_metrics_server(settings.metrics_host, settings.metrics_port)
+
+    tasks = [asyncio.create_task(poll_updates(
+        router, PRODUCTION.api_url(settings.bot_token, "getUpdates"), dp.resolve_used_update_types(),
+    ))]
+    if settings.shard_report_interval:
+        tasks.append(asyncio.create_task(_report_load(router, settings.shard_report_interval)))
+
+    stop_waiter = asyncio.create_task(stop.wait())
+    lost_waiter = asyncio.create_task(router.lost.wait())
+    await asyncio.wait([stop_waiter, lost_waiter], return_when=asyncio.FIRST_COMPLETED)
+    for task in (*tasks, stop_waiter, lost_waiter):
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    logger.info(f"Stopping shards. Load: {router.report()}")
+    finished = await router.close()
+    await metrics.stop_metrics_server(metrics_runner)
+    if router.lost.is_set():
+        # Bir shard yiqildi: hammasini qayta ishga tushirish uchun (systemd/docker)
+        return 1
+    return 0 if finished else 1
+
+
+def run_sharded(dp: Dispatcher, create_bot: Callable[[], Bot]) -> None:
+    """
+    Serve updates with one long-polling supervisor and shard processes
+
+    Args:
+        dp: Dispatcher with all routers (forked into every shard)
+        create_bot: Factory creating a Bot (each shard gets its own)
+    """
+    count = max(1, settings.shard_workers)
+    logger.info(f"Starting {count} shard(s)")
+    processes, update_fds, ack_fds = fork_shards(dp, create_bot, count)
+    try:
+        code = asyncio.run(_supervise(dp, update_fds, ack_fds))
+    finally:
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+    if code:
+        sys.exit(code)
+
+
+CallbackMetric(
+    "finance_bot_shard_updates_total", "Updates routed to and processed by each shard (supervisor)",
+    lambda: _router.stats() if _router is not None else {},
+    ["shard", "event"],
+    kind="counter",
+)
+CallbackMetric(
+    "finance_bot_shard_in_flight", "Updates routed to each shard and not yet processed (supervisor)",
+    lambda: {str(index): backlog for index, backlog in enumerate(_router.in_flight())} if _router is not None else {},
+    ["shard"],
+)
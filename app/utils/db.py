@@ -0,0 +1,59 @@
+"""
+Raw SQL helpers shared by the batched/upsert code paths
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Iterable, List, Sequence, Tuple
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+
+def is_postgres(connection: BaseDBAsyncClient) -> bool:
+    """Whether the connection speaks the PostgreSQL dialect"""
+    return connection.capabilities.dialect == "postgres"
+
+
+def placeholder(connection: BaseDBAsyncClient, index: int) -> str:
+    """Numbered parameter marker ($1 for asyncpg, ?1 for SQLite)"""
+    return f"${index}" if is_postgres(connection) else f"?{index}"
+
+
+def adapt_value(connection: BaseDBAsyncClient, value: Any) -> Any:
+    """Convert a Python value into something the driver accepts"""
+    if is_postgres(connection):
+        return value
+    # SQLite stores decimals and dates the same way Tortoise does: as text
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def values_clause(
+    connection: BaseDBAsyncClient,
+    rows: Iterable[Sequence[Any]],
+    start: int = 1,
+) -> Tuple[str, List[Any]]:
+    """
+    Build a multi-row ``VALUES`` clause
+
+    Args:
+        connection: Database connection (decides the placeholder style)
+        rows: Rows of column values, all the same length
+        start: Index of the first positional parameter
+
+    Returns:
+        Tuple of ("(...), (...)" SQL fragment, flat parameter list)
+    """
+    groups = []
+    params: List[Any] = []
+    index = start
+    for row in rows:
+        markers = []
+        for value in row:
+            markers.append(placeholder(connection, index))
+            params.append(adapt_value(connection, value))
+            index += 1
+        groups.append(f"({', '.join(markers)})")
+    return ", ".join(groups), params
@@ -0,0 +1,124 @@
+"""
+Rate-limited in-place edits of a progress message
+"""
+import asyncio
+import logging
+import time
+from typing import Callable, Optional
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message
+
+logger = logging.getLogger(__name__)
+
+# Telegram rejects longer message texts
+MAX_TEXT_LENGTH = 4096
+
+
+def _fit(text: str) -> str:
+    """Keep the end of a text that is too long for one message"""
+    if len(text) <= MAX_TEXT_LENGTH:
+        return text
+    return "…" + text[-(MAX_TEXT_LENGTH - 1):]
+
+
+class ThrottledEditor:
+    """
+    Edits one message with the latest text, at most once per ``min_interval``
+
+    ``update`` only records the text; a background edit picks up whatever
+    is newest when the interval allows, so fast producers never queue up
+    edits. Flood-control answers (429) push the next edit back by their
+    ``retry_after``. Progress edits are best-effort; ``finish`` makes the
+    final one.
+    """
+
+    def __init__(self, min_interval: float = 1.0, clock: Callable[[], float] = time.monotonic):
+        self.min_interval = min_interval
+        self.clock = clock
+
+        self.message: Optional[Message] = None
+        self._text: Optional[str] = None
+        self._shown: Optional[str] = None
+        self._next_edit_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.edits = 0
+
+    def attach(self, message: Message) -> None:
+        """Set the message to edit (updates before this are kept)"""
+        self.message = message
+        self._shown = message.text
+        self._schedule()
+
+    def update(self, text: str) -> None:
+        """Show ``text`` on the next allowed edit"""
+        self._text = _fit(text)
+        self._schedule()
+
+    def _schedule(self) -> None:
+        if self.message is None or self._text in (None, self._shown):
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while self._text != self._shown:
+            delay = self._next_edit_at - self.clock()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            text = self._text
+            try:
+                # Plain text: with the Bot's default HTML mode a "<" or "&" in
+                # the transcript would get the edit rejected
+                await self._edit(text, parse_mode=None)
+            except TelegramRetryAfter:
+                continue
+            except Exception as e:
+                logger.debug(f"Progress edit failed: {e}")
+                return
+
+    async def _edit(self, text: str, **kwargs) -> None:
+        try:
+            await self.message.edit_text(text, **kwargs)
+        except TelegramRetryAfter as e:
+            self._next_edit_at = self.clock() + e.retry_after
+            raise
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                raise
+        self._shown = text
+        self.edits += 1
+        self._next_edit_at = self.clock() + self.min_interval
+
+    async def stop(self) -> None:
+        """Cancel pending progress edits"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def finish(self, text: str, **kwargs) -> None:
+        """
+        Replace the progress with the final text
+
+        Stops pending progress edits and waits for the interval (and any
+        flood-control delay) before editing.
+
+        Raises:
+            The edit's error, e.g. when the message was deleted
+        """
+        await self.stop()
+        self._text = text
+
+        for attempt in range(2):
+            delay = self._next_edit_at - self.clock()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                await self._edit(text, **kwargs)
+                return
+            except TelegramRetryAfter:
+                if attempt:
+                    raise
@@ -0,0 +1,251 @@
+"""
+Ogg/Opus demuxing, remuxing and silence-based splitting (pure Python)
+
+Telegram voice notes are Opus in an Ogg container. Splitting works on the
+compressed packets: each packet's duration comes from its TOC byte and its
+size stands in for loudness (Opus spends very few bytes on silence), so no
+audio decoder is needed.
+"""
+import struct
+from dataclasses import dataclass
+from typing import List, Tuple
+
+# Opus always counts granule positions at 48 kHz
+SAMPLE_RATE = 48000
+
+_PAGE_HEADER = struct.Struct("<4sBBqIIIB")
+_CONTINUED, _BOS, _EOS = 0x01, 0x02, 0x04
+# Header + 255 lacing values + 255 * 255 bytes of body
+_MAX_PAGE_SIZE = 27 + 255 + 255 * 255
+
+# Ogg CRC-32: polynomial 0x04C11DB7, no reflection, zero init
+_CRC_TABLE = []
+for _byte in range(256):
+    _value = _byte << 24
+    for _ in range(8):
+        _value = ((_value << 1) ^ 0x04C11DB7) if _value & 0x80000000 else _value << 1
+    _CRC_TABLE.append(_value & 0xFFFFFFFF)
+
+
+class OggError(ValueError):
+    """Data is not a well-formed Ogg/Opus stream"""
+
+
+def _crc(data: bytes) -> int:
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ _CRC_TABLE[(crc >> 24) ^ byte]
+    return crc
+
+
+@dataclass
+class OpusStream:
+    """Demuxed Opus stream: header packets and audio packets"""
+
+    head: bytes
+    tags: bytes
+    packets: List[bytes]
+
+    @property
+    def pre_skip(self) -> int:
+        return struct.unpack_from("<H", self.head, 10)[0]
+
+    @property
+    def duration(self) -> float:
+        """Audio length in seconds"""
+        return sum(packet_samples(packet) for packet in self.packets) / SAMPLE_RATE
+
+
+def packet_samples(packet: bytes) -> int:
+    """Duration of an Opus packet in 48 kHz samples (RFC 6716, section 3.1)"""
+    if not packet:
+        return 0
+    toc = packet[0]
+    config = toc >> 3
+    if config < 12:
+        frame = (480, 960, 1920, 2880)[config % 4]  # SILK: 10/20/40/60 ms
+    elif config < 16:
+        frame = (480, 960)[config % 2]  # Hybrid: 10/20 ms
+    else:
+        frame = (120, 240, 480, 960)[config % 4]  # CELT: 2.5/5/10/20 ms
+
+    code = toc & 0x03
+    if code == 0:
+        frames = 1
+    elif code in (1, 2):
+        frames = 2
+    else:
+        frames = packet[1] & 0x3F if len(packet) > 1 else 0
+    return frame * frames
+
+
+def duration(data: bytes) -> float:
+    """
+    Length of an Ogg/Opus file in seconds, from its last page's granule
+
+    Cheap (no demuxing, only the first and last page are looked at);
+    0.0 when the data does not look like Ogg/Opus.
+    """
+    first = bytes(data[:_MAX_PAGE_SIZE])
+    last = bytes(data[-_MAX_PAGE_SIZE:])
+    head = first.find(b"OpusHead")
+    page = last.rfind(b"OggS")
+    if page < 0 or head < 0 or len(last) - page < _PAGE_HEADER.size or len(first) - head < 12:
+        return 0.0
+    granule = _PAGE_HEADER.unpack_from(last, page)[3]
+    pre_skip = struct.unpack_from("<H", first, head + 10)[0]
+    return max(granule - pre_skip, 0) / SAMPLE_RATE
+
+
+def read_opus(data: bytes) -> OpusStream:
+    """
+    Demux the first logical stream of an Ogg/Opus file (any bytes-like object)
+
+    Raises:
+        OggError: Bad page header, checksum or missing Opus headers
+    """
+    packets: List[bytes] = []
+    partial = b""
+    serial = None
+    offset = 0
+    view = memoryview(data)
+
+    while offset < len(data):
+        if len(data) - offset < _PAGE_HEADER.size:
+            raise OggError("Truncated page header")
+        magic, version, flags, _, page_serial, _, checksum, count = _PAGE_HEADER.unpack_from(data, offset)
+        if magic != b"OggS" or version != 0:
+            raise OggError(f"No Ogg page at offset {offset}")
+
+        lacing_start = offset + _PAGE_HEADER.size
+        lacing = data[lacing_start:lacing_start + count]
+        body_start = lacing_start + count
+        body_end = body_start + sum(lacing)
+        if len(lacing) != count or body_end > len(data):
+            raise OggError("Truncated page")
+
+        page = bytearray(view[offset:body_end])
+        page[22:26] = b"\x00\x00\x00\x00"
+        if _crc(page) != checksum:
+            raise OggError(f"Bad checksum in page at offset {offset}")
+        offset = body_end
+
+        if serial is None:
+            serial = page_serial
+        elif page_serial != serial:
+            # Chained or multiplexed streams: only the first one is used
+            continue
+        if not flags & _CONTINUED:
+            partial = b""
+
+        position = body_start
+        for size in lacing:
+            partial += data[position:position + size]
+            position += size
+            if size < 255:
+                packets.append(partial)
+                partial = b""
+
+    if len(packets) < 2 or not packets[0].startswith(b"OpusHead") or not packets[1].startswith(b"OpusTags"):
+        raise OggError("Missing OpusHead/OpusTags")
+    return OpusStream(head=packets[0], tags=packets[1], packets=packets[2:])
+
+
+def _page(flags: int, granule: int, serial: int, sequence: int, packets: List[bytes]) -> bytes:
+    lacing = bytearray()
+    for packet in packets:
+        lacing.extend(b"\xff" * (len(packet) // 255))
+        lacing.append(len(packet) % 255)
+    body = b"".join(packets)
+    header = _PAGE_HEADER.pack(
+        b"OggS", 0, flags, granule, serial, sequence, 0, len(lacing)
+    )
+    page = bytearray(header + bytes(lacing) + body)
+    struct.pack_into("<I", page, 22, _crc(page))
+    return bytes(page)
+
+
+def write_opus(stream: OpusStream, serial: int = 1, packets_per_page: int = 50) -> bytes:
+    """
+    Mux an Opus stream into a standalone Ogg file
+
+    Granule positions restart at the stream's pre-skip, so every written
+    segment decodes on its own.
+    """
+    pages = [
+        _page(_BOS, 0, serial, 0, [stream.head]),
+        _page(0, 0, serial, 1, [stream.tags]),
+    ]
+    # Packets larger than one page's lacing table (255 * 255 bytes) do not occur in voice notes
+    granule = stream.pre_skip
+    for start in range(0, len(stream.packets), packets_per_page):
+        chunk = stream.packets[start:start + packets_per_page]
+        granule += sum(packet_samples(packet) for packet in chunk)
+        last = start + packets_per_page >= len(stream.packets)
+        pages.append(_page(_EOS if last else 0, granule, serial, len(pages), chunk))
+    return b"".join(pages)
+
+
+def split_at_silence(
+    stream: OpusStream,
+    max_seconds: float,
+    search_seconds: float = 5.0,
+    window_seconds: float = 0.3,
+) -> List[OpusStream]:
+    """
+    Split a stream into pieces of at most ``max_seconds``
+
+    Each cut is placed at the quietest point (smallest packets over
+    ``window_seconds``) in the last ``search_seconds`` before the limit,
+    so words are rarely cut in half.
+    """
+    durations = [packet_samples(packet) for packet in stream.packets]
+    max_samples = int(max_seconds * SAMPLE_RATE)
+    search_samples = int(min(search_seconds, max_seconds / 2) * SAMPLE_RATE)
+    window_samples = int(window_seconds * SAMPLE_RATE)
+
+    cuts: List[int] = []
+    start = 0
+    while sum(durations[start:]) > max_samples:
+        # Packets that still fit into this piece
+        elapsed = 0
+        end = start
+        while end < len(durations) and elapsed + durations[end] <= max_samples:
+            elapsed += durations[end]
+            end += 1
+        end = max(end, start + 1)
+        cut = _quietest_cut(stream.packets, durations, start, end, elapsed - search_samples, window_samples)
+        cuts.append(cut)
+        start = cut
+
+    bounds = list(zip([0, *cuts], [*cuts, len(stream.packets)]))
+    return [OpusStream(stream.head, stream.tags, stream.packets[a:b]) for a, b in bounds]
+
+
+def _quietest_cut(packets: List[bytes], durations: List[int], start: int, end: int,
+                  search_from: int, window: int) -> int:
+    """Packet index (in ``start + 1 .. end``) in the middle of the quietest window"""
+    # Index of the first packet after the search start
+    elapsed = 0
+    first = start
+    while first < end and elapsed < search_from:
+        elapsed += durations[first]
+        first += 1
+    first = max(first, start + 1)
+
+    best: Tuple[float, int] = (float("inf"), end)
+    window_bytes = window_samples = 0
+    left = first
+    for right in range(first, end):
+        window_bytes += len(packets[right])
+        window_samples += durations[right]
+        while left < right and window_samples - durations[left] >= window:
+            window_bytes -= len(packets[left])
+            window_samples -= durations[left]
+            left += 1
+        if window_samples >= window:
+            loudness = window_bytes / window_samples
+            # Ties go to the later window (longer pieces)
+            if loudness <= best[0]:
+                best = (loudness, (left + right + 1) // 2)
+    return max(best[1], start + 1)
@@ -0,0 +1,24 @@
+"""
+Text normalization helpers
+"""
+import re
+
+# Apostrophe variants used when typing Uzbek (o‘, g‘, o`, ...)
+_APOSTROPHES = re.compile(r"[‘’ʻʼ`´]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize user text for matching and cache keys
+    
+    Unifies apostrophes, collapses whitespace and lowercases.
+    
+    Args:
+        text: Raw message text
+        
+    Returns:
+        Normalized text
+    """
+    text = _APOSTROPHES.sub("'", text)
+    return _WHITESPACE.sub(" ", text).strip().lower()
@@ -0,0 +1,57 @@
+"""
+Bounded in-memory cache with TTL and LRU eviction
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Dictionary-like cache bounded by size and entry age
+
+    Expired entries are dropped lazily on access; when the cache is full
+    the least recently used entry is evicted.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        # key -> (expires_at monotonic, value)
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return a fresh value or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entries"""
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        """Invalidate one entry"""
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop all entries"""
+        self._entries.clear()
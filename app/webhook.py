@@ -0,0 +1,140 @@
+"""
+Webhook serving mode (alternative to long polling)
+"""
+import asyncio
+import logging
+import multiprocessing
+import signal
+import socket
+import sys
+from typing import Callable, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from app import metrics
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def create_webhook_app(
+    dp: Dispatcher,
+    bot: Bot,
+    secret_token: Optional[str] = None,
+    path: Optional[str] = None,
+) -> web.Application:
+    """
+    Build the aiohttp application that receives Telegram updates
+
+    Requests without the expected ``X-Telegram-Bot-Api-Secret-Token``
+    header are rejected with 401. Valid updates are acknowledged with 200
+    immediately and processed by the dispatcher in the background.
+
+    Args:
+        dp: Dispatcher with all routers
+        bot: Bot instance used to answer updates
+        secret_token: Expected secret token (defaults to settings.webhook_secret)
+        path: Route path (defaults to settings.webhook_path)
+
+    Returns:
+        Configured aiohttp application
+    """
+    app = web.Application()
+
+    handler = SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=True,
+        secret_token=secret_token if secret_token is not None else settings.webhook_secret or None,
+    )
+    handler.register(app, path=path or settings.webhook_path)
+
+    # Dispatcher startup/shutdown hooks run with the aiohttp app lifecycle
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+def _bind_socket(host: str, port: int) -> socket.socket:
+    """Create the listening socket shared by all worker processes"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    sock.setblocking(False)
+    return sock
+
+
+async def _register_webhook(dp: Dispatcher, create_bot: Callable[[], Bot]) -> None:
+    """Point Telegram at our webhook URL"""
+    bot = create_bot()
+    try:
+        await bot.set_webhook(
+            url=settings.webhook_url,
+            secret_token=settings.webhook_secret or None,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logger.info(f"Webhook registered: {settings.webhook_url}")
+    finally:
+        await bot.session.close()
+
+
+def _serve(sock: socket.socket, dp: Dispatcher, create_bot: Callable[[], Bot], index: int = 0) -> None:
+    """Run one webhook worker on the shared socket"""
+    # Each worker exposes its own metrics port
+    metrics.worker_index = index
+    bot = create_bot()
+    app = create_webhook_app(dp, bot)
+    web.run_app(app, sock=sock, print=None)
+
+
+def run_webhook(dp: Dispatcher, create_bot: Callable[[], Bot]) -> None:
+    """
+    Serve updates over a webhook
+
+    The listening socket is bound once and shared by
+    ``settings.webhook_workers`` forked processes; the kernel hands each
+    incoming connection to one of them.
+
+    Args:
+        dp: Dispatcher with all routers
+        create_bot: Factory creating a Bot (each worker gets its own)
+    """
+    sock = _bind_socket(settings.webhook_host, settings.webhook_port)
+    asyncio.run(_register_webhook(dp, create_bot))
+
+    workers = max(1, settings.webhook_workers)
+    logger.info(
+        f"Starting webhook on {settings.webhook_host}:{settings.webhook_port}"
+        f"{settings.webhook_path} with {workers} worker(s)"
+    )
+    if workers == 1:
+        _serve(sock, dp, create_bot)
+        return
+
+    # SIGTERM (docker stop) -> SystemExit, so the finally block stops workers
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(
+            target=_serve,
+            args=(sock, dp, create_bot, index),
+            name=f"webhook-worker-{index}",
+        )
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    try:
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+        sock.close()
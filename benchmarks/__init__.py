@@ -0,0 +1,12 @@
+"""
+Benchmarks for Finance AI Bot
+
+Run a benchmark with ``python -m benchmarks.<name>`` from the project root.
+Dummy credentials are set here so that importing the application does not
+require a real ``.env`` file.
+"""
+import os
+
+os.environ.setdefault("BOT_TOKEN", "123456:benchmark")
+os.environ.setdefault("DB_PASSWORD", "benchmark")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
@@ -0,0 +1,160 @@
+"""
+Benchmark: cold start of main.py, import time per module and time to first update
+
+Starts fresh interpreters that import ``main``, build the dispatcher against
+a fake Telegram session and SQLite in memory, then feed one text update the
+local parser answers and one that goes to (fake) Gemini. Each phase is
+timed from process start, so interpreter startup is included. The first
+Gemini update includes importing google.genai and building the client,
+which no longer happens at import time.
+
+One extra run with ``python -X importtime`` gives import time per package
+and the slowest application modules.
+
+Usage:
+    python -m benchmarks.bench_cold_start
+    python -m benchmarks.bench_cold_start --runs 10 --top 20
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PHASES = (
+    ("import", "import main"),
+    ("ready", "dispatcher + database ready"),
+    ("first_update", "first update (local parser)"),
+    ("first_gemini_update", "first Gemini update"),
+)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts to time")
+    parser.add_argument("--top", type=int, default=12, help="Packages and modules to list")
+    parser.add_argument("--child", type=float, default=None, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def make_update(update_id: int, text: str):
+    from aiogram.types import Update
+
+    return Update.model_validate({"update_id": update_id, "message": {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": 1, "type": "private"},
+        "from": {"id": 1, "is_bot": False, "first_name": "Bench"},
+        "text": text,
+    }})
+
+
+async def child(started: float) -> Dict[str, float]:
+    """One cold start; phase times are seconds since ``started`` (process spawn)"""
+    marks = {}
+    import benchmarks  # noqa: F401  (sets dummy credentials)
+
+    import main
+    marks["import"] = time.time() - started
+
+    from aiogram import Bot
+    from tortoise import Tortoise
+
+    from app.services import get_gemini_service, transaction_buffer
+    from benchmarks.fakes import FakeGeminiClient, FakeTelegramSession
+
+    dp = main.create_dispatcher()
+    bot = Bot(token="123456:benchmark", session=FakeTelegramSession())
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["app.models"]})
+    await Tortoise.generate_schemas()
+    await transaction_buffer.start()
+    marks["ready"] = time.time() - started
+
+    await dp.feed_update(bot, make_update(1, "taksi 20 ming"))
+    marks["first_update"] = time.time() - started
+    marks["genai_after_first_update"] = float("google.genai" in sys.modules)
+
+    # Fake client goes in after the real service is built (SDK import included)
+    get_gemini_service().client = FakeGeminiClient(latency=0.0)
+    await dp.feed_update(bot, make_update(2, "Do'stimga qarzimni qaytardim, taxminan 40 ming edi"))
+    marks["first_gemini_update"] = time.time() - started
+
+    await transaction_buffer.close()
+    marks["rows"] = transaction_buffer.flushed_rows
+    await Tortoise.close_connections()
+    await bot.session.close()
+    return marks
+
+
+def cold_start() -> Dict[str, float]:
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_cold_start", "--child", repr(time.time())],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def import_profile() -> List[Tuple[str, int, int]]:
+    """(module, self µs, cumulative µs) for ``import main`` under -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import benchmarks, main"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(own), int(cumulative)))
+    return rows
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.child is not None:
+        import asyncio
+        import logging
+
+        logging.disable(logging.CRITICAL)
+        print(json.dumps(asyncio.run(child(args.child))))
+        return 0
+
+    runs = [cold_start() for _ in range(args.runs)]
+    profile = import_profile()
+
+    print("=" * 60)
+    print(f"Cold start of main.py ({args.runs} runs, median from process start)")
+    print("=" * 60)
+    for key, label in PHASES:
+        timings = [run[key] * 1000 for run in runs]
+        print(f"{label:<32} {statistics.median(timings):8.0f} ms   max {max(timings):8.0f} ms")
+    print(f"google.genai loaded before Gemini was needed: "
+          f"{'yes' if any(run['genai_after_first_update'] for run in runs) else 'no'}")
+    print(f"rows written per run: {runs[0]['rows']:.0f}")
+
+    packages: Dict[str, int] = defaultdict(int)
+    for name, own, _ in profile:
+        packages[name.split(".")[0]] += own
+    total = sum(packages.values())
+    print("-" * 60)
+    print(f"import main: {total / 1000:.0f} ms self time (-X importtime), by package")
+    for name, own in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:<30} {own / 1000:8.1f} ms  {own / total:5.1%}")
+
+    print("-" * 60)
+    print("Slowest application modules (cumulative)")
+    own_modules = [row for row in profile if row[0].split(".")[0] in ("app", "config", "main")]
+    for name, _, cumulative in sorted(own_modules, key=lambda row: -row[2])[:args.top]:
+        print(f"  {name:<40} {cumulative / 1000:8.1f} ms")
+    print("=" * 60)
+    return 0 if all(run["rows"] == 2 for run in runs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
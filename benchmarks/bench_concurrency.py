@@ -0,0 +1,88 @@
+"""
+Benchmark: concurrent voice/text handlers overlap instead of serializing
+
+Runs N copies of ``handle_voice`` and ``handle_text`` at the same time against
+a fake Gemini client with a fixed per-call latency. If the service blocked the
+event loop, wall time would grow as N * per-message latency; with the async
+client it stays close to a single message's latency (times the number of
+processing queue waves, N / PROCESSING_WORKERS).
+
+Usage:
+    python -m benchmarks.bench_concurrency
+"""
+import asyncio
+import itertools
+import sys
+import time
+
+import benchmarks  # noqa: F401  (sets dummy credentials)
+from benchmarks.fakes import (
+    FakeBot,
+    FakeGeminiClient,
+    FakeMessage,
+    close_db,
+    init_sqlite_db,
+    make_voice,
+)
+
+LATENCY = 0.05
+SIZES = (1, 10, 50)
+
+# Unique inputs so the extraction cache never short-circuits a run
+_ids = itertools.count()
+
+
+async def run_voice(n: int) -> float:
+    from app.handlers.voice import handle_voice
+
+    bot = FakeBot()
+    messages = [FakeMessage(user_id=i, voice=make_voice(f"v{next(_ids)}")) for i in range(n)]
+    started = time.perf_counter()
+    await asyncio.gather(*(handle_voice(m, bot) for m in messages))
+    return time.perf_counter() - started
+
+
+async def run_text(n: int) -> float:
+    from app.handlers.voice import handle_text
+
+    messages = [FakeMessage(user_id=i, text=f"taksiga {next(_ids)} so'm") for i in range(n)]
+    started = time.perf_counter()
+    await asyncio.gather(*(handle_text(m) for m in messages))
+    return time.perf_counter() - started
+
+
+async def main() -> int:
+    from app.services import get_gemini_service
+    from config import settings
+
+    get_gemini_service().client = FakeGeminiClient(latency=LATENCY)
+    # Every text message must reach Gemini for this benchmark
+    settings.local_parser_enabled = False
+    await init_sqlite_db()
+
+    print("=" * 60)
+    print(f"Concurrent handlers (fake Gemini latency {LATENCY * 1000:.0f} ms/call, "
+          f"{settings.processing_workers} workers)")
+    print("=" * 60)
+
+    ok = True
+    for name, runner in (("handle_voice", run_voice), ("handle_text", run_text)):
+        single = await runner(1)
+        for n in SIZES:
+            wall = await runner(n)
+            serial = single * n
+            overlap = serial / wall if wall else float("inf")
+            print(f"{name:<13} N={n:<3} wall={wall * 1000:8.1f} ms  "
+                  f"serial≈{serial * 1000:8.1f} ms  overlap x{overlap:5.1f}")
+            if n > 1 and wall > serial / 2:
+                ok = False
+
+    await close_db()
+
+    print("=" * 60)
+    print("✓ Handlers overlap" if ok else "✗ Handlers ran one after another")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
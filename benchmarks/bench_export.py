@@ -0,0 +1,147 @@
+"""
+Benchmark: /export of a long history (1M rows by default)
+
+Fills a database with synthetic transactions of one user, exports them and
+reports the time, file size and how much the process grew while exporting
+(``ru_maxrss`` before and after, so run it in a fresh process). A warm-up
+export of a few rows runs first, so first-use allocations are not counted.
+``--max-growth-mb`` makes it exit non-zero when memory is not flat.
+
+Usage:
+    python -m benchmarks.bench_export [--rows 1000000] [--format csv|xlsx]
+        [--backend sqlite|postgres] [--chunk-size 1000] [--max-growth-mb 24] [--json]
+
+The postgres backend uses the DB_* settings and deletes its rows afterwards.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from datetime import date
+
+import benchmarks  # noqa: F401  (sets dummy credentials)
+
+SQLITE_FILL = """
+WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < {rows})
+INSERT INTO "transactions" ("user_id", "type", "amount", "category", "description", "date", "source", "created_at")
+SELECT {user_id}, 'expense', 1000 + n % 1000, CASE n % 3 WHEN 0 THEN 'food' WHEN 1 THEN 'transport' ELSE 'other' END,
+       'synthetic row ' || n, date('2020-01-01', '+' || (n / 500) || ' days'), 'text', '2026-01-01 00:00:00'
+FROM seq
+"""
+
+POSTGRES_FILL = """
+INSERT INTO "transactions" ("user_id", "type", "amount", "category", "description", "date", "source", "created_at")
+SELECT {user_id}, 'expense', 1000 + n % 1000, CASE n % 3 WHEN 0 THEN 'food' WHEN 1 THEN 'transport' ELSE 'other' END,
+       'synthetic row ' || n, DATE '2020-01-01' + n / 500, 'text', now()
+FROM generate_series(1, {rows}) AS n
+"""
+
+# User the synthetic rows belong to (not a real Telegram ID)
+BENCH_TELEGRAM_ID = -987654321
+
+
+def max_rss_bytes() -> int:
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+async def run(args, workdir: str) -> dict:
+    from tortoise import Tortoise
+
+    from app.models import User
+    from app.services.export import ExportService
+
+    if args.backend == "sqlite":
+        # File database: the rows live on disk, not in this process
+        await Tortoise.init(
+            db_url=f"sqlite://{os.path.join(workdir, 'export.sqlite3')}", modules={"models": ["app.models"]}
+        )
+        await Tortoise.generate_schemas()
+        fill = SQLITE_FILL
+    else:
+        from config.database import connection_config
+
+        await Tortoise.init(config={
+            "connections": {"default": connection_config()},
+            "apps": {"models": {"models": ["app.models"], "default_connection": "default"}},
+        })
+        await Tortoise.generate_schemas(safe=True)
+        fill = POSTGRES_FILL
+
+    await User.filter(telegram_id=BENCH_TELEGRAM_ID).delete()
+    user = await User.create(telegram_id=BENCH_TELEGRAM_ID)
+    try:
+        started = time.perf_counter()
+        await Tortoise.get_connection("default").execute_script(fill.format(rows=args.rows, user_id=user.id))
+        fill_seconds = time.perf_counter() - started
+
+        service = ExportService(chunk_size=args.chunk_size, max_concurrent=1)
+        path, _ = await service.export_to_file(args.format, user.id, end=date(2020, 1, 2))
+        os.unlink(path)
+
+        before = max_rss_bytes()
+        started = time.perf_counter()
+        path, count = await service.export_to_file(args.format, user.id)
+        seconds = time.perf_counter() - started
+        growth = max_rss_bytes() - before
+
+        size = os.path.getsize(path)
+        last_date = None
+        if args.format == "csv":
+            with open(path, "rb") as file:
+                file.seek(-200, os.SEEK_END)
+                last_date = file.read().splitlines()[-1].decode().split(",")[0]
+        os.unlink(path)
+    finally:
+        if args.backend == "postgres":
+            # Cascades to the synthetic transactions
+            await user.delete()
+        await Tortoise.close_connections()
+
+    return {
+        "rows": count,
+        "fill_seconds": fill_seconds,
+        "seconds": seconds,
+        "size": size,
+        "growth": growth,
+        "last_date": last_date,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=("csv", "xlsx"), default="csv")
+    parser.add_argument("--backend", choices=("sqlite", "postgres"), default="sqlite")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--max-growth-mb", type=float, default=0, help="fail above this growth (0 = no budget)")
+    parser.add_argument("--json", action="store_true", help="print the results as one JSON object")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        result = asyncio.run(run(args, workdir))
+
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print("=" * 60)
+        print(f"Backend / format:  {args.backend} / {args.format}, {args.chunk_size} rows per chunk")
+        print(f"Rows:              {result['rows']} (filled in {result['fill_seconds']:.1f}s)")
+        print(f"Export:            {result['seconds']:.1f}s, {result['rows'] / result['seconds']:.0f} rows/sec")
+        print(f"File size:         {result['size'] / 1e6:.1f} MB")
+        print(f"Process growth:    {result['growth'] / 1e6:.1f} MB")
+        print("=" * 60)
+
+    if args.max_growth_mb and result["growth"] > args.max_growth_mb * 1024 * 1024:
+        print(f"FAIL: grew {result['growth'] / 1e6:.1f} MB (budget {args.max_growth_mb} MB)", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
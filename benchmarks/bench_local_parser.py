@@ -0,0 +1,118 @@
+"""
+Benchmark: local fast-path parser hit rate and per-message cost
+
+Runs the parser over a corpus of typical messages. Entries with an expected
+record must be answered locally with exactly those fields; entries with
+``None`` must be deferred to Gemini.
+
+Usage:
+    python -m benchmarks.bench_local_parser
+"""
+import sys
+import time
+from datetime import date
+
+import benchmarks  # noqa: F401  (sets dummy credentials)
+
+TODAY = date(2026, 10, 18)
+ROUNDS = 200
+
+
+def expense(amount, category, day="2026-10-18"):
+    return {"type": "expense", "amount": amount, "category": category, "date": day}
+
+
+def income(amount, category, day="2026-10-18"):
+    return {"type": "income", "amount": amount, "category": category, "date": day}
+
+
+CORPUS = [
+    ("taksiga 20000 so'm", expense(20000, "transport")),
+    ("Men bugun 50000 so'm oziq-ovqatga sarfladim", expense(50000, "food")),
+    ("Taksi 25 ming", expense(25000, "transport")),
+    ("kecha benzinga 1.5 mln so'm ketdi", expense(1500000, "transport", "2026-10-17")),
+    ("benzin 300 000 so'm", expense(300000, "transport")),
+    ("metro 2000", expense(2000, "transport")),
+    ("avtobusga 1700 so'm to'ladim", expense(1700, "transport")),
+    ("non 8 ming", expense(8000, "food")),
+    ("bozorlik 350 ming so'm", expense(350000, "food")),
+    ("tushlikka 45000 so'm", expense(45000, "food")),
+    ("kafeda 120 ming so'm sarfladim", expense(120000, "food")),
+    ("qahva 25000", expense(25000, "food")),
+    ("ikki yuz ellik ming so'mlik kiyim oldim", expense(250000, "clothing")),
+    ("bir yarim million ijara to'ladim", expense(1500000, "housing")),
+    ("kvartira ijarasi 3 mln so'm", expense(3000000, "housing")),
+    ("internetga 99 ming to'ladim", expense(99000, "communication")),
+    ("telefonga 50000 so'm", expense(50000, "communication")),
+    ("gaz uchun 45 ming so'm to'ladim", expense(45000, "utilities")),
+    ("svetga 120 ming", expense(120000, "utilities")),
+    ("kommunal to'lovlar 400 ming so'm", expense(400000, "utilities")),
+    ("dorixonaga 35 ming so'm", expense(35000, "health", "2026-10-18")),
+    ("o'tgan kuni dorixonaga 35 ming", expense(35000, "health", "2026-10-16")),
+    ("kursga 600 ming so'm to'ladim", expense(600000, "education")),
+    ("kitob 60000 so'm", expense(60000, "education")),
+    ("kinoga 70 ming", expense(70000, "entertainment")),
+    ("maosh 5 mln tushdi", income(5000000, "salary")),
+    ("oylik 7 million so'm tushdi", income(7000000, "salary")),
+    ("bugun oylik oldim 6 mln so'm", income(6000000, "salary")),
+    ("kecha maosh 4.5 mln", income(4500000, "salary", "2026-10-17")),
+    ("20k taksi", expense(20000, "transport")),
+    # Gemini'ga qoldirilishi kerak bo'lganlar
+    ("salom", None),
+    ("bugun nima qildim?", None),
+    ("2 ta non 5000", None),
+    ("100 dollar maosh", None),
+    ("dushanba kuni 20000 taksi", None),
+    ("taksiga 20000 va ovqatga 50000", None),
+    ("do'stimga 200 ming qarz berdim", None),
+    ("o'tgan hafta 300 ming sarfladim", None),
+    ("10-oktabr kuni 50 ming so'm ovqatga", None),
+    ("sovg'a uchun 150 ming", None),
+    ("kiyim sotdim 400 ming", None),
+    ("50000", None),
+    ("gazeta 5000 so'm", None),
+    ("suvenir 20000 so'm", None),
+    ("taksiga 20000 so'm bermadim", None),
+    ("ijara to'lamadim 3 mln", None),
+]
+
+
+def main() -> int:
+    from app.services.local_parser import LocalFinancialParser
+
+    parser = LocalFinancialParser()
+
+    hits = correct = wrong_defer = false_hits = 0
+    for text, expected in CORPUS:
+        data = parser.try_parse(text, TODAY)
+        if data is not None:
+            hits += 1
+            fields = {key: data[key] for key in ("type", "amount", "category", "date")}
+            if fields == expected:
+                correct += 1
+            else:
+                false_hits += 1
+                print(f"✗ {text!r}: got {fields}, expected {expected}")
+        elif expected is not None:
+            wrong_defer += 1
+            print(f"· deferred {text!r}")
+
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        for text, _expected in CORPUS:
+            parser.try_parse(text, TODAY)
+    per_message = (time.perf_counter() - started) / (ROUNDS * len(CORPUS)) * 1e6
+
+    answerable = sum(1 for _, expected in CORPUS if expected is not None)
+    print("=" * 60)
+    print(f"Corpus:           {len(CORPUS)} messages ({answerable} answerable locally)")
+    print(f"Local hit rate:   {hits / len(CORPUS):.0%} of all, {correct / answerable:.0%} of answerable")
+    print(f"Wrong answers:    {false_hits}")
+    print(f"Missed (deferred): {wrong_defer}")
+    print(f"Cost per message: {per_message:.1f} µs")
+    print("=" * 60)
+    return 0 if false_hits == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""
+Benchmark: FinancialRecord against the loose-dict path
+
+The dict path is what the handlers did before: ``json.dumps(indent=2)`` plus
+five ``.get()`` lookups for the reply, then the buffer normalizing the same
+dict again. The record path normalizes once (``FinancialRecord.from_dict``)
+and renders with ``render_record``. Also compares memory per held record.
+
+Usage:
+    python -m benchmarks.bench_records
+"""
+import json
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+
+import benchmarks  # noqa: F401  (sets dummy credentials)
+
+ROUNDS = 2000
+HELD = 10000
+
+SAMPLES = [
+    {"type": "expense", "amount": 45000, "category": "food", "description": "Bozordan meva", "date": "today"},
+    {"type": "income", "amount": "5 mln", "category": "salary", "description": "Oylik", "date": "2026-10-15"},
+    {"type": "expense", "amount": 12.5, "currency": "USD", "category": "subscriptions",
+     "description": "Spotify", "date": "yesterday"},
+    {"type": "expense", "amount": "20 000", "category": "transport", "description": "Taksi", "date": "kecha"},
+    {"type": "expense", "amount": "50 ming", "category": "food", "description": None, "date": "today"},
+]
+
+
+# Oldingi yo'l: handler va buffer'dagi normalizatsiya (o'zgarishsiz nusxa)
+_YESTERDAY = {"yesterday", "kecha"}
+_CENTS = Decimal("0.01")
+
+
+def _to_amount(value, parse_amount):
+    amount = Decimal(0)
+    if isinstance(value, (int, float, Decimal)):
+        amount = Decimal(str(value))
+    elif isinstance(value, str):
+        try:
+            amount = Decimal(value.strip().replace(" ", ""))
+        except InvalidOperation:
+            parsed = parse_amount(value)
+            if parsed is not None:
+                amount = Decimal(str(parsed))
+    return amount.quantize(_CENTS)
+
+
+def _to_date(value):
+    today = date.today()
+    if isinstance(value, str):
+        value = value.strip().lower()
+        try:
+            return date.fromisoformat(value[:10])
+        except ValueError:
+            pass
+        if value in _YESTERDAY:
+            return today - timedelta(days=1)
+    return today
+
+
+def dict_path(data, parse_amount):
+    reply = (
+        f"💰 Moliyaviy ma'lumotlar (JSON):\n"
+        f"```json\n{json.dumps(data, indent=2, ensure_ascii=False)}\n```\n\n"
+        f"📊 Tafsilotlar:\n"
+        f"• Turi: {data.get('type', 'N/A')}\n"
+        f"• Miqdor: {data.get('amount', 0)}\n"
+        f"• Kategoriya: {data.get('category', 'N/A')}\n"
+        f"• Tavsif: {data.get('description', 'N/A')}\n"
+        f"• Sana: {data.get('date', 'N/A')}"
+    )
+    row = (
+        "income" if str(data.get("type")).strip().lower() == "income" else "expense",
+        _to_amount(data.get("amount"), parse_amount),
+        str(data.get("category") or "other")[:64],
+        data.get("description") or None,
+        _to_date(data.get("date")),
+    )
+    return reply, row
+
+
+def record_path(data, record_cls, render):
+    record = record_cls.from_dict(data)
+    return render(record), record
+
+
+def per_call(fn) -> float:
+    """µs per sample"""
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        for data in SAMPLES:
+            fn(data)
+    return (time.perf_counter() - started) / (ROUNDS * len(SAMPLES)) * 1e6
+
+
+def held_bytes(build) -> float:
+    """Bytes per object while HELD of them are alive"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    items = [build(SAMPLES[i % len(SAMPLES)]) for i in range(HELD)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del items
+    return (after - before) / HELD
+
+
+def main() -> int:
+    from app.services.financial_record import FinancialRecord, render_record
+    from app.services.local_parser import local_parser
+
+    parse_amount = local_parser.parse_amount
+    for data in SAMPLES:
+        # Ikkala yo'l bir xil qatorni yozishi kerak (valyuta faqat yozuvda)
+        _, row = dict_path(data, parse_amount)
+        record = FinancialRecord.from_dict(data)
+        fields = (record.type, record.amount, record.category, record.description, record.date)
+        assert fields == row, (fields, row)
+
+    dict_us = per_call(lambda data: dict_path(data, parse_amount))
+    record_us = per_call(lambda data: record_path(data, FinancialRecord, render_record))
+    json_dumps_us = per_call(lambda data: json.dumps(data, indent=2, ensure_ascii=False))
+    records = [FinancialRecord.from_dict(data) for data in SAMPLES]
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        for record in records:
+            record.to_json()
+    to_json_us = (time.perf_counter() - started) / (ROUNDS * len(records)) * 1e6
+
+    # Same normalized values, held in a dict instead of slots
+    dict_bytes = held_bytes(lambda data: {
+        name: getattr(record, name)
+        for record in (FinancialRecord.from_dict(data),)
+        for name in FinancialRecord.__slots__
+    })
+    record_bytes = held_bytes(FinancialRecord.from_dict)
+
+    print("=" * 60)
+    print(f"Samples:               {len(SAMPLES)} x {ROUNDS} rounds")
+    print(f"Dict path:             {dict_us:.1f} µs per reply + row")
+    print(f"FinancialRecord path:  {record_us:.1f} µs per reply + row ({dict_us / record_us:.2f}x)")
+    print(f"json.dumps(indent=2):  {json_dumps_us:.1f} µs")
+    print(f"FinancialRecord.to_json: {to_json_us:.1f} µs ({json_dumps_us / to_json_us:.2f}x)")
+    print(f"Held dict:             {dict_bytes:.0f} bytes each")
+    print(f"Held FinancialRecord:  {record_bytes:.0f} bytes each ({record_bytes / dict_bytes:.0%})")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
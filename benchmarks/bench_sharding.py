@@ -0,0 +1,99 @@
+"""
+Benchmark: one process against sharded mode for CPU-heavy updates
+
+Every update runs a handler that burns ``--cpu-ms`` of CPU (standing in for
+update parsing, reply formatting, logging and local parsing). The same
+updates go through one shard and through ``--shards`` forked shards via
+the real supervisor pipes; the report shows updates/sec, the speed-up and
+each shard's share of the load.
+
+Usage:
+    python -m benchmarks.bench_sharding [--updates 2000] [--users 200] [--shards 4] [--cpu-ms 2]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import benchmarks  # noqa: F401  (sets dummy credentials)
+
+
+def make_update(update_id: int, user_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+            "text": f"taksi {update_id} ming",
+        },
+    }
+
+
+def make_dispatcher(cpu_ms: float):
+    from aiogram import Dispatcher, Router
+    from aiogram.types import Message
+
+    router = Router()
+
+    @router.message()
+    async def busy(message: Message):
+        deadline = time.process_time() + cpu_ms / 1000
+        while time.process_time() < deadline:
+            pass
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    return dp
+
+
+def run(shards: int, updates: int, users: int, cpu_ms: float):
+    """Updates/sec and per-shard report for ``shards`` processes"""
+    from aiogram import Bot
+
+    from app.sharding import ShardRouter, fork_shards
+
+    processes, update_fds, ack_fds = fork_shards(make_dispatcher(cpu_ms), lambda: Bot(token="123456:BENCH"), shards)
+
+    async def feed():
+        router = await ShardRouter.connect(update_fds, ack_fds)
+        started = time.perf_counter()
+        for update_id in range(1, updates + 1):
+            await router.route(make_update(update_id, 10_000 + update_id % users))
+        await router.close()
+        return time.perf_counter() - started, router
+
+    try:
+        elapsed, router = asyncio.run(feed())
+    finally:
+        for process in processes:
+            process.join()
+    assert router.done == router.routed
+    return updates / elapsed, router.report()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--shards", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--cpu-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    single_rate, _ = run(1, args.updates, args.users, args.cpu_ms)
+    sharded_rate, report = run(args.shards, args.updates, args.users, args.cpu_ms)
+
+    print("=" * 60)
+    print(f"Updates:        {args.updates} from {args.users} users, {args.cpu_ms} ms CPU each")
+    print(f"CPU cores:      {os.cpu_count()}")
+    print(f"1 shard:        {single_rate:.0f} updates/sec")
+    print(f"{args.shards} shards:       {sharded_rate:.0f} updates/sec ({sharded_rate / single_rate:.2f}x)")
+    print(f"Shard load:     {report}")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Benchmark: database startup with generate_schemas vs migration check
+
+Initializes Tortoise against an already migrated database and times the
+old startup (``generate_schemas``) against the new one (one query on the
+aerich table). Uses PostgreSQL when it is reachable with the DB_* settings,
+otherwise a SQLite file.
+
+Usage:
+    python -m benchmarks.bench_startup
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import benchmarks  # noqa: F401  (sets dummy credentials)
+
+RUNS = 20
+
+
+async def postgres_config():
+    """TORTOISE_ORM if PostgreSQL answers, else None"""
+    import asyncpg
+    from config.database import TORTOISE_ORM
+    from config.settings import settings
+
+    try:
+        connection = await asyncpg.connect(
+            host=settings.db_host, port=settings.db_port, user=settings.db_user,
+            password=settings.db_password, database=settings.db_name, timeout=2,
+        )
+    except Exception:
+        return None
+    await connection.close()
+    return TORTOISE_ORM
+
+
+def sqlite_config(path: str) -> dict:
+    return {
+        "connections": {"default": f"sqlite://{path}"},
+        "apps": {"models": {"models": ["app.models", "aerich.models"], "default_connection": "default"}},
+    }
+
+
+async def prepare(config: dict) -> None:
+    """Create the schema and mark every migration as applied"""
+    from aerich.models import Aerich
+    from tortoise import Tortoise
+
+    from config.database import migration_files
+
+    await Tortoise.init(config=config)
+    await Tortoise.generate_schemas()
+    for name in migration_files():
+        await Aerich.get_or_create(version=name, app="models", defaults={"content": {}})
+    await Tortoise.close_connections()
+
+
+async def measure(config: dict, generate: bool) -> list[float]:
+    from tortoise import Tortoise
+
+    from config.database import verify_migrations
+
+    timings = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        await Tortoise.init(config=config)
+        if generate:
+            await Tortoise.generate_schemas()
+        else:
+            await verify_migrations()
+        timings.append(time.perf_counter() - started)
+        await Tortoise.close_connections()
+    return timings
+
+
+async def main() -> int:
+    config = await postgres_config()
+    backend = "postgres"
+    path = None
+    if config is None:
+        backend = "sqlite"
+        path = os.path.join(tempfile.mkdtemp(), "startup.sqlite3")
+        config = sqlite_config(path)
+
+    try:
+        await prepare(config)
+        old = await measure(config, generate=True)
+        new = await measure(config, generate=False)
+    finally:
+        if path:
+            os.remove(path)
+
+    print("=" * 60)
+    print(f"Database startup ({backend}, {RUNS} runs, migrated schema)")
+    print("=" * 60)
+    for label, timings in (("generate_schemas", old), ("verify_migrations", new)):
+        print(
+            f"{label:<20} median {statistics.median(timings) * 1000:7.2f} ms   "
+            f"max {max(timings) * 1000:7.2f} ms"
+        )
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
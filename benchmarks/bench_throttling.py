@@ -0,0 +1,91 @@
+"""
+Benchmark: per-update overhead of the throttling middleware
+
+Calls the middleware around a no-op handler for text and voice messages
+from many users and subtracts the cost of calling the handler directly.
+The in-memory backend must stay in the microseconds; the shared database
+backend is shown for comparison (SQLite in memory, one statement per
+message).
+
+Usage:
+    python -m benchmarks.bench_throttling
+"""
+import asyncio
+import sys
+import time
+
+import benchmarks  # noqa: F401  (sets dummy credentials)
+from benchmarks.fakes import close_db, init_sqlite_db
+
+UPDATES = 100_000
+DB_UPDATES = 2_000
+USERS = 1_000
+BUDGET_US = 20.0
+
+
+def make_messages(n: int) -> list:
+    from aiogram.types import Message
+
+    messages = []
+    for i in range(n):
+        data = {
+            "message_id": i,
+            "date": 0,
+            "chat": {"id": i % USERS, "type": "private"},
+            "from": {"id": i % USERS, "is_bot": False, "first_name": "Bench"},
+        }
+        if i % 4 == 0:
+            data["voice"] = {"file_id": "f", "file_unique_id": "u", "duration": 3}
+        else:
+            data["text"] = f"taksi {i}"
+        messages.append(Message.model_validate(data))
+    return messages
+
+
+async def handler(event, data):
+    return None
+
+
+async def per_update_us(middleware, messages) -> float:
+    started = time.perf_counter()
+    for message in messages:
+        if middleware is None:
+            await handler(message, {})
+        else:
+            await middleware(handler, message, {})
+    return (time.perf_counter() - started) / len(messages) * 1e6
+
+
+async def main() -> int:
+    from app.middlewares import DatabaseTokenBucket, MemoryTokenBucket, ThrottlingMiddleware
+
+    messages = make_messages(UPDATES)
+    # Large budget: measure the bookkeeping, not the notice replies
+    memory = ThrottlingMiddleware(
+        MemoryTokenBucket(capacity=1e9, refill_rate=1.0), voice_cost=3, text_cost=1
+    )
+    database = ThrottlingMiddleware(
+        DatabaseTokenBucket(capacity=1e9, refill_rate=1.0), voice_cost=3, text_cost=1
+    )
+
+    baseline = await per_update_us(None, messages)
+    memory_us = await per_update_us(memory, messages) - baseline
+
+    await init_sqlite_db()
+    database_us = await per_update_us(database, messages[:DB_UPDATES]) - baseline
+    await close_db()
+
+    print("=" * 60)
+    print(f"Throttling middleware overhead ({USERS} users)")
+    print("=" * 60)
+    print(f"memory backend    {memory_us:8.2f} µs/update  ({UPDATES} updates)")
+    print(f"database backend  {database_us:8.2f} µs/update  ({DB_UPDATES} updates, SQLite)")
+    print("=" * 60)
+
+    ok = memory_us < BUDGET_US
+    print(f"✓ Memory backend under {BUDGET_US:.0f} µs" if ok else f"✗ Memory backend over {BUDGET_US:.0f} µs")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,124 @@
+"""
+Benchmark: database queries per /start and /login invocation
+
+Counts the SQL statements issued by the handlers on an in-memory SQLite
+database and compares them with the previous get_or_create + save path.
+On PostgreSQL the cold "unchanged" /start is a single statement as well
+(the upsert returns the existing row through a CTE).
+
+Usage:
+    python -m benchmarks.bench_user_queries
+"""
+import asyncio
+import functools
+import sys
+
+import benchmarks  # noqa: F401  (sets dummy credentials)
+from benchmarks.fakes import FakeMessage, close_db, init_sqlite_db
+
+QUERY_METHODS = ("execute_insert", "execute_query", "execute_query_dict", "execute_many")
+
+
+class QueryCounter:
+    """Counts statements sent through Tortoise's SQLite client"""
+
+    def __init__(self):
+        self.count = 0
+
+    def install(self) -> None:
+        from tortoise.backends.sqlite.client import SqliteClient, TransactionWrapper
+
+        for cls in (SqliteClient, TransactionWrapper):
+            for name in QUERY_METHODS:
+                if name in cls.__dict__:
+                    setattr(cls, name, self._wrap(cls.__dict__[name]))
+
+    def _wrap(self, method):
+        @functools.wraps(method)
+        async def counted(*args, **kwargs):
+            self.count += 1
+            return await method(*args, **kwargs)
+        return counted
+
+    async def measure(self, coro) -> int:
+        before = self.count
+        await coro
+        return self.count - before
+
+
+async def legacy_start(message) -> None:
+    """The /start database logic before the repository layer"""
+    from app.models import User
+
+    user = message.from_user
+    db_user, created = await User.get_or_create(
+        telegram_id=user.id,
+        defaults={
+            "username": user.username,
+            "first_name": user.first_name,
+            "last_name": user.last_name,
+        }
+    )
+    if not created:
+        db_user.username = user.username
+        db_user.first_name = user.first_name
+        db_user.last_name = user.last_name
+        await db_user.save()
+
+
+async def legacy_login(message) -> None:
+    """The /login database logic before the repository layer"""
+    from app.models import User
+
+    await User.get_or_none(telegram_id=message.from_user.id)
+
+
+async def main() -> int:
+    from app.handlers.login import cmd_login
+    from app.handlers.start import cmd_start
+    from app.repositories import user_repository
+
+    await init_sqlite_db()
+    counter = QueryCounter()
+    counter.install()
+
+    def message(user_id: int, first_name: str = "Bench") -> FakeMessage:
+        msg = FakeMessage(user_id=user_id)
+        msg.from_user.first_name = first_name
+        return msg
+
+    rows = []
+    # Legacy path (users 1xx) and repository path (users 2xx)
+    for label, legacy, new in (
+        ("/start new user", legacy_start(message(101)), cmd_start(message(201))),
+        ("/start unchanged, warm", legacy_start(message(101)), cmd_start(message(201))),
+        ("/start changed name", legacy_start(message(101, "Renamed")), cmd_start(message(201, "Renamed"))),
+        ("/login", legacy_login(message(101)), cmd_login(message(201))),
+        ("/login again", legacy_login(message(101)), cmd_login(message(201))),
+    ):
+        rows.append((label, await counter.measure(legacy), await counter.measure(new)))
+
+    user_repository.clear()
+    rows.append((
+        "/start unchanged, cold",
+        await counter.measure(legacy_start(message(101, "Renamed"))),
+        await counter.measure(cmd_start(message(201, "Renamed"))),
+    ))
+
+    await close_db()
+
+    print("=" * 60)
+    print(f"{'Invocation':<26}{'before':>10}{'after':>10}")
+    print("-" * 60)
+    for label, before, after in rows:
+        print(f"{label:<26}{before:>10}{after:>10}")
+    print("=" * 60)
+
+    total_before = sum(before for _, before, _ in rows)
+    total_after = sum(after for _, _, after in rows)
+    print(f"Total queries: {total_before} -> {total_after}")
+    return 0 if total_after < total_before else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,61 @@
+"""
+Benchmark: single-call vs two-step voice pipeline
+
+Processes the same voice note through ``process_voice_message`` with
+``gemini_single_call_voice`` on and off, against a stubbed model with a fixed
+per-request latency, and reports latency and model calls per message.
+
+Usage:
+    python -m benchmarks.bench_voice_pipeline
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+import benchmarks  # noqa: F401  (sets dummy credentials)
+from benchmarks.fakes import FakeGeminiClient
+
+LATENCY = 0.08
+MESSAGES = 20
+AUDIO = b"OggS" + b"\x00" * 16_000
+
+
+async def measure(single_call: bool) -> tuple[list[float], float]:
+    from app.services import get_gemini_service
+    from config import settings
+
+    settings.gemini_single_call_voice = single_call
+    client = FakeGeminiClient(latency=LATENCY)
+    gemini_service = get_gemini_service()
+    gemini_service.client = client
+
+    latencies = []
+    for _ in range(MESSAGES):
+        started = time.perf_counter()
+        await gemini_service.process_voice_message(AUDIO)
+        latencies.append(time.perf_counter() - started)
+
+    return latencies, client.aio.models.calls / MESSAGES
+
+
+async def main() -> int:
+    print("=" * 60)
+    print(f"Voice pipeline (stubbed model latency {LATENCY * 1000:.0f} ms/request)")
+    print("=" * 60)
+
+    results = {}
+    for name, single_call in (("two-step", False), ("single-call", True)):
+        latencies, calls = await measure(single_call)
+        results[name] = statistics.mean(latencies)
+        print(f"{name:<12} mean={statistics.mean(latencies) * 1000:7.1f} ms  "
+              f"max={max(latencies) * 1000:7.1f} ms  model calls/msg={calls:.1f}")
+
+    speedup = results["two-step"] / results["single-call"]
+    print("=" * 60)
+    print(f"Single-call speedup: x{speedup:.2f}")
+    return 0 if speedup > 1 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,254 @@
+"""
+Local stand-ins for Telegram and Gemini used by the benchmarks
+"""
+import asyncio
+import io
+import json
+import itertools
+import random
+from types import SimpleNamespace
+from typing import Optional
+
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramNetworkError
+from aiogram.methods import GetFile, SendMessage
+from aiogram.types import File, Message
+
+FINANCIAL_JSON = json.dumps({
+    "type": "expense",
+    "amount": 50000,
+    "category": "food",
+    "description": "oziq-ovqat",
+    "date": "today"
+})
+
+
+def server_error():
+    """Retryable 503, as the API returns when overloaded"""
+    # Imported here so the fakes don't load google.genai up front
+    from google.genai.errors import ServerError
+
+    return ServerError(503, {"error": {"message": "overloaded", "status": "UNAVAILABLE"}})
+
+
+class FakeResponse:
+    """Minimal GenerateContentResponse replacement"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeFiles:
+    """Async Files API with a fixed latency per call"""
+
+    def __init__(self, latency: float, error_rate: float = 0.0, rng: Optional[random.Random] = None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = rng or random.Random(0)
+        self.uploads = 0
+        self.deletes = 0
+        self.errors = 0
+
+    async def upload(self, *, file, config=None):
+        await asyncio.sleep(self.latency)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.errors += 1
+            raise server_error()
+        self.uploads += 1
+        return SimpleNamespace(name=f"files/{self.uploads}")
+
+    async def delete(self, *, name, config=None):
+        await asyncio.sleep(self.latency)
+        self.deletes += 1
+
+
+class FakeModels:
+    """Async Models API that answers transcripts and financial JSON"""
+
+    def __init__(self, latency: float, transcript: str = "Men bugun 50000 so'm oziq-ovqatga sarfladim",
+                 error_rate: float = 0.0, rng: Optional[random.Random] = None):
+        self.latency = latency
+        self.transcript = transcript
+        self.error_rate = error_rate
+        self.rng = rng or random.Random(0)
+        self.calls = 0
+        self.errors = 0
+
+    async def generate_content(self, *, model, contents, config=None):
+        await asyncio.sleep(self.latency)
+        self.calls += 1
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.errors += 1
+            raise server_error()
+        schema = getattr(config, "response_schema", None)
+        if schema is not None and schema.type == "ARRAY":
+            # Batched extraction: one record per "index" line of the prompt
+            count = contents.count('{"index": ')
+            return FakeResponse(json.dumps([
+                {"index": index, "financial_data": json.loads(FINANCIAL_JSON)} for index in range(count)
+            ]))
+        if schema is not None and "transcript" in (schema.properties or {}):
+            return FakeResponse(json.dumps({
+                "transcript": self.transcript,
+                "financial_data": json.loads(FINANCIAL_JSON),
+            }))
+        if isinstance(contents, list):
+            return FakeResponse(self.transcript)
+        return FakeResponse(FINANCIAL_JSON)
+
+    async def generate_content_stream(self, *, model, contents, config=None):
+        """Transcript in word-sized chunks, with ``latency`` spread over the stream"""
+        self.calls += 1
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.errors += 1
+            raise server_error()
+        words = self.transcript.split(" ")
+
+        async def chunks():
+            for index, word in enumerate(words):
+                await asyncio.sleep(self.latency / len(words))
+                yield FakeResponse(word if index == 0 else " " + word)
+
+        return chunks()
+
+
+class FakeGeminiClient:
+    """
+    Drop-in replacement for ``genai.Client`` exposing only ``.aio``
+
+    ``error_rate`` is the share of calls failing with a retryable 503.
+    """
+
+    def __init__(self, latency: float = 0.05, error_rate: float = 0.0, seed: int = 0):
+        rng = random.Random(seed)
+        self.aio = SimpleNamespace(
+            files=FakeFiles(latency, error_rate, rng),
+            models=FakeModels(latency, error_rate=error_rate, rng=rng),
+        )
+
+
+_message_ids = itertools.count(1)
+
+
+class FakeMessage:
+    """Message stand-in recording everything the handlers send"""
+
+    def __init__(self, user_id: int = 1, text: Optional[str] = None, voice=None):
+        self.message_id = next(_message_ids)
+        self.from_user = SimpleNamespace(id=user_id, username=None, first_name="Bench", last_name=None)
+        self.chat = SimpleNamespace(id=user_id)
+        self.text = text
+        self.voice = voice
+        self.answers = []
+        self.deleted = False
+
+    async def answer(self, text: str, **kwargs):
+        self.answers.append(text)
+        return FakeMessage(self.from_user.id, text=text)
+
+    async def edit_text(self, text: str, **kwargs):
+        self.text = text
+        return self
+
+    async def delete(self):
+        self.deleted = True
+        return True
+
+
+def make_voice(file_id: str = "voice-1", file_size: int = 16_000, duration: int = 5):
+    """Build a ``message.voice`` stand-in"""
+    return SimpleNamespace(
+        file_id=file_id,
+        file_unique_id=f"unique-{file_id}",
+        file_size=file_size,
+        duration=duration,
+        mime_type="audio/ogg",
+    )
+
+
+class FakeBot:
+    """Bot stand-in serving voice files from memory"""
+
+    def __init__(self, latency: float = 0.0, payload: bytes = b"OggS" + b"\x00" * 16_000):
+        self.latency = latency
+        self.payload = payload
+
+    async def get_file(self, file_id: str):
+        await asyncio.sleep(self.latency)
+        return SimpleNamespace(file_id=file_id, file_path=f"voice/{file_id}.oga", file_size=len(self.payload))
+
+    async def download_file(self, file_path: str, destination=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        if destination is None:
+            return io.BytesIO(self.payload)
+        destination.write(self.payload)
+        return destination
+
+
+class FakeTelegramSession(BaseSession):
+    """
+    Bot API session answering from memory
+
+    Lets a real ``Bot`` and ``Dispatcher`` run offline: sent messages come
+    back as ``Message`` objects bound to the bot, ``getFile`` returns a
+    file path and downloads stream ``payload``. Every request waits
+    ``latency`` seconds and fails with ``error_rate`` probability.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0,
+                 payload: bytes = b"OggS" + b"\x00" * 16_000, seed: int = 0):
+        super().__init__()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.payload = payload
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self._ids = itertools.count(1_000_000)
+
+    async def make_request(self, bot, method, timeout=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.requests += 1
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.errors += 1
+            raise TelegramNetworkError(method, "Fake network error")
+
+        if isinstance(method, SendMessage):
+            return Message.model_validate({
+                "message_id": next(self._ids),
+                "date": 0,
+                "chat": {"id": method.chat_id, "type": "private"},
+                "text": method.text,
+            }, context={"bot": bot})
+        if isinstance(method, GetFile):
+            return File(
+                file_id=method.file_id,
+                file_unique_id=f"unique-{method.file_id}",
+                file_size=len(self.payload),
+                file_path=f"voice/{method.file_id}.oga",
+            )
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for start in range(0, len(self.payload), chunk_size):
+            yield self.payload[start:start + chunk_size]
+
+    async def close(self):
+        pass
+
+
+async def init_sqlite_db() -> None:
+    """Initialize Tortoise on an in-memory SQLite database"""
+    from tortoise import Tortoise
+
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["app.models"]})
+    await Tortoise.generate_schemas()
+
+
+async def close_db() -> None:
+    from tortoise import Tortoise
+
+    await Tortoise.close_connections()
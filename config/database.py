@@ -1,12 +1,50 @@
 """
 Database configuration for Tortoise ORM
 """
+import logging
+import time
+from pathlib import Path
+from typing import List
+
 from config.settings import settings
 
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations" / "models"
+
+
+def connection_config(**overrides) -> dict:
+    """
+    Tortoise connection entry for the asyncpg backend
+
+    Pool options are passed through to ``asyncpg.create_pool``.
+
+    Args:
+        **overrides: Credentials to replace (e.g. maxsize=2 in tests)
+
+    Returns:
+        Connection config dict ({"engine", "credentials"})
+    """
+    credentials = {
+        "host": settings.db_host,
+        "port": settings.db_port,
+        "user": settings.db_user,
+        "password": settings.db_password,
+        "database": settings.db_name,
+        "minsize": settings.db_pool_min_size,
+        "maxsize": settings.db_pool_max_size,
+        "max_inactive_connection_lifetime": settings.db_pool_max_inactive_lifetime,
+        "max_queries": settings.db_pool_max_queries,
+        "statement_cache_size": settings.db_statement_cache_size,
+        "command_timeout": settings.db_command_timeout or None,
+    }
+    credentials.update(overrides)
+    return {"engine": "tortoise.backends.asyncpg", "credentials": credentials}
+
 
 TORTOISE_ORM = {
     "connections": {
-        "default": settings.database_url
+        "default": connection_config()
     },
     "apps": {
         "models": {
@@ -17,15 +55,50 @@ TORTOISE_ORM = {
 }
 
 
+def migration_files() -> List[str]:
+    """Aerich migration file names in apply order"""
+    names = [path.name for path in MIGRATIONS_DIR.glob("*.py") if path.name[0].isdigit()]
+    return sorted(names, key=lambda name: int(name.split("_", 1)[0]))
+
+
+async def verify_migrations() -> None:
+    """
+    Check that every migration has been applied (``aerich upgrade``)
+
+    Raises:
+        RuntimeError: If the database is behind the migration files
+    """
+    from aerich.models import Aerich
+    from tortoise.exceptions import OperationalError
+
+    try:
+        applied = set(await Aerich.filter(app="models").values_list("version", flat=True))
+    except OperationalError:
+        # aerich table does not exist yet
+        applied = set()
+
+    missing = [name for name in migration_files() if name not in applied]
+    if missing:
+        raise RuntimeError(
+            f"Database schema is out of date, unapplied migrations: {', '.join(missing)}. "
+            f"Run `aerich upgrade` first."
+        )
+
+
 async def init_db():
     """Initialize database connection"""
     from tortoise import Tortoise
-    
-    await Tortoise.init(
-        db_url=settings.database_url,
-        modules={"models": ["app.models", "aerich.models"]}
-    )
-    await Tortoise.generate_schemas()
+
+    started = time.perf_counter()
+    await Tortoise.init(config=TORTOISE_ORM)
+
+    if settings.db_generate_schemas:
+        # Local development only: create missing tables from the models
+        await Tortoise.generate_schemas()
+    else:
+        await verify_migrations()
+
+    logger.info(f"Database ready in {(time.perf_counter() - started) * 1000:.1f} ms")
 
 
 async def close_db():
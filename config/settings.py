@@ -10,6 +10,24 @@ class Settings(BaseSettings):
     # Telegram Bot Configuration
     bot_token: str
     
+    # Update delivery: "polling", "webhook" or "sharded" (one poller, per-user shards
+    # on several processes); "worker" only runs durable queue jobs
+    bot_mode: str = "polling"
+    
+    # Webhook Configuration (bot_mode=webhook)
+    webhook_base_url: str = ""
+    webhook_path: str = "/webhook"
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8080
+    webhook_secret: str = ""
+    webhook_workers: int = 1
+    
+    # Sharded mode (bot_mode=sharded): shard processes, updates each one handles at once,
+    # seconds between per-shard load log lines (0 = off)
+    shard_workers: int = 4
+    shard_max_in_flight: int = 100
+    shard_report_interval: float = 60.0
+    
     # Database Configuration
     db_host: str = "localhost"
     db_port: int = 5432
@@ -17,9 +35,133 @@ class Settings(BaseSettings):
     db_password: str
     db_name: str = "finance_bot"
     
+    # Connection pool (asyncpg); lifetimes/timeouts in seconds, 0 disables
+    db_pool_min_size: int = 1
+    db_pool_max_size: int = 10
+    db_pool_max_inactive_lifetime: float = 300.0
+    db_pool_max_queries: int = 50000
+    db_statement_cache_size: int = 100
+    db_command_timeout: float = 30.0
+    
+    # Create tables from models on startup instead of checking migrations (dev only)
+    db_generate_schemas: bool = False
+    
     # Gemini API Configuration
     gemini_api_key: str
     
+    # More Gemini credentials for the client pool, comma-separated: API keys or
+    # vertex:<project>:<location> (GEMINI_API_KEY always comes first)
+    gemini_extra_keys: str = ""
+    
+    # Per-credential quota used to route calls (0 = not limited) and how long a
+    # credential is left out after a 429 when the API gives no retry delay
+    gemini_key_rpm: int = 15
+    gemini_key_tpm: int = 1_000_000
+    gemini_key_cooldown: float = 60.0
+    
+    # Gemini models: primary first, then comma-separated fallbacks
+    gemini_model: str = "gemini-2.0-flash-exp"
+    gemini_fallback_models: str = "gemini-2.0-flash"
+    
+    # Gemini retries (backoff in seconds), circuit breaker and hedging
+    # A model is skipped for breaker_reset seconds after breaker_threshold failures;
+    # hedge_after > 0 duplicates a call still running after that many seconds
+    # (never a streamed transcription: both streams would reach the user)
+    gemini_max_attempts: int = 3
+    gemini_backoff_base: float = 0.5
+    gemini_backoff_max: float = 8.0
+    gemini_breaker_threshold: int = 5
+    gemini_breaker_reset: float = 30.0
+    gemini_hedge_after: float = 0.0
+    
+    # Gemini concurrency limits (max in-flight calls per operation)
+    gemini_upload_concurrency: int = 4
+    gemini_generate_concurrency: int = 16
+    gemini_delete_concurrency: int = 4
+    
+    # Voice notes up to this size are sent inline (no Files API upload)
+    gemini_inline_audio_max_bytes: int = 14 * 1024 * 1024
+    
+    # Transcribe and extract voice notes in one model request
+    gemini_single_call_voice: bool = True
+    
+    # Longest accepted voice note, in seconds (0 = no limit)
+    voice_max_duration: int = 600
+    
+    # Largest accepted voice note in bytes (the Bot API serves up to 20 MB) and
+    # how long getFile answers (file_id -> file_path) are reused, in seconds
+    voice_max_bytes: int = 20 * 1024 * 1024
+    voice_file_path_ttl: int = 30 * 60
+    
+    # Voice notes longer than THRESHOLD seconds are split at pauses into pieces
+    # of at most MAX_LENGTH seconds, transcribed in parallel (threshold 0 = off)
+    voice_segment_threshold: float = 60.0
+    voice_segment_max_length: float = 30.0
+    
+    # Stream the transcript into the processing message while a voice note is
+    # transcribed (two model calls instead of one; edits at most every INTERVAL seconds)
+    voice_streaming: bool = False
+    voice_stream_edit_interval: float = 1.0
+    
+    # Micro-batching of text extraction: up to MAX_SIZE texts per request,
+    # collected for at most MAX_WAIT seconds (max size 1 = off)
+    gemini_batch_max_size: int = 8
+    gemini_batch_max_wait: float = 0.005
+    
+    # Extraction cache (TTL in seconds)
+    extraction_cache_max_entries: int = 10000
+    extraction_cache_ttl: int = 24 * 60 * 60
+    extraction_cache_persistent: bool = False
+    
+    # Local parser: answer without Gemini at or above this confidence
+    local_parser_enabled: bool = True
+    local_parser_min_confidence: float = 0.9
+    
+    # User lookup cache (TTL in seconds)
+    user_cache_max_entries: int = 10000
+    user_cache_ttl: int = 300
+    
+    # Processing queue for Gemini work (workers, waiting jobs in total and per user)
+    processing_workers: int = 8
+    processing_queue_max_size: int = 200
+    processing_queue_max_per_user: int = 5
+    
+    # Durable job queue (job_queue table): backend "memory" runs voice and Gemini text
+    # jobs in-process; "database" stores them so any bot or worker process can run them
+    # and a restart loses nothing. WORKERS jobs at once per process (0 = enqueue only);
+    # a job's lease lasts VISIBILITY_TIMEOUT seconds and is renewed while it runs
+    job_queue_backend: str = "memory"
+    job_workers: int = 8
+    job_visibility_timeout: float = 120.0
+    job_max_attempts: int = 3
+    job_poll_interval: float = 1.0
+    job_drain_timeout: float = 30.0
+    
+    # /export: rows read and encoded per chunk, exports running at once (each holds a
+    # database connection), largest file sent (Telegram bots may send up to 50 MB)
+    export_chunk_size: int = 1000
+    export_max_concurrent: int = 2
+    export_max_bytes: int = 50 * 1024 * 1024
+    
+    # Per-user throttling (token bucket: capacity in tokens, refill in tokens/second,
+    # both positive; turn it off with throttle_enabled instead)
+    # Backend "memory" limits each process; "database" shares one limit across processes
+    throttle_enabled: bool = True
+    throttle_backend: str = "memory"
+    throttle_capacity: float = 10.0
+    throttle_refill_rate: float = 0.2
+    throttle_voice_cost: float = 3.0
+    throttle_text_cost: float = 1.0
+    
+    # Transaction write-behind buffer (flush on size or interval in seconds)
+    transaction_buffer_size: int = 100
+    transaction_flush_interval: float = 2.0
+    
+    # Prometheus metrics endpoint (webhook workers use port + worker index)
+    metrics_enabled: bool = True
+    metrics_host: str = "0.0.0.0"
+    metrics_port: int = 9100
+    
     # Application Configuration
     debug: bool = False
     
@@ -33,6 +175,24 @@ class Settings(BaseSettings):
     def database_url(self) -> str:
         """Get database URL for Tortoise ORM"""
         return f"postgres://{self.db_user}:{self.db_password}@{self.db_host}:{self.db_port}/{self.db_name}"
+    
+    @property
+    def gemini_models(self) -> list[str]:
+        """Primary model followed by the fallbacks, in order"""
+        fallbacks = [name.strip() for name in self.gemini_fallback_models.split(",")]
+        models = [self.gemini_model] + [name for name in fallbacks if name]
+        return list(dict.fromkeys(models))
+    
+    @property
+    def gemini_credentials(self) -> list[str]:
+        """GEMINI_API_KEY followed by the extra keys/projects, in order"""
+        extra = [value.strip() for value in self.gemini_extra_keys.split(",")]
+        return list(dict.fromkeys([self.gemini_api_key] + [value for value in extra if value]))
+    
+    @property
+    def webhook_url(self) -> str:
+        """Public URL Telegram posts updates to"""
+        return f"{self.webhook_base_url.rstrip('/')}{self.webhook_path}"
 
 
 # Global settings instance
@@ -3,6 +3,7 @@ Main entry point for Finance AI Bot
 """
 import asyncio
 import logging
+import signal
 import sys
 
 from aiogram import Bot, Dispatcher
@@ -10,7 +11,11 @@ from aiogram.enums import ParseMode
 
 from config import settings
 from config.database import init_db, close_db
+from app import metrics
 from app.handlers import setup_routers
+from app.services import get_gemini_service, job_queue, processing_queue, transaction_buffer
+from app.sharding import run_sharded
+from app.webhook import run_webhook
 
 # Configure logging
 logging.basicConfig(
@@ -23,25 +28,82 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Metrics HTTP server of this process (started in on_startup)
+metrics_runner = None
 
-async def main():
-    """
-    Main function to start the bot
-    """
-    # Initialize bot and dispatcher
-    bot = Bot(token=settings.bot_token, parse_mode=ParseMode.HTML)
+
+def create_bot() -> Bot:
+    """Create the Telegram bot client"""
+    return Bot(token=settings.bot_token, parse_mode=ParseMode.HTML)
+
+
+async def on_startup(bot: Bot):
+    """Dispatcher startup hook (polling and every webhook worker)"""
+    # Initialize database
+    logger.info("Initializing database...")
+    await init_db()
+    logger.info("Database initialized successfully")
+    
+    # Metrics endpoint and query timing
+    global metrics_runner
+    if settings.metrics_enabled:
+        from tortoise import Tortoise
+        metrics.instrument_connection(Tortoise.get_connection("default"))
+        metrics_runner = await metrics.start_metrics_server(settings.metrics_host, settings.metrics_port)
+    
+    # Start batched transaction writes
+    await transaction_buffer.start()
+    
+    # Run durable queue jobs in this process too
+    if settings.job_queue_backend == "database":
+        job_queue.start(bot)
+
+
+async def on_shutdown():
+    """Dispatcher shutdown hook (polling and every webhook worker)"""
+    # Finish (or put back) durable jobs this process is running
+    await job_queue.drain(settings.job_drain_timeout)
+    
+    # Let queued voice/text jobs finish
+    await processing_queue.close()
+    
+    # Finish pending Gemini file deletions (if Gemini was used at all)
+    gemini_service = get_gemini_service(create=False)
+    if gemini_service is not None:
+        await gemini_service.wait_background_tasks()
+    
+    # Write transactions that are still buffered
+    await transaction_buffer.close()
+    
+    # Close database connection
+    await close_db()
+    
+    await metrics.stop_metrics_server(metrics_runner)
+    logger.info("Bot stopped")
+
+
+def create_dispatcher() -> Dispatcher:
+    """Create the dispatcher with all routers and lifecycle hooks"""
     dp = Dispatcher()
     
     # Setup routers
     main_router = setup_routers()
     dp.include_router(main_router)
     
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    return dp
+
+
+async def main():
+    """
+    Main function to start the bot (long polling)
+    """
+    # Initialize bot and dispatcher
+    bot = create_bot()
+    dp = create_dispatcher()
+    
     try:
-        # Initialize database
-        logger.info("Initializing database...")
-        await init_db()
-        logger.info("Database initialized successfully")
-        
         # Start bot
         logger.info("Starting bot...")
         await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
@@ -50,15 +112,43 @@ async def main():
         logger.error(f"Error starting bot: {e}")
         raise
     finally:
-        # Close database connection
-        await close_db()
         await bot.session.close()
-        logger.info("Bot stopped")
+
+
+async def run_worker():
+    """
+    Worker process (BOT_MODE=worker): runs durable queue jobs only,
+    receives no updates. Stops on SIGTERM/SIGINT after draining.
+    """
+    # Registers the voice/text job handlers
+    import app.handlers.voice  # noqa: F401
+    
+    bot = create_bot()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    
+    await on_startup(bot)
+    job_queue.start(bot)
+    logger.info(f"Worker {job_queue.worker_id} started")
+    try:
+        await stop.wait()
+    finally:
+        await on_shutdown()
+        await bot.session.close()
 
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        if settings.bot_mode == "webhook":
+            run_webhook(create_dispatcher(), create_bot)
+        elif settings.bot_mode == "sharded":
+            run_sharded(create_dispatcher(), create_bot)
+        elif settings.bot_mode == "worker":
+            asyncio.run(run_worker())
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
     except Exception as e:
@@ -0,0 +1,18 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "extraction_cache" (
+    "key" VARCHAR(128) NOT NULL  PRIMARY KEY,
+    "value" JSONB NOT NULL,
+    "expires_at" TIMESTAMPTZ NOT NULL,
+    "created_at" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS "idx_extraction__expires_6c2d23" ON "extraction_cache" ("expires_at");
+COMMENT ON TABLE "extraction_cache" IS 'Cached extraction result that survives bot restarts';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "extraction_cache";"""
@@ -0,0 +1,24 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "transactions" (
+    "id" BIGSERIAL NOT NULL PRIMARY KEY,
+    "type" VARCHAR(16) NOT NULL,
+    "amount" DECIMAL(18,2) NOT NULL,
+    "category" VARCHAR(64) NOT NULL,
+    "description" TEXT,
+    "date" DATE NOT NULL,
+    "transcript" TEXT,
+    "source" VARCHAR(16) NOT NULL,
+    "created_at" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "user_id" INT NOT NULL REFERENCES "users" ("id") ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS "idx_transaction_user_id_c1bb2a" ON "transactions" ("user_id", "date");
+COMMENT ON TABLE "transactions" IS 'Financial record extracted from a voice or text message';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "transactions";"""
@@ -0,0 +1,32 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "transaction_rollups" (
+    "id" BIGSERIAL NOT NULL PRIMARY KEY,
+    "period" VARCHAR(8) NOT NULL,
+    "period_start" DATE NOT NULL,
+    "category" VARCHAR(64) NOT NULL,
+    "type" VARCHAR(16) NOT NULL,
+    "total" DECIMAL(18,2) NOT NULL  DEFAULT 0,
+    "count" INT NOT NULL  DEFAULT 0,
+    "updated_at" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "user_id" INT NOT NULL REFERENCES "users" ("id") ON DELETE CASCADE,
+    CONSTRAINT "uid_transaction_user_id_d65a8c" UNIQUE ("user_id", "period", "period_start", "category", "type")
+);
+COMMENT ON TABLE "transaction_rollups" IS 'Sum and count of a user''s transactions for one period/category/type';
+        INSERT INTO "transaction_rollups" ("user_id", "period", "period_start", "category", "type", "total", "count")
+        SELECT "user_id", 'day', "date", "category", "type", SUM("amount"), COUNT(*)
+        FROM "transactions" GROUP BY 1, 2, 3, 4, 5
+        UNION ALL
+        SELECT "user_id", 'week', CAST(date_trunc('week', "date") AS DATE), "category", "type", SUM("amount"), COUNT(*)
+        FROM "transactions" GROUP BY 1, 2, 3, 4, 5
+        UNION ALL
+        SELECT "user_id", 'month', CAST(date_trunc('month', "date") AS DATE), "category", "type", SUM("amount"), COUNT(*)
+        FROM "transactions" GROUP BY 1, 2, 3, 4, 5;"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "transaction_rollups";"""
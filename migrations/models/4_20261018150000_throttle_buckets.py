@@ -0,0 +1,17 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "throttle_buckets" (
+    "key" BIGINT NOT NULL  PRIMARY KEY,
+    "tokens" DOUBLE PRECISION NOT NULL,
+    "refilled_at" DOUBLE PRECISION NOT NULL,
+    "allowed" BOOL NOT NULL  DEFAULT True
+);
+COMMENT ON TABLE "throttle_buckets" IS 'Token bucket of one user, shared by all bot processes';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "throttle_buckets";"""
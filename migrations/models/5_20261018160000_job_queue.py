@@ -0,0 +1,25 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "job_queue" (
+    "id" BIGSERIAL NOT NULL PRIMARY KEY,
+    "kind" VARCHAR(32) NOT NULL,
+    "user_id" BIGINT NOT NULL,
+    "payload" JSONB NOT NULL,
+    "status" VARCHAR(16) NOT NULL  DEFAULT 'queued',
+    "attempts" INT NOT NULL  DEFAULT 0,
+    "max_attempts" INT NOT NULL,
+    "available_at" DOUBLE PRECISION NOT NULL,
+    "locked_by" VARCHAR(64),
+    "last_error" TEXT,
+    "created_at" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS "idx_job_queue_status_dde4e7" ON "job_queue" ("status", "available_at");
+COMMENT ON TABLE "job_queue" IS 'Voice or text job waiting for (or leased by) a worker';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "job_queue";"""
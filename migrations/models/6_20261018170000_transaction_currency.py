@@ -0,0 +1,20 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "transactions" ADD "currency" VARCHAR(3) NOT NULL  DEFAULT 'UZS';
+        ALTER TABLE "transaction_rollups" ADD "currency" VARCHAR(3) NOT NULL  DEFAULT 'UZS';
+        ALTER TABLE "transaction_rollups" DROP CONSTRAINT IF EXISTS "uid_transaction_user_id_d65a8c";
+        ALTER TABLE "transaction_rollups" ADD CONSTRAINT "uid_transaction_user_id_72437b" UNIQUE ("user_id", "period", "period_start", "category", "type", "currency");
+COMMENT ON TABLE "transaction_rollups" IS 'Sum and count of a user''s transactions for one period/category/type/currency';"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "transaction_rollups" DROP CONSTRAINT IF EXISTS "uid_transaction_user_id_72437b";
+        DELETE FROM "transaction_rollups" WHERE "currency" <> 'UZS';
+        ALTER TABLE "transaction_rollups" ADD CONSTRAINT "uid_transaction_user_id_d65a8c" UNIQUE ("user_id", "period", "period_start", "category", "type");
+        ALTER TABLE "transaction_rollups" DROP COLUMN "currency";
+        ALTER TABLE "transactions" DROP COLUMN "currency";
+COMMENT ON TABLE "transaction_rollups" IS 'Sum and count of a user''s transactions for one period/category/type';"""
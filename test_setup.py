@@ -21,7 +21,7 @@ def test_imports():
         from app.handlers import setup_routers
         print("✓ Handlers module")
         
-        from app.services import gemini_service
+        from app.services import get_gemini_service
         print("✓ Services module")
         
         from config import settings
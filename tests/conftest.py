@@ -0,0 +1,11 @@
+"""
+Shared test configuration
+
+Dummy credentials are set before the application is imported so the tests
+do not need a real ``.env`` file.
+"""
+import os
+
+os.environ.setdefault("BOT_TOKEN", "123456:test")
+os.environ.setdefault("DB_PASSWORD", "test")
+os.environ.setdefault("GEMINI_API_KEY", "test")
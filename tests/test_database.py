@@ -0,0 +1,140 @@
+"""
+Database startup: pool settings, migration check and pool saturation
+
+The pool tests need a PostgreSQL server reachable with the DB_* settings
+and are skipped otherwise.
+"""
+import asyncio
+import time
+
+import pytest
+from tortoise import Tortoise
+
+from config.database import connection_config, migration_files, verify_migrations
+from config.settings import settings
+
+
+def postgres_available() -> bool:
+    import asyncpg
+
+    async def probe():
+        connection = await asyncpg.connect(
+            host=settings.db_host, port=settings.db_port, user=settings.db_user,
+            password=settings.db_password, database=settings.db_name, timeout=2,
+        )
+        await connection.close()
+
+    try:
+        asyncio.run(probe())
+    except Exception:
+        return False
+    return True
+
+
+requires_postgres = pytest.mark.skipif(not postgres_available(), reason="PostgreSQL is not available")
+
+
+async def init_postgres(**overrides) -> None:
+    await Tortoise.init(
+        config={
+            "connections": {"default": connection_config(**overrides)},
+            "apps": {"models": {"models": ["app.models"], "default_connection": "default"}},
+        }
+    )
+
+
+def test_connection_config_passes_pool_settings():
+    config = connection_config(maxsize=3)
+    credentials = config["credentials"]
+
+    assert config["engine"] == "tortoise.backends.asyncpg"
+    assert credentials["minsize"] == settings.db_pool_min_size
+    assert credentials["maxsize"] == 3
+    assert credentials["max_inactive_connection_lifetime"] == settings.db_pool_max_inactive_lifetime
+    assert credentials["max_queries"] == settings.db_pool_max_queries
+    assert credentials["statement_cache_size"] == settings.db_statement_cache_size
+    assert credentials["command_timeout"] == (settings.db_command_timeout or None)
+
+
+def test_verify_migrations_requires_every_file():
+    async def run():
+        from aerich.models import Aerich
+
+        await Tortoise.init(
+            db_url="sqlite://:memory:", modules={"models": ["app.models", "aerich.models"]}
+        )
+        try:
+            files = migration_files()
+            assert files[0].startswith("0_")
+
+            await Tortoise.generate_schemas()
+            for name in files[:-1]:
+                await Aerich.create(version=name, app="models", content={})
+            with pytest.raises(RuntimeError, match=files[-1]):
+                await verify_migrations()
+
+            await Aerich.create(version=files[-1], app="models", content={})
+            await verify_migrations()
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+def test_verify_migrations_without_aerich_table():
+    async def run():
+        await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["app.models", "aerich.models"]})
+        try:
+            with pytest.raises(RuntimeError, match="aerich upgrade"):
+                await verify_migrations()
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+@requires_postgres
+def test_pool_saturation_queues_instead_of_failing():
+    async def run():
+        await init_postgres(minsize=1, maxsize=3)
+        try:
+            connection = Tortoise.get_connection("default")
+            in_flight = 0
+            peak = 0
+
+            async def query():
+                nonlocal in_flight, peak
+                async with connection.acquire_connection() as raw:
+                    in_flight += 1
+                    peak = max(peak, in_flight)
+                    await raw.execute("SELECT pg_sleep(0.2)")
+                    in_flight -= 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(query() for _ in range(9)))
+            elapsed = time.perf_counter() - started
+
+            # 9 queries through 3 connections -> three waves of 0.2 s
+            assert peak == 3
+            assert 0.55 < elapsed < 3.0
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+@requires_postgres
+def test_command_timeout_is_applied():
+    async def run():
+        await init_postgres(maxsize=1, command_timeout=0.2)
+        try:
+            connection = Tortoise.get_connection("default")
+            with pytest.raises(asyncio.TimeoutError):
+                await connection.execute_query("SELECT pg_sleep(2)")
+            # The pool recovers and serves the next query
+            _, rows = await connection.execute_query("SELECT 1 AS one")
+            assert rows[0]["one"] == 1
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
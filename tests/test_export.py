@@ -0,0 +1,225 @@
+"""
+/export: argument parsing, CSV/XLSX encoding and bounded memory on 1M rows
+
+The 1M-row checks run ``benchmarks.bench_export`` in a fresh process. The
+server-side cursor one needs PostgreSQL and is skipped without it; the
+others stream from SQLite with ``fetchmany``.
+"""
+import asyncio
+import csv
+import json
+import os
+import subprocess
+import sys
+import zipfile
+from datetime import date, timedelta
+from types import SimpleNamespace
+from xml.etree import ElementTree
+
+from tortoise import Tortoise
+
+from app.handlers import export
+from app.models import Transaction, User
+from app.services.export import ExportService
+from tests.test_database import requires_postgres
+
+TODAY = date(2026, 10, 18)
+SHEET = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROWS = 1_000_000
+
+
+def run_export_benchmark(*args: str) -> dict:
+    """1M-row export in a fresh process (its memory high-water mark is the measurement)"""
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_export", "--rows", str(ROWS), "--max-growth-mb", "24", "--json",
+         *args],
+        cwd=ROOT, env=os.environ.copy(), capture_output=True, text=True, timeout=300,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+async def init_sqlite() -> None:
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["app.models"]})
+    await Tortoise.generate_schemas()
+
+
+async def add_transactions(user: User, rows) -> None:
+    await Transaction.bulk_create([
+        Transaction(user=user, type=tx_type, amount=amount, category=category, description=description,
+                    date=day, source="text")
+        for tx_type, amount, category, description, day in rows
+    ])
+
+
+def read_csv(path):
+    with open(path, encoding="utf-8-sig", newline="") as file:
+        return list(csv.reader(file))
+
+
+def read_xlsx(path):
+    with zipfile.ZipFile(path) as archive:
+        assert {"[Content_Types].xml", "xl/workbook.xml", "xl/styles.xml"} <= set(archive.namelist())
+        root = ElementTree.fromstring(archive.read("xl/worksheets/sheet1.xml"))
+    rows = []
+    for row in root.iter(f"{SHEET}row"):
+        values = []
+        for cell in row:
+            text = cell.find(f"{SHEET}is/{SHEET}t")
+            value = cell.find(f"{SHEET}v")
+            values.append(text.text if text is not None else value.text if value is not None else None)
+        rows.append(values)
+    return rows
+
+
+def test_parse_export_args():
+    parse = export.parse_export_args
+
+    assert parse(None, TODAY) == {"fmt": "csv", "start": None, "end": None, "category": None}
+    assert parse("XLSX oy Food", TODAY) == {
+        "fmt": "xlsx", "start": date(2026, 10, 1), "end": date(2026, 10, 31), "category": "Food",
+    }
+    assert parse("2026-01-01 2026-03-31", TODAY) == {
+        "fmt": "csv", "start": date(2026, 1, 1), "end": date(2026, 3, 31), "category": None,
+    }
+    assert parse("2026-05-01", TODAY)["start"] == date(2026, 5, 1)
+    assert parse("2026-05-01", TODAY)["end"] is None
+    # Two categories, reversed range, three dates
+    assert parse("food transport", TODAY) is None
+    assert parse("2026-03-31 2026-01-01", TODAY) is None
+    assert parse("2026-01-01 2026-01-02 2026-01-03", TODAY) is None
+
+
+def test_csv_export_applies_filters_in_date_order():
+    async def run():
+        await init_sqlite()
+        try:
+            user = await User.create(telegram_id=42)
+            other = await User.create(telegram_id=43)
+            await add_transactions(user, [
+                ("expense", "20000.00", "transport", "taksi, tunda", date(2026, 10, 3)),
+                ("income", "5000000.00", "salary", None, date(2026, 9, 30)),
+                ("expense", "45000.00", "Food", 'bozor "meva"', date(2026, 10, 1)),
+                ("expense", "12000.00", "food", "non", date(2026, 10, 20)),
+            ])
+            await add_transactions(other, [("expense", "1.00", "food", "x", date(2026, 10, 2))])
+
+            service = ExportService(chunk_size=2, max_concurrent=1)
+            path, count = await service.export_to_file("csv", user.id)
+            try:
+                assert count == 4
+                rows = read_csv(path)
+            finally:
+                os.unlink(path)
+            assert rows[0] == ["Sana", "Turi", "Miqdor", "Valyuta", "Kategoriya", "Tavsif", "Manba"]
+            assert [row[0] for row in rows[1:]] == ["2026-09-30", "2026-10-01", "2026-10-03", "2026-10-20"]
+            assert rows[2] == ["2026-10-01", "expense", "45000.00", "UZS", "Food", 'bozor "meva"', "text"]
+            assert rows[1][5] == ""
+
+            path, count = await service.export_to_file(
+                "csv", user.id, start=date(2026, 10, 1), end=date(2026, 10, 31), category="FOOD",
+            )
+            try:
+                assert [row[5] for row in read_csv(path)[1:]] == ['bozor "meva"', "non"]
+                assert count == 2
+            finally:
+                os.unlink(path)
+            assert service.stats() == {"exports": 2, "rows": 6}
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+def test_xlsx_export_has_dates_numbers_and_escaped_text():
+    async def run():
+        await init_sqlite()
+        try:
+            user = await User.create(telegram_id=42)
+            await add_transactions(user, [
+                ("expense", "45000.50", "food", "<non> & sut\x01", date(2026, 10, 1)),
+                ("income", "100.00", "gift", None, date(1900, 3, 1)),
+            ])
+            path, count = await ExportService(chunk_size=1, max_concurrent=1).export_to_file("xlsx", user.id)
+            try:
+                return read_xlsx(path), count
+            finally:
+                os.unlink(path)
+        finally:
+            await Tortoise.close_connections()
+
+    rows, count = asyncio.run(run())
+
+    assert count == 2
+    assert rows[0] == ["Sana", "Turi", "Miqdor", "Valyuta", "Kategoriya", "Tavsif", "Manba"]
+    # Excel serial dates: 1900-03-01 is 61, 2026-10-01 is 46296
+    assert rows[1] == ["61", "income", "100.00", "UZS", "gift", None, "text"]
+    assert rows[2] == ["46296", "expense", "45000.50", "UZS", "food", "<non> & sut", "text"]
+
+
+def test_export_of_a_million_rows_keeps_memory_flat():
+    report = run_export_benchmark("--format", "csv")
+
+    assert report["rows"] == ROWS
+    assert report["last_date"] == str(date(2020, 1, 1) + timedelta(days=ROWS // 500))
+    # ~60 MB of CSV written while the process grew by at most a few MB
+    assert report["size"] > 50 * 1024 * 1024
+    assert report["growth"] < 24 * 1024 * 1024
+
+
+@requires_postgres
+def test_server_side_cursor_export_keeps_memory_flat():
+    report = run_export_benchmark("--backend", "postgres", "--format", "xlsx")
+
+    assert report["rows"] == ROWS
+    assert report["growth"] < 24 * 1024 * 1024
+
+
+def test_export_command_sends_a_document(monkeypatch):
+    sent = {}
+
+    class Message:
+        from_user = SimpleNamespace(id=42)
+
+        def __init__(self):
+            self.answers = []
+
+        async def answer(self, text, **kwargs):
+            self.answers.append(text)
+            return SimpleNamespace(delete=lambda: asyncio.sleep(0))
+
+        async def answer_document(self, document, caption=None, **kwargs):
+            with open(document.path, encoding="utf-8-sig") as file:
+                sent["rows"] = list(csv.reader(file))
+            sent["path"] = document.path
+            sent["filename"] = document.filename
+            sent["caption"] = caption
+
+    async def run():
+        await init_sqlite()
+        try:
+            user = await User.create(telegram_id=42)
+            await add_transactions(user, [("expense", "20000.00", "transport", "taksi", date.today())])
+
+            message = Message()
+            await export.cmd_export(message, SimpleNamespace(args="csv oy"))
+            empty = Message()
+            await export.cmd_export(empty, SimpleNamespace(args="2001-01-01 2001-12-31"))
+            invalid = Message()
+            await export.cmd_export(invalid, SimpleNamespace(args="a b"))
+            return message, empty, invalid
+        finally:
+            await Tortoise.close_connections()
+
+    message, empty, invalid = asyncio.run(run())
+
+    assert message.answers == ["⏳ Eksport tayyorlanmoqda..."]
+    assert sent["filename"] == f"tranzaksiyalar_{date.today()}.csv"
+    assert sent["caption"] == "📄 1 ta yozuv"
+    assert sent["rows"][1][1:5] == ["expense", "20000.00", "UZS", "transport"]
+    # The temporary file is removed after sending
+    assert not os.path.exists(sent["path"])
+    assert empty.answers[-1] == "📭 Tanlangan davr uchun yozuvlar yo'q."
+    assert invalid.answers == [export.USAGE_TEXT]
@@ -0,0 +1,159 @@
+"""
+Micro-batched text extraction: batching, result routing and single-call fallback
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from google.genai.errors import ServerError
+
+from app.services.extraction_batcher import ExtractionBatcher
+from app.services.gemini_service import GeminiService
+from app.services.resilience import ResilientCaller
+
+
+def record(text: str) -> dict:
+    return {"type": "expense", "amount": len(text), "category": "other", "description": text, "date": "today"}
+
+
+class FakeService:
+    """extract_financial_data(_batch) stand-in recording its calls"""
+
+    def __init__(self, missing=(), batch_error=None):
+        self.missing = set(missing)
+        self.batch_error = batch_error
+        self.batch_calls = []
+        self.single_calls = []
+
+    async def extract_financial_data_batch(self, texts):
+        self.batch_calls.append(list(texts))
+        await asyncio.sleep(0)
+        if self.batch_error is not None:
+            raise self.batch_error
+        return [None if text in self.missing else record(text) for text in texts]
+
+    async def extract_financial_data(self, text):
+        self.single_calls.append(text)
+        await asyncio.sleep(0)
+        return record(text)
+
+
+def test_concurrent_texts_share_one_request():
+    async def run():
+        service = FakeService()
+        batcher = ExtractionBatcher(service, max_size=8, max_wait=0.01)
+
+        texts = [f"text {i}" for i in range(5)]
+        results = await asyncio.gather(*(batcher.extract(text) for text in texts))
+
+        assert service.batch_calls == [texts]
+        assert service.single_calls == []
+        # Every caller gets its own record back
+        assert [result["description"] for result in results] == texts
+
+    asyncio.run(run())
+
+
+def test_full_batch_is_sent_without_waiting():
+    async def run():
+        service = FakeService()
+        batcher = ExtractionBatcher(service, max_size=3, max_wait=10)
+
+        results = await asyncio.wait_for(
+            asyncio.gather(*(batcher.extract(f"t{i}") for i in range(6))), timeout=1
+        )
+
+        assert service.batch_calls == [["t0", "t1", "t2"], ["t3", "t4", "t5"]]
+        assert len(results) == 6
+
+    asyncio.run(run())
+
+
+def test_lone_text_uses_single_call():
+    async def run():
+        service = FakeService()
+        batcher = ExtractionBatcher(service, max_size=8, max_wait=0.001)
+
+        assert (await batcher.extract("only"))["description"] == "only"
+        assert service.batch_calls == []
+        assert service.single_calls == ["only"]
+
+    asyncio.run(run())
+
+
+def test_missing_items_fall_back_to_single_calls():
+    async def run():
+        service = FakeService(missing={"b"})
+        batcher = ExtractionBatcher(service, max_size=8, max_wait=0.001)
+
+        results = await asyncio.gather(*(batcher.extract(text) for text in ("a", "b", "c")))
+
+        assert [result["description"] for result in results] == ["a", "b", "c"]
+        assert service.single_calls == ["b"]
+        assert batcher.fallbacks == 1
+
+    asyncio.run(run())
+
+
+def test_unparseable_batch_falls_back_for_every_item():
+    async def run():
+        service = FakeService(batch_error=json.JSONDecodeError("bad", "", 0))
+        batcher = ExtractionBatcher(service, max_size=8, max_wait=0.001)
+
+        results = await asyncio.gather(*(batcher.extract(text) for text in ("a", "b")))
+
+        assert [result["description"] for result in results] == ["a", "b"]
+        assert service.single_calls == ["a", "b"]
+
+    asyncio.run(run())
+
+
+def test_api_error_fails_every_caller():
+    async def run():
+        error = ServerError(503, {"error": {"message": "unavailable", "status": "UNAVAILABLE"}})
+        service = FakeService(batch_error=error)
+        batcher = ExtractionBatcher(service, max_size=8, max_wait=0.001)
+
+        results = await asyncio.gather(*(batcher.extract(t) for t in ("a", "b")), return_exceptions=True)
+
+        assert results == [error, error]
+        assert service.single_calls == []
+
+    asyncio.run(run())
+
+
+def test_service_routes_batch_response_by_index():
+    async def run():
+        response = [
+            {"index": 1, "financial_data": record("second")},
+            {"index": 0, "financial_data": record("first")},
+            {"index": 7, "financial_data": record("out of range")},
+            {"index": 2, "financial_data": "not an object"},
+        ]
+        calls = []
+
+        async def generate_content(*, model, contents, config=None):
+            calls.append((contents, config))
+            return SimpleNamespace(text=json.dumps(response))
+
+        service = GeminiService()
+        service.client = SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content=generate_content)))
+        service.caller = ResilientCaller(["primary"])
+
+        results = await service.extract_financial_data_batch(["birinchi", "ikkinchi", "uchinchi"])
+
+        assert results == [record("first"), record("second"), None]
+        # One request carrying every text with its index
+        prompt, config = calls[0]
+        assert len(calls) == 1
+        assert '{"index": 2, "text": "uchinchi"}' in prompt
+        assert config.response_schema == GeminiService.BATCH_RESPONSE_SCHEMA
+
+        response.clear()
+        service.client.aio.models.generate_content = \
+            lambda **kwargs: asyncio.sleep(0, SimpleNamespace(text='{"index": 0}'))
+        with pytest.raises(ValueError):
+            await service.extract_financial_data_batch(["a", "b"])
+
+    asyncio.run(run())
@@ -0,0 +1,183 @@
+"""
+Extraction cache: TTL/LRU eviction, request coalescing, errors and the persistent tier
+"""
+import asyncio
+from datetime import date
+
+import pytest
+from tortoise import Tortoise
+
+from app.services.extraction_cache import ExtractionCache
+
+RESULT = {"type": "expense", "amount": 20000, "category": "transport", "date": "2026-10-18"}
+
+
+def counter(value=RESULT):
+    """compute() that counts its calls"""
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return value
+
+    return compute, calls
+
+
+def test_keys_include_the_date():
+    today = date(2026, 10, 18)
+    key = ExtractionCache.text_key("Taksiga  20 ming", today)
+    assert key == ExtractionCache.text_key("taksiga 20 ming", today)
+    assert key.startswith("text:2026-10-18:")
+    # "bugun" means another day tomorrow
+    assert key != ExtractionCache.text_key("taksiga 20 ming", date(2026, 10, 19))
+
+    voice = ExtractionCache.voice_key("AgAD", today)
+    assert voice == "voice:2026-10-18:AgAD"
+    # A note forwarded the next day is read again
+    assert voice != ExtractionCache.voice_key("AgAD", date(2026, 10, 19))
+    assert ExtractionCache.voice_key("AgAD") == ExtractionCache.voice_key("AgAD", date.today())
+
+
+def test_entries_expire_after_ttl():
+    async def run():
+        cache = ExtractionCache(max_entries=10, ttl=0.05)
+        compute, calls = counter()
+        assert await cache.get_or_compute("k", compute) == RESULT
+        assert await cache.get_or_compute("k", compute) == RESULT
+        assert len(calls) == 1
+
+        await asyncio.sleep(0.1)
+        assert cache.get("k") is None
+        await cache.get_or_compute("k", compute)
+        assert len(calls) == 2
+        return cache.stats()
+
+    stats = asyncio.run(run())
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ExtractionCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size"] == 2
+
+
+def test_concurrent_misses_share_one_computation():
+    async def run():
+        cache = ExtractionCache(max_entries=10, ttl=60)
+        release = asyncio.Event()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await release.wait()
+            return RESULT
+
+        waiters = [asyncio.create_task(cache.get_or_compute("k", compute)) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        release.set()
+        results = await asyncio.gather(*waiters)
+        return cache, calls, results
+
+    cache, calls, results = asyncio.run(run())
+    assert len(calls) == 1
+    assert results == [RESULT] * 5
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["hits"]) == (1, 4, 0)
+
+
+def test_waiter_computes_when_the_leader_is_cancelled():
+    async def run():
+        cache = ExtractionCache(max_entries=10, ttl=60)
+        release = asyncio.Event()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await release.wait()
+            return RESULT
+
+        leader = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0.01)
+
+        leader.cancel()
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        release.set()
+
+        assert await waiter == RESULT
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return cache, calls
+
+    cache, calls = asyncio.run(run())
+    assert len(calls) == 2
+    assert cache.get("k") == RESULT
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    async def run():
+        cache = ExtractionCache(max_entries=10, ttl=60)
+        release = asyncio.Event()
+
+        async def failing():
+            await release.wait()
+            raise ValueError("quota exceeded")
+
+        waiters = [asyncio.create_task(cache.get_or_compute("k", failing)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+
+        # Nothing was stored: the next call computes again
+        assert cache.get("k") is None
+        compute, calls = counter()
+        assert await cache.get_or_compute("k", compute) == RESULT
+        assert len(calls) == 1
+
+        with pytest.raises(ValueError):
+            await cache.get_or_compute("other", failing)
+
+    asyncio.run(run())
+
+
+def test_persistent_tier_survives_a_restart():
+    async def run():
+        from app.models import CacheEntry
+
+        await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["app.models"]})
+        await Tortoise.generate_schemas()
+        try:
+            compute, calls = counter()
+            first = ExtractionCache(max_entries=10, ttl=60, persistent=True)
+            assert await first.get_or_compute("k", compute) == RESULT
+            assert await CacheEntry.filter(key="k").count() == 1
+
+            # A new process starts with an empty memory tier
+            second = ExtractionCache(max_entries=10, ttl=60, persistent=True)
+            assert await second.get_or_compute("k", compute) == RESULT
+            assert await second.get_or_compute("k", compute) == RESULT
+            assert len(calls) == 1
+            assert second.stats()["persistent_hits"] == 1
+            assert second.stats()["hits"] == 1
+
+            # Expired rows are ignored
+            expired = ExtractionCache(max_entries=10, ttl=-1, persistent=True)
+            await expired.get_or_compute("old", compute)
+            fresh = ExtractionCache(max_entries=10, ttl=60, persistent=True)
+            await fresh.get_or_compute("old", compute)
+            assert len(calls) == 3
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
@@ -0,0 +1,91 @@
+"""
+FinancialRecord: normalization of extraction results and the shared reply renderer
+"""
+import json
+from datetime import date
+from decimal import Decimal
+
+from app.services.financial_record import FinancialRecord, format_amount, render_record
+
+TODAY = date(2025, 11, 15)
+
+
+def record(**fields) -> FinancialRecord:
+    data = {"type": "expense", "amount": 0, "category": "food", "description": "non", "date": "today"}
+    data.update(fields)
+    return FinancialRecord.from_dict(data, today=TODAY)
+
+
+def test_amounts_are_normalized():
+    assert record(amount=45000).amount == Decimal("45000.00")
+    assert record(amount=12.5).amount == Decimal("12.50")
+    assert record(amount="20 000").amount == Decimal("20000.00")
+    assert record(amount="50 ming").amount == Decimal("50000.00")
+    assert record(amount="1.5 mln").amount == Decimal("1500000.00")
+    assert record(amount=-300).amount == Decimal("300.00")
+    assert record(amount="ko'p").amount == Decimal("0.00")
+    assert record(amount=None).amount == Decimal("0.00")
+    # Too large for DECIMAL(18,2)
+    assert record(amount="1e30").amount == Decimal("0.00")
+    assert record(amount=10 ** 20).amount == Decimal("0.00")
+    assert record(amount="9999999999999999.99").amount == Decimal("9999999999999999.99")
+
+
+def test_currency_is_normalized():
+    assert record().currency == "UZS"
+    assert record(currency="usd").currency == "USD"
+    assert record(currency="so'm").currency == "UZS"
+    assert record(amount="20 dollar").currency == "USD"
+    assert record(amount="$15").currency == "USD"
+    assert record(currency="tugrik").currency == "UZS"
+
+
+def test_dates_are_resolved():
+    assert record(date="today").date == TODAY
+    assert record(date="yesterday").date == date(2025, 11, 14)
+    assert record(date="kecha").date == date(2025, 11, 14)
+    assert record(date="2025-10-01").date == date(2025, 10, 1)
+    assert record(date="2025-10-01T09:30:00").date == date(2025, 10, 1)
+    assert record(date="qachondir").date == TODAY
+    assert record(date=None).date == TODAY
+
+
+def test_type_and_category_defaults():
+    assert record(type="Income").type == "income"
+    assert record(type="kirim").type == "income"
+    assert record(type="income/expense").type == "expense"
+    assert record(category="").category == "other"
+    assert record(description="").description is None
+
+
+def test_to_json_matches_json_dumps():
+    for item in (
+        record(amount=45000, description='"Korzinka" \\ non\n'),
+        record(amount="12.5", currency="EUR", description=None),
+        record(category="oziq-ovqat", description="Bozordan meva 🍎"),
+    ):
+        assert item.to_json() == json.dumps(item.to_dict(), indent=2, ensure_ascii=False)
+
+
+def test_coerce_accepts_records_and_dicts():
+    item = record(amount=100)
+    assert FinancialRecord.coerce(item) is item
+    assert FinancialRecord.coerce({"type": "income", "amount": "5 ming"}).amount == Decimal("5000.00")
+
+
+def test_render():
+    item = record(amount=150000, description="Bozor")
+
+    text = render_record(item, transcript="Bozorga 150 ming")
+
+    assert text.startswith("📝 Transkripsiya:\nBozorga 150 ming\n\n")
+    assert f"```json\n{item.to_json()}\n```" in text
+    assert "• Miqdor: 150 000 UZS" in text
+    assert "• Sana: 2025-11-15" in text
+    assert not render_record(record(description=None)).startswith("📝")
+    assert "• Tavsif: N/A" in render_record(record(description=None))
+
+
+def test_format_amount():
+    assert format_amount(Decimal("1500000")) == "1 500 000"
+    assert format_amount(Decimal("12.5")) == "12.50"
@@ -0,0 +1,170 @@
+"""
+Gemini client pool: sliding-window quotas, routing by headroom and 429 sidelining
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+from google.genai.errors import ClientError
+
+from app.services.gemini_pool import ClientPool, _retry_delay
+from app.services.gemini_service import GeminiService
+from app.services.resilience import ResilientCaller
+from config.settings import settings
+
+FINANCIAL_JSON = json.dumps({
+    "type": "expense", "amount": 20000, "category": "transport", "description": "taksi", "date": "today",
+})
+
+
+def rate_limited(delay=None):
+    details = [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": delay}] if delay else []
+    return ClientError(429, {"error": {"code": 429, "message": "quota", "status": "RESOURCE_EXHAUSTED",
+                                       "details": details}})
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class KeyClient:
+    """Fake genai.Client for one key: raises scripted errors, reports token usage"""
+
+    def __init__(self, name: str, errors=(), tokens: int = 100):
+        self.name = name
+        self.errors = list(errors)
+        self.tokens = tokens
+        self.calls = []
+        self.aio = SimpleNamespace(models=self, files=self)
+
+    async def generate_content(self, *, model, contents, config=None):
+        self.calls.append("generate")
+        if self.errors:
+            raise self.errors.pop(0)
+        return SimpleNamespace(text=FINANCIAL_JSON, usage_metadata=SimpleNamespace(total_token_count=self.tokens))
+
+    async def upload(self, *, file, config=None):
+        self.calls.append("upload")
+        return SimpleNamespace(name=f"files/{self.name}")
+
+    async def delete(self, *, name):
+        self.calls.append(f"delete {name}")
+
+
+def make_pool(*clients, clock=None, **kwargs) -> ClientPool:
+    return ClientPool([(client.name, client) for client in clients], clock=clock or FakeClock(), **kwargs)
+
+
+def make_service(pool: ClientPool) -> GeminiService:
+    service = GeminiService()
+    service.pool = pool
+
+    async def sleep(delay):
+        pass
+
+    service.caller = ResilientCaller(["primary"], sleep=sleep, rng=lambda: 0.0)
+    return service
+
+
+def test_equal_keys_take_turns():
+    a, b, c = KeyClient("a"), KeyClient("b"), KeyClient("c")
+    pool = make_pool(a, b, c, rpm=100)
+
+    picked = [pool.acquire().name for _ in range(9)]
+
+    assert sorted(picked) == ["a"] * 3 + ["b"] * 3 + ["c"] * 3
+
+
+def test_calls_go_to_the_key_with_most_headroom():
+    clock = FakeClock()
+    a, b = KeyClient("a"), KeyClient("b")
+    pool = make_pool(a, b, clock=clock, rpm=10, tpm=1000)
+    big, small = pool.clients
+
+    # a used most of its token quota
+    big.usage.add(tokens=900)
+    assert [pool.acquire().name for _ in range(5)] == ["b"] * 5
+
+    # Once a's tokens leave the window it is preferred again over b's newer requests
+    clock.now = 30
+    for _ in range(3):
+        small.usage.add(requests=1)
+    clock.now = 61
+    assert pool.acquire().name == "a"
+
+
+def test_rate_limited_key_is_sidelined_and_call_moves_on():
+    clock = FakeClock()
+    a, b = KeyClient("a", errors=[rate_limited("17s")]), KeyClient("b")
+    pool = make_pool(a, b, clock=clock, rpm=100, cooldown=60)
+    service = make_service(pool)
+    # Start on a
+    pool._turn = len(pool.clients) - 1
+
+    async def run():
+        return await service.extract_financial_data("taksi 20000")
+
+    assert asyncio.run(run())["amount"] == 20000
+    assert a.calls == ["generate"] and b.calls == ["generate"]
+    assert pool.clients[0].throttled == 1
+    assert pool.clients[0].sidelined_until == 17
+
+    # While sidelined every call goes to b
+    for _ in range(3):
+        asyncio.run(run())
+    assert len(a.calls) == 1 and len(b.calls) == 4
+
+    clock.now = 18
+    asyncio.run(run())
+    assert len(a.calls) == 2
+    assert pool.clients[1].tokens == 400
+
+
+def test_all_keys_sidelined_uses_the_first_to_recover():
+    clock = FakeClock()
+    pool = make_pool(KeyClient("a"), KeyClient("b"), clock=clock, cooldown=60)
+    first, second = pool.clients
+    pool.report_error(first, rate_limited())
+    clock.now = 10
+    pool.report_error(second, rate_limited())
+
+    assert pool.acquire() is first
+
+
+def test_uploaded_file_stays_on_its_key(monkeypatch):
+    monkeypatch.setattr(settings, "gemini_inline_audio_max_bytes", 0)
+    monkeypatch.setattr(settings, "voice_segment_threshold", 0)
+    a, b = KeyClient("a"), KeyClient("b")
+    service = make_service(make_pool(a, b))
+
+    async def run():
+        await service.transcribe_audio(b"OggS" + b"\x00" * 100)
+        await service.wait_background_tasks()
+
+    asyncio.run(run())
+
+    calls = {client.name: client.calls for client in (a, b)}
+    uploader, other = ("a", "b") if calls["a"] else ("b", "a")
+    assert calls[uploader] == ["upload", "generate", f"delete files/{uploader}"]
+    assert calls[other] == []
+
+
+def test_retry_delay_is_read_from_details():
+    assert _retry_delay(rate_limited("30s")) == 30.0
+    assert _retry_delay(rate_limited()) is None
+    assert _retry_delay(ValueError("x")) is None
+
+
+def test_extra_credentials_are_pooled(monkeypatch):
+    monkeypatch.setattr(settings, "gemini_extra_keys", " second-key-1234 ,, vertex:my-project:europe-west1")
+
+    service = GeminiService()
+
+    assert [entry.name for entry in service.pool.clients] == [
+        f"key-…{settings.gemini_api_key[-4:]}", "key-…1234", "vertex:my-project:europe-west1",
+    ]
+    assert service.pool.clients[2].client._api_client.vertexai
@@ -0,0 +1,323 @@
+"""
+Gemini resilience: retries, circuit breakers, model fallback and hedging
+against a fake client that injects errors and delays
+"""
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+from google.genai.errors import ClientError, ServerError
+
+from app.services.gemini_service import GeminiService
+from app.services.resilience import CircuitOpenError, ResilientCaller
+
+FINANCIAL_JSON = json.dumps({
+    "type": "expense", "amount": 20000, "category": "transport",
+    "description": "taksi", "date": "today",
+})
+
+
+def server_error(code: int = 503):
+    return ServerError(code, {"error": {"message": "unavailable", "status": "UNAVAILABLE"}})
+
+
+class ScriptedModels:
+    """
+    generate_content that follows a per-model script
+
+    Each script item is an exception to raise, a float delay before
+    answering, or None to answer at once; an exhausted script answers.
+    Answers take their text from ``texts`` in order, then FINANCIAL_JSON.
+    """
+
+    def __init__(self, scripts: dict, texts=()):
+        self.scripts = {model: list(items) for model, items in scripts.items()}
+        self.texts = list(texts)
+        self.calls = []
+        self.contents = []
+
+    async def generate_content(self, *, model, contents, config=None):
+        self.calls.append(model)
+        self.contents.append(contents)
+        script = self.scripts.get(model, [])
+        step = script.pop(0) if script else None
+        if isinstance(step, BaseException):
+            raise step
+        if step:
+            await asyncio.sleep(step)
+        return SimpleNamespace(text=self.texts.pop(0) if self.texts else FINANCIAL_JSON, model=model)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_caller(models=("primary", "fallback"), **kwargs):
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    kwargs.setdefault("rng", lambda: 1.0)
+    caller = ResilientCaller(list(models), sleep=sleep, **kwargs)
+    return caller, delays
+
+
+def generate(fake: ScriptedModels):
+    return lambda model: fake.generate_content(model=model, contents="x")
+
+
+def test_transient_errors_are_retried_with_backoff():
+    async def run():
+        fake = ScriptedModels({"primary": [server_error(429), server_error(503)]})
+        caller, delays = make_caller(max_attempts=3, backoff_base=0.5, backoff_max=8)
+
+        response = await caller.call(generate(fake))
+
+        assert response.model == "primary"
+        assert fake.calls == ["primary"] * 3
+        # rng pinned to 1.0: the cap of the full-jitter window, doubling each time
+        assert delays == [0.5, 1.0]
+        assert caller.retries == 2
+
+    asyncio.run(run())
+
+
+def test_jitter_stays_within_window():
+    caller, _ = make_caller(backoff_base=1.0, backoff_max=4.0, rng=lambda: 0.25)
+    assert [caller.backoff_delay(attempt) for attempt in range(4)] == [0.25, 0.5, 1.0, 1.0]
+
+
+def test_non_retryable_error_is_raised_at_once():
+    async def run():
+        bad_request = ClientError(400, {"error": {"message": "bad", "status": "INVALID_ARGUMENT"}})
+        fake = ScriptedModels({"primary": [bad_request]})
+        caller, delays = make_caller()
+
+        with pytest.raises(ClientError):
+            await caller.call(generate(fake))
+        assert fake.calls == ["primary"]
+        assert delays == []
+
+    asyncio.run(run())
+
+
+def test_falls_back_to_next_model():
+    async def run():
+        fake = ScriptedModels({"primary": [server_error()] * 3})
+        caller, _ = make_caller(max_attempts=3)
+
+        response = await caller.call(generate(fake))
+
+        assert response.model == "fallback"
+        assert fake.calls == ["primary"] * 3 + ["fallback"]
+        assert caller.fallbacks == 1
+
+    asyncio.run(run())
+
+
+def test_missing_model_falls_back_without_retries():
+    async def run():
+        not_found = ClientError(404, {"error": {
+            "message": "models/primary is not found for API version v1beta, or is not supported "
+                       "for generateContent.",
+            "status": "NOT_FOUND",
+        }})
+        unsupported = ClientError(400, {"error": {
+            "message": "Model primary does not support this request: unsupported response_schema",
+            "status": "INVALID_ARGUMENT",
+        }})
+        for error in (not_found, unsupported):
+            fake = ScriptedModels({"primary": [error]})
+            caller, delays = make_caller(max_attempts=3)
+
+            response = await caller.call(generate(fake))
+
+            assert response.model == "fallback"
+            assert fake.calls == ["primary", "fallback"]
+            assert (delays, caller.retries, caller.fallbacks) == ([], 0, 1)
+
+        # The last model gone too: its error is raised
+        fake = ScriptedModels({"primary": [not_found], "fallback": [not_found]})
+        caller, _ = make_caller()
+        with pytest.raises(ClientError) as error:
+            await caller.call(generate(fake))
+        assert error.value.code == 404
+
+    asyncio.run(run())
+
+
+def test_all_models_failing_raises_last_error():
+    async def run():
+        fake = ScriptedModels({"primary": [server_error(503)] * 2, "fallback": [server_error(500)] * 2})
+        caller, _ = make_caller(max_attempts=2)
+
+        with pytest.raises(ServerError) as error:
+            await caller.call(generate(fake))
+        assert error.value.code == 500
+
+    asyncio.run(run())
+
+
+def test_circuit_breaker_skips_failing_model_until_reset():
+    async def run():
+        clock = FakeClock()
+        fake = ScriptedModels({"primary": [server_error()] * 4})
+        caller, _ = make_caller(max_attempts=2, breaker_threshold=2, breaker_reset=30, clock=clock)
+
+        # Two failures open the primary's breaker; the fallback answers
+        assert (await caller.call(generate(fake))).model == "fallback"
+        assert caller.breakers["primary"].state == "open"
+
+        # While open, the primary is not called at all
+        fake.calls.clear()
+        assert (await caller.call(generate(fake))).model == "fallback"
+        assert fake.calls == ["fallback"]
+
+        # After the reset timeout one trial call goes through; it fails and reopens
+        clock.now += 30
+        fake.calls.clear()
+        assert (await caller.call(generate(fake))).model == "fallback"
+        assert fake.calls == ["primary", "fallback"]
+        assert caller.breakers["primary"].state == "open"
+
+        # Next trial succeeds (script exhausted) and closes the breaker
+        clock.now += 30
+        assert (await caller.call(generate(fake))).model == "fallback"
+        clock.now += 30
+        assert (await caller.call(generate(fake))).model == "primary"
+        assert caller.breakers["primary"].state == "closed"
+
+    asyncio.run(run())
+
+
+def test_open_breakers_everywhere_raise_circuit_open():
+    async def run():
+        fake = ScriptedModels({"only": [server_error()] * 10})
+        caller, _ = make_caller(models=("only",), max_attempts=1, breaker_threshold=1, breaker_reset=60)
+
+        with pytest.raises(ServerError):
+            await caller.call(generate(fake))
+        with pytest.raises(CircuitOpenError):
+            await caller.call(generate(fake))
+
+    asyncio.run(run())
+
+
+def test_slow_call_is_hedged_on_next_model():
+    async def run():
+        fake = ScriptedModels({"primary": [1.0]})
+        caller, _ = make_caller(hedge_after=0.05)
+
+        started = time.perf_counter()
+        response = await caller.call(generate(fake))
+        elapsed = time.perf_counter() - started
+
+        assert response.model == "fallback"
+        assert elapsed < 0.5
+        assert caller.hedges == 1
+        assert fake.calls == ["primary", "fallback"]
+
+    asyncio.run(run())
+
+
+def test_fast_call_is_not_hedged():
+    async def run():
+        fake = ScriptedModels({})
+        caller, _ = make_caller(hedge_after=0.5)
+
+        assert (await caller.call(generate(fake))).model == "primary"
+        assert caller.hedges == 0
+        assert fake.calls == ["primary"]
+
+    asyncio.run(run())
+
+
+def test_service_survives_rate_limit():
+    async def run():
+        service = GeminiService()
+        fake = ScriptedModels({"primary": [server_error(429)]})
+        service.client = SimpleNamespace(aio=SimpleNamespace(models=fake))
+        service.caller, _ = make_caller()
+
+        data = await service.extract_financial_data("taksiga 20 ming")
+
+        assert data["amount"] == 20000
+        assert fake.calls == ["primary", "primary"]
+
+    asyncio.run(run())
+
+
+def test_cancelled_caller_cancels_every_attempt():
+    async def run():
+        caller, _ = make_caller(hedge_after=0.05)
+        started, cancelled = [], []
+
+        async def slow(model):
+            started.append(model)
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(model)
+                raise
+
+        # Cancelled while waiting for the primary (before hedging)
+        call = asyncio.create_task(caller.call(slow))
+        await asyncio.sleep(0.01)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        await asyncio.sleep(0)
+        assert (started, cancelled) == (["primary"], ["primary"])
+
+        # Cancelled after the hedge started
+        started.clear()
+        cancelled.clear()
+        call = asyncio.create_task(caller.call(slow))
+        await asyncio.sleep(0.1)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        await asyncio.sleep(0)
+        assert started == ["primary", "fallback"]
+        assert sorted(cancelled) == ["fallback", "primary"]
+
+    asyncio.run(run())
+
+
+def test_streaming_transcription_is_not_hedged():
+    class SlowStream:
+        def __init__(self):
+            self.streams = []
+
+        async def generate_content_stream(self, *, model, contents, config=None):
+            self.streams.append(model)
+
+            async def chunks():
+                for word in ("bozorga", " 45", " ming"):
+                    await asyncio.sleep(0.05)
+                    yield SimpleNamespace(text=word)
+
+            return chunks()
+
+    async def run():
+        service = GeminiService()
+        models = SlowStream()
+        service.client = SimpleNamespace(aio=SimpleNamespace(models=models))
+        service.caller, _ = make_caller(hedge_after=0.01)
+        partials = []
+
+        text = await service.transcribe_audio_stream(b"OggS" + b"\x00" * 100, partials.append)
+
+        assert text == "bozorga 45 ming"
+        assert models.streams == ["primary"]
+        assert service.caller.hedges == 0
+        assert partials == ["bozorga", "bozorga 45", "bozorga 45 ming"]
+
+    asyncio.run(run())
@@ -0,0 +1,206 @@
+"""
+Gemini service: inline vs uploaded audio, background cleanup of uploads and
+the single-call voice pipeline with its two-step fallback
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from google.genai.errors import ClientError, ServerError
+
+from app.services.gemini_service import GeminiService
+from config.settings import settings
+from tests.test_gemini_resilience import ScriptedModels, make_caller, server_error
+
+INLINE_MAX = 1000
+VOICE_NOTE = b"\x01" * 100
+RECORD = {"type": "expense", "amount": 20000, "category": "transport", "description": "taksi", "date": "today"}
+
+
+class ScriptedFiles:
+    """Files API that records uploads and holds deletions until released"""
+
+    def __init__(self, events: list):
+        self.events = events
+        self.release = asyncio.Event()
+        self.deleted = []
+
+    async def upload(self, *, file, config=None):
+        self.events.append(f"upload {len(file.getvalue())}")
+        return SimpleNamespace(name="files/voice")
+
+    async def delete(self, *, name):
+        await self.release.wait()
+        self.events.append(f"delete {name}")
+        self.deleted.append(name)
+
+
+class RecordingModels(ScriptedModels):
+    def __init__(self, events: list, scripts=None, texts=()):
+        super().__init__(scripts or {}, texts)
+        self.events = events
+
+    async def generate_content(self, *, model, contents, config=None):
+        self.events.append("generate")
+        return await super().generate_content(model=model, contents=contents, config=config)
+
+
+def make_service(scripts=None, texts=()):
+    events = []
+    models = RecordingModels(events, scripts, texts)
+    files = ScriptedFiles(events)
+    service = GeminiService()
+    service.client = SimpleNamespace(aio=SimpleNamespace(models=models, files=files))
+    service.caller, _ = make_caller()
+    return service, models, files, events
+
+
+@pytest.fixture(autouse=True)
+def inline_limit(monkeypatch):
+    monkeypatch.setattr(settings, "gemini_inline_audio_max_bytes", INLINE_MAX)
+
+
+def test_audio_up_to_the_limit_is_sent_inline():
+    async def run():
+        service, _, _, events = make_service()
+
+        part, uploaded_name, pinned = await service._audio_part(memoryview(b"\x01" * INLINE_MAX))
+
+        assert part.inline_data.data == b"\x01" * INLINE_MAX
+        assert part.inline_data.mime_type == GeminiService.AUDIO_MIME_TYPE
+        assert (uploaded_name, pinned) == (None, None)
+        assert events == []
+
+    asyncio.run(run())
+
+
+def test_audio_over_the_limit_is_uploaded():
+    async def run():
+        service, _, _, events = make_service()
+
+        part, uploaded_name, pinned = await service._audio_part(b"\x01" * (INLINE_MAX + 1))
+
+        assert part.name == uploaded_name == "files/voice"
+        assert pinned is service.pool.clients[0]
+        assert events == [f"upload {INLINE_MAX + 1}"]
+
+    asyncio.run(run())
+
+
+def test_uploaded_file_is_deleted_in_background_after_the_call():
+    async def run():
+        service, models, files, events = make_service()
+
+        text = await service.transcribe_audio(b"\x01" * (INLINE_MAX + 1))
+
+        # The reply does not wait for the deletion
+        assert text
+        assert models.contents[0][1].name == "files/voice"
+        assert files.deleted == []
+        assert len(service._background_tasks) == 1
+
+        files.release.set()
+        await service.wait_background_tasks()
+        assert events == [f"upload {INLINE_MAX + 1}", "generate", "delete files/voice"]
+        assert not service._background_tasks
+
+    asyncio.run(run())
+
+
+def test_uploaded_file_is_deleted_when_the_call_fails():
+    async def run():
+        bad_request = ClientError(400, {"error": {"message": "bad", "status": "INVALID_ARGUMENT"}})
+        service, _, files, events = make_service({"primary": [bad_request]})
+        files.release.set()
+
+        with pytest.raises(ClientError):
+            await service.transcribe_audio(b"\x01" * (INLINE_MAX + 1))
+
+        await service.wait_background_tasks()
+        assert events == [f"upload {INLINE_MAX + 1}", "generate", "delete files/voice"]
+
+    asyncio.run(run())
+
+
+def test_inline_audio_leaves_nothing_to_delete():
+    async def run():
+        service, _, _, events = make_service()
+
+        await service.transcribe_audio(b"\x01" * INLINE_MAX)
+
+        assert not service._background_tasks
+        assert events == ["generate"]
+
+    asyncio.run(run())
+
+
+def test_voice_note_is_processed_in_one_call(monkeypatch):
+    monkeypatch.setattr(settings, "gemini_single_call_voice", True)
+
+    async def run():
+        combined = json.dumps({"transcript": " taksiga 20 ming ", "financial_data": RECORD})
+        service, models, _, _ = make_service(texts=[combined])
+
+        text, data = await service.process_voice_message(VOICE_NOTE)
+
+        assert (text, data) == ("taksiga 20 ming", RECORD)
+        assert models.calls == ["primary"]
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("combined", [
+    "taksiga 20 ming",
+    json.dumps({"financial_data": RECORD}),
+    json.dumps({"transcript": "taksiga 20 ming"}),
+    json.dumps({"transcript": "taksiga 20 ming", "financial_data": [RECORD]}),
+])
+def test_bad_combined_response_falls_back_to_two_steps(monkeypatch, combined):
+    monkeypatch.setattr(settings, "gemini_single_call_voice", True)
+
+    async def run():
+        service, models, _, _ = make_service(texts=[combined])
+        with pytest.raises((ValueError, KeyError)):
+            await service.transcribe_and_extract(VOICE_NOTE)
+
+        # Combined call, then transcription, then extraction (FINANCIAL_JSON)
+        service, models, _, _ = make_service(texts=[combined, " taksiga 20 ming "])
+
+        text, data = await service.process_voice_message(VOICE_NOTE)
+
+        assert (text, data) == ("taksiga 20 ming", RECORD)
+        assert models.calls == ["primary"] * 3
+        assert "Text: taksiga 20 ming" in models.contents[2]
+
+    asyncio.run(run())
+
+
+def test_failed_single_call_falls_back_to_two_steps(monkeypatch):
+    monkeypatch.setattr(settings, "gemini_single_call_voice", True)
+
+    async def run():
+        bad_request = ClientError(400, {"error": {"message": "bad", "status": "INVALID_ARGUMENT"}})
+        service, models, _, _ = make_service({"primary": [bad_request]}, texts=["taksiga 20 ming"])
+
+        text, data = await service.process_voice_message(VOICE_NOTE)
+
+        assert (text, data) == ("taksiga 20 ming", RECORD)
+        assert models.calls == ["primary"] * 3
+
+    asyncio.run(run())
+
+
+def test_outage_is_not_retried_through_the_two_step_path(monkeypatch):
+    monkeypatch.setattr(settings, "gemini_single_call_voice", True)
+
+    async def run():
+        service, models, _, _ = make_service({"primary": [server_error()] * 3, "fallback": [server_error()] * 3})
+
+        with pytest.raises(ServerError):
+            await service.process_voice_message(VOICE_NOTE)
+
+        # One round of retries and fallback, no transcription or extraction after it
+        assert models.calls == ["primary"] * 3 + ["fallback"] * 3
+
+    asyncio.run(run())
@@ -0,0 +1,392 @@
+"""
+Durable job queue: claiming, retries with backoff, lease expiry, fencing and drain
+
+Most tests run on in-memory SQLite; the concurrent claim test needs
+PostgreSQL (SKIP LOCKED) and is skipped without it.
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+from tortoise import Tortoise
+
+from app.handlers import voice
+from app.models import QueuedJob
+from app.services.financial_record import FinancialRecord
+from app.services.job_queue import DurableJobQueue, PermanentJobError
+from config.settings import settings
+from tests.test_database import init_postgres, requires_postgres
+
+BOT = object()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_queue(clock=None, worker_id="worker-a", **kwargs) -> DurableJobQueue:
+    options = dict(concurrency=4, visibility_timeout=60, max_attempts=3, poll_interval=0.01, backoff_base=5)
+    options.update(kwargs)
+    return DurableJobQueue(worker_id=worker_id, clock=clock or FakeClock(), **options)
+
+
+async def init_sqlite() -> None:
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["app.models"]})
+    await Tortoise.generate_schemas()
+
+
+def test_enqueue_claim_and_complete():
+    async def run():
+        await init_sqlite()
+        try:
+            queue = make_queue()
+            seen = []
+
+            async def handler(bot, user_id, payload):
+                seen.append((bot, user_id, payload))
+
+            queue.register("text", handler)
+            first = await queue.enqueue("text", 42, {"text": "taksi 20000", "chat_id": 7})
+            second = await queue.enqueue("text", 43, {"text": "non 5000"})
+
+            jobs = await queue.claim(10)
+            assert [job.id for job in jobs] == [first, second]
+            assert jobs[0].payload == {"text": "taksi 20000", "chat_id": 7}
+            assert jobs[0].attempts == 1
+            # Leased jobs are not handed out again
+            assert await queue.claim(10) == []
+
+            assert await queue.run_job(BOT, jobs[0]) == "done"
+            assert seen == [(BOT, 42, {"text": "taksi 20000", "chat_id": 7})]
+            assert await QueuedJob.filter(id=first).exists() is False
+            assert queue.stats() == {"enqueued": 2, "completed": 1, "retried": 0, "dead": 0}
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+def test_failed_job_is_retried_with_backoff_then_dead_lettered():
+    async def run():
+        await init_sqlite()
+        try:
+            clock = FakeClock()
+            queue = make_queue(clock)
+            dead = []
+
+            async def handler(bot, user_id, payload):
+                raise RuntimeError("Gemini is down")
+
+            async def on_dead(bot, user_id, payload, error):
+                dead.append((user_id, payload, error))
+
+            queue.register("voice", handler, on_dead)
+            job_id = await queue.enqueue("voice", 42, {"file_id": "f"})
+
+            [job] = await queue.claim(1)
+            assert await queue.run_job(BOT, job) == "queued"
+            # Not due before the backoff (5 s, then 10 s)
+            assert await queue.claim(1) == []
+            clock.now += 5
+            [job] = await queue.claim(1)
+            assert await queue.run_job(BOT, job) == "queued"
+            clock.now += 9
+            assert await queue.claim(1) == []
+            clock.now += 1
+            [job] = await queue.claim(1)
+            assert job.attempts == 3
+            assert await queue.run_job(BOT, job) == "dead"
+
+            stored = await QueuedJob.get(id=job_id)
+            assert stored.status == "dead"
+            assert stored.last_error == "RuntimeError: Gemini is down"
+            assert dead == [(42, {"file_id": "f"}, "Gemini is down")]
+            clock.now += 1000
+            assert await queue.claim(1) == []
+            assert queue.retried == 2 and queue.dead == 1
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+def test_permanent_error_skips_retries():
+    async def run():
+        await init_sqlite()
+        try:
+            queue = make_queue()
+
+            async def handler(bot, user_id, payload):
+                raise PermanentJobError("file is gone")
+
+            queue.register("voice", handler)
+            job_id = await queue.enqueue("voice", 42, {})
+            await queue.enqueue("unknown", 42, {})
+
+            first, second = await queue.claim(2)
+            assert await queue.run_job(BOT, first) == "dead"
+            assert await queue.run_job(BOT, second) == "dead"
+            assert (await QueuedJob.get(id=job_id)).attempts == 1
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+def test_expired_lease_is_reclaimed_and_stale_worker_is_fenced_off():
+    async def run():
+        await init_sqlite()
+        try:
+            clock = FakeClock()
+            crashed = make_queue(clock, worker_id="worker-a")
+            healthy = make_queue(clock, worker_id="worker-b")
+            job_id = await crashed.enqueue("text", 42, {"text": "x"})
+
+            [stale] = await crashed.claim(1)
+            clock.now += 59
+            assert await healthy.claim(1) == []
+            clock.now += 2
+            [job] = await healthy.claim(1)
+            assert job.id == job_id and job.attempts == 2
+
+            # The first worker comes back: it no longer owns the job
+            assert await crashed.complete(stale) is False
+            assert await crashed.extend(stale) is False
+            assert await QueuedJob.filter(id=job_id).exists()
+            assert await healthy.complete(job) is True
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+def test_job_lost_on_its_last_attempt_is_dead_lettered():
+    async def run():
+        await init_sqlite()
+        try:
+            clock = FakeClock()
+            queue = make_queue(clock, max_attempts=1)
+            calls = []
+
+            async def handler(bot, user_id, payload):
+                calls.append(payload)
+
+            queue.register("text", handler)
+            await queue.enqueue("text", 42, {})
+            await queue.claim(1)
+            clock.now += 61
+
+            [job] = await queue.claim(1)
+            assert await queue.run_job(BOT, job) == "dead"
+            assert calls == []
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+def test_workers_run_jobs_and_drain_puts_unfinished_back():
+    async def run():
+        await init_sqlite()
+        try:
+            queue = make_queue(concurrency=2)
+            done = []
+            release = asyncio.Event()
+
+            async def quick(bot, user_id, payload):
+                done.append(payload["n"])
+
+            async def slow(bot, user_id, payload):
+                await release.wait()
+
+            queue.register("quick", quick)
+            queue.register("slow", slow)
+            queue.start(BOT)
+            for n in range(5):
+                await queue.enqueue("quick", 42, {"n": n})
+            for _ in range(50):
+                if len(done) == 5:
+                    break
+                await asyncio.sleep(0.01)
+            assert sorted(done) == [0, 1, 2, 3, 4]
+
+            slow_id = await queue.enqueue("slow", 42, {})
+            for _ in range(50):
+                if queue.running:
+                    break
+                await asyncio.sleep(0.01)
+            assert queue.running == 1
+
+            await queue.drain(timeout=0.05)
+            stored = await QueuedJob.get(id=slow_id)
+            assert (stored.status, stored.attempts, stored.locked_by) == ("queued", 0, None)
+            assert queue.running == 0
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+def test_enqueue_during_a_claim_wakes_the_poller():
+    async def run():
+        await init_sqlite()
+        try:
+            queue = make_queue(poll_interval=30)
+            done = asyncio.Event()
+            claims = []
+
+            async def handler(bot, user_id, payload):
+                done.set()
+
+            async def claim(limit):
+                jobs = await DurableJobQueue.claim(queue, limit)
+                if not claims:
+                    # Arrives after the claim's SELECT saw an empty queue
+                    await queue.enqueue("text", 42, {})
+                claims.append(len(jobs))
+                return jobs
+
+            queue.register("text", handler)
+            queue.claim = claim
+            queue.start(BOT)
+            # Picked up at once, not after poll_interval
+            await asyncio.wait_for(done.wait(), 1)
+            assert claims[:2] == [0, 1]
+            await queue.drain(timeout=1)
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+@requires_postgres
+def test_concurrent_workers_never_claim_the_same_job():
+    async def run():
+        await init_postgres(minsize=1, maxsize=10)
+        try:
+            await Tortoise.generate_schemas(safe=True)
+            await QueuedJob.filter(kind="test-claim").delete()
+            producer = make_queue(worker_id="producer")
+            for n in range(200):
+                await producer.enqueue("test-claim", 42, {"n": n})
+
+            workers = [make_queue(worker_id=f"worker-{n}") for n in range(4)]
+
+            async def claim_all(queue):
+                claimed = []
+                while True:
+                    jobs = [job for job in await queue.claim(7) if job.kind == "test-claim"]
+                    if not jobs:
+                        return claimed
+                    claimed.extend(job.id for job in jobs)
+
+            results = await asyncio.gather(*(claim_all(queue) for queue in workers for _ in range(2)))
+            claimed = [job_id for ids in results for job_id in ids]
+            assert len(claimed) == 200
+            assert len(set(claimed)) == 200
+        finally:
+            await QueuedJob.filter(kind="test-claim").delete()
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+@requires_postgres
+def test_leases_follow_the_database_clock():
+    async def run():
+        await init_postgres()
+        try:
+            await Tortoise.generate_schemas(safe=True)
+            await QueuedJob.filter(kind="test-clock").delete()
+            # Worker clocks far apart (and far from the database's) do not matter
+            behind = make_queue(FakeClock(), worker_id="behind")
+            ahead_clock = FakeClock()
+            ahead_clock.now = time.time() + 10 * 60
+            ahead = make_queue(ahead_clock, worker_id="ahead")
+
+            job_id = await behind.enqueue("test-clock", 42, {})
+            claimed = [job for job in await behind.claim(100) if job.kind == "test-clock"]
+            assert [job.id for job in claimed] == [job_id]
+            stored = await QueuedJob.get(id=job_id)
+            assert abs(stored.available_at - (time.time() + 60)) < 5
+
+            # The skewed worker does not see the lease as run out
+            assert [job for job in await ahead.claim(100) if job.kind == "test-clock"] == []
+        finally:
+            await QueuedJob.filter(kind="test-clock").delete()
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+def test_text_handler_enqueues_and_job_edits_the_answer(monkeypatch):
+    class Message:
+        def __init__(self, text):
+            self.text = text
+            self.from_user = SimpleNamespace(id=42)
+            self.chat = SimpleNamespace(id=7)
+            self.sent = []
+
+        async def answer(self, text, **kwargs):
+            self.sent.append(text)
+            return SimpleNamespace(message_id=len(self.sent))
+
+    class Bot:
+        edits = []
+
+        async def edit_message_text(self, text, chat_id, message_id, parse_mode=None):
+            self.edits.append((chat_id, message_id, text))
+
+    class Buffer:
+        added = []
+        failures = 1
+
+        async def save(self, telegram_id, record, source, transcript=None):
+            # First write fails: the job must fail with it, not finish
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("database is down")
+            self.added.append((telegram_id, record, source))
+
+    async def extract(text):
+        return {"type": "expense", "amount": 20000, "category": "transport", "description": "taksi", "date": "today"}
+
+    monkeypatch.setattr(settings, "job_queue_backend", "database")
+    monkeypatch.setattr(settings, "local_parser_enabled", False)
+    monkeypatch.setattr(voice, "transaction_buffer", Buffer())
+    monkeypatch.setattr(voice.extraction_batcher, "extract", extract)
+    clock = FakeClock()
+    queue = make_queue(clock)
+    monkeypatch.setattr(voice, "job_queue", queue)
+    queue.register("text", voice.run_text_job)
+
+    async def run():
+        await init_sqlite()
+        try:
+            message = Message("taksiga yigirma ming")
+            await voice.handle_text(message)
+            assert message.sent == ["📝 Matn tahlil qilinmoqda..."]
+
+            [job] = await queue.claim(1)
+            assert job.payload == {"chat_id": 7, "message_id": 1, "text": "taksiga yigirma ming"}
+            assert await queue.run_job(Bot(), job) == "queued"
+            assert Bot.edits == []
+
+            clock.now += 60
+            [job] = await queue.claim(1)
+            assert await queue.run_job(Bot(), job) == "done"
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+    [(user_id, record, source)] = Buffer.added
+    assert (user_id, source) == (42, "text")
+    assert isinstance(record, FinancialRecord) and record.amount == 20000
+    [(chat_id, message_id, text)] = Bot.edits
+    assert (chat_id, message_id) == (7, 1)
+    assert "20" in text
@@ -0,0 +1,50 @@
+"""
+Lazy Gemini service: no google.genai import until the service is first used
+"""
+import os
+import subprocess
+import sys
+
+from app.services import gemini_provider
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(code: str) -> str:
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, env=os.environ.copy(),
+        capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    return result.stdout.strip()
+
+
+def test_importing_the_app_does_not_load_the_sdk():
+    output = run_python(
+        "import sys, main\n"
+        "from app.handlers import setup_routers\n"
+        "setup_routers()\n"
+        "print('google.genai' in sys.modules)"
+    )
+    assert output == "False"
+
+
+def test_sdk_is_loaded_on_first_use():
+    output = run_python(
+        "import sys\n"
+        "from app.services import get_gemini_service\n"
+        "assert get_gemini_service(create=False) is None\n"
+        "service = get_gemini_service()\n"
+        "assert get_gemini_service() is service\n"
+        "print('google.genai' in sys.modules)"
+    )
+    assert output == "True"
+
+
+def test_injected_service_is_returned(monkeypatch):
+    service = object()
+    monkeypatch.setattr(gemini_provider, "_service", None)
+    assert gemini_provider.get_gemini_service(create=False) is None
+
+    gemini_provider.set_gemini_service(service)
+    assert gemini_provider.get_gemini_service() is service
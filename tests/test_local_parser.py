@@ -0,0 +1,65 @@
+"""
+Local parser: whole-word category matching, negations and the benchmark corpus
+"""
+from datetime import date
+
+import pytest
+
+from app.services.local_parser import LocalFinancialParser
+from benchmarks.bench_local_parser import CORPUS, TODAY
+
+parser = LocalFinancialParser()
+
+
+def parse(text: str):
+    return parser.try_parse(text, TODAY)
+
+
+@pytest.mark.parametrize("text, category", [
+    ("taksiga 20000 so'm", "transport"),
+    ("kvartira ijarasiga 3 mln so'm", "housing"),
+    ("kommunal to'lovlar 400 ming so'm", "utilities"),
+    ("bozorlik 350 ming so'm", "food"),
+    ("tushlikka 45000 so'm", "food"),
+    ("gaz uchun 45 ming so'm to'ladim", "utilities"),
+    ("suvga 30 ming so'm", "utilities"),
+])
+def test_keywords_match_with_uzbek_suffixes(text, category):
+    assert parse(text)["category"] == category
+
+
+@pytest.mark.parametrize("text", [
+    "gazeta 5000 so'm",
+    "suvenir 20000 so'm",
+    "nonvoy 10000 so'm",
+])
+def test_keyword_prefixes_of_other_words_do_not_match(text):
+    data, _ = parser.parse(text, TODAY)
+    assert data["category"] == "other"
+    assert parse(text) is None
+
+
+@pytest.mark.parametrize("text", [
+    "taksiga 20000 so'm bermadim",
+    "ijara uchun 3 mln to'lamadim",
+    "maosh 5 mln tushmadi",
+    "kafega 50 ming sarflamaganman",
+    "bu taksi 20000 emas",
+])
+def test_negations_are_left_to_gemini(text):
+    assert parser.parse(text, TODAY) == (None, 0.0)
+
+
+def test_relative_dates_use_the_given_day():
+    assert parse("kecha benzinga 1.5 mln so'm ketdi")["date"] == "2026-10-17"
+    assert parser.try_parse("kecha benzinga 1.5 mln so'm ketdi", date(2026, 1, 1))["date"] == "2025-12-31"
+
+
+def test_benchmark_corpus():
+    for text, expected in CORPUS:
+        data = parse(text)
+        if expected is None:
+            assert data is None, text
+        else:
+            assert data is not None, text
+            assert {key: data[key] for key in expected} == expected, text
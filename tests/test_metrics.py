@@ -0,0 +1,133 @@
+"""
+Metrics: Prometheus rendering, handler/Gemini/DB instrumentation, HTTP endpoint
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message, Update
+from aiohttp.test_utils import TestClient, TestServer
+from tortoise import Tortoise
+
+from app import metrics
+from app.middlewares import MetricsMiddleware
+
+
+def sample(name: str, **labels) -> float:
+    """Value of one sample line in the rendered output"""
+    suffix = ""
+    if labels:
+        suffix = "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+    for line in metrics.render().splitlines():
+        if line.startswith(f"{name}{suffix} "):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{name}{suffix} not found")
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("test_latency_seconds", "Test", ["op"], buckets=(0.1, 1.0))
+    try:
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.labels("a").observe(value)
+
+        assert sample("test_latency_seconds_bucket", op="a", le="0.1") == 2
+        assert sample("test_latency_seconds_bucket", op="a", le="1") == 3
+        assert sample("test_latency_seconds_bucket", op="a", le="+Inf") == 4
+        assert sample("test_latency_seconds_count", op="a") == 4
+        assert sample("test_latency_seconds_sum", op="a") == 3.65
+        assert "# TYPE test_latency_seconds histogram" in metrics.render()
+    finally:
+        metrics.REGISTRY.remove(histogram)
+
+
+def test_usage_metadata_tokens_are_counted():
+    before = dict(metrics.GEMINI_TOKENS._children)
+    response = SimpleNamespace(usage_metadata=SimpleNamespace(
+        prompt_token_count=120, candidates_token_count=30, thoughts_token_count=None, total_token_count=150,
+    ))
+    metrics.record_usage("test-model", response)
+    metrics.record_usage("test-model", SimpleNamespace(usage_metadata=None))
+
+    assert sample("finance_bot_gemini_tokens_total", model="test-model", kind="prompt") == 120
+    assert sample("finance_bot_gemini_tokens_total", model="test-model", kind="total") == 150
+    assert ("test-model", "thoughts") not in metrics.GEMINI_TOKENS._children
+    metrics.GEMINI_TOKENS._children = before
+
+
+def test_timed_counts_errors():
+    try:
+        with metrics.timed("test_op"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+    with metrics.timed("test_op"):
+        pass
+
+    assert sample("finance_bot_gemini_seconds_count", operation="test_op") == 2
+    assert sample("finance_bot_gemini_errors_total", operation="test_op") == 1
+
+
+def test_handler_latency_middleware():
+    async def run():
+        router = Router()
+        router.message.middleware(MetricsMiddleware())
+
+        @router.message()
+        async def slow_test_handler(message: Message):
+            await asyncio.sleep(0.02)
+
+        dp = Dispatcher()
+        dp.include_router(router)
+        bot = Bot(token="123456:TEST")
+        update = Update.model_validate({
+            "update_id": 1,
+            "message": {
+                "message_id": 1, "date": int(time.time()), "text": "hi",
+                "chat": {"id": 1, "type": "private"},
+                "from": {"id": 1, "is_bot": False, "first_name": "Test"},
+            },
+        })
+        await dp.feed_update(bot, update)
+        await bot.session.close()
+
+    asyncio.run(run())
+    assert sample("finance_bot_handler_seconds_count", handler="slow_test_handler") == 1
+    assert sample("finance_bot_handler_seconds_bucket", handler="slow_test_handler", le="0.01") == 0
+    assert sample("finance_bot_handler_seconds_sum", handler="slow_test_handler") >= 0.02
+
+
+def test_database_queries_are_timed():
+    async def run():
+        await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["app.models"]})
+        try:
+            await Tortoise.generate_schemas()
+            metrics.instrument_connection(Tortoise.get_connection("default"))
+            # Instrumenting twice must not double count
+            metrics.instrument_connection(Tortoise.get_connection("default"))
+
+            from app.models import User
+
+            before = metrics.DB_QUERY_SECONDS.labels("select").count
+            await User.filter(telegram_id=1).first()
+            assert metrics.DB_QUERY_SECONDS.labels("select").count == before + 1
+
+            await User.create(telegram_id=1)
+            assert metrics.DB_QUERY_SECONDS.labels("insert").count >= 1
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+def test_metrics_endpoint():
+    async def run():
+        async with TestClient(TestServer(metrics.create_metrics_app())) as client:
+            response = await client.get("/metrics")
+            assert response.status == 200
+            assert response.headers["Content-Type"].startswith("text/plain")
+            body = await response.text()
+        assert "# TYPE finance_bot_handler_seconds histogram" in body
+        assert "\nfinance_bot_throttled_total " in body
+
+    asyncio.run(run())
@@ -0,0 +1,168 @@
+"""
+Processing queue: bounded workers, round-robin fairness, backpressure
+"""
+import asyncio
+
+import pytest
+
+from app.services.processing_queue import ProcessingQueue, QueueFullError
+
+
+def test_users_take_turns():
+    async def run():
+        queue = ProcessingQueue(workers=1, max_size=100, max_per_user=100)
+        order = []
+        gate = asyncio.Event()
+
+        def work(label):
+            async def job():
+                await gate.wait()
+                order.append(label)
+            return job
+
+        # A floods the queue before B sends one message
+        jobs = [queue.submit(1, work(f"a{i}")) for i in range(4)]
+        jobs.append(queue.submit(2, work("b0")))
+        gate.set()
+        await asyncio.gather(*jobs)
+        await queue.close()
+
+        # a0 was already picked up by the worker; b0 goes right after it
+        assert order == ["a0", "b0", "a1", "a2", "a3"]
+
+    asyncio.run(run())
+
+
+def test_worker_pool_is_bounded():
+    async def run():
+        queue = ProcessingQueue(workers=3, max_size=100, max_per_user=100)
+        running = 0
+        peak = 0
+
+        async def job():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return "ok"
+
+        results = await asyncio.gather(*(queue.submit(user % 5, job) for user in range(20)))
+        await queue.close()
+
+        assert results == ["ok"] * 20
+        assert peak == 3
+        stats = queue.stats()
+        assert stats["completed"] == 20
+        assert stats["depth"] == 0
+        assert stats["max_depth"] > 0
+        assert stats["wait_max"] >= stats["wait_avg"] > 0
+
+    asyncio.run(run())
+
+
+def test_queue_full_and_per_user_limit():
+    async def run():
+        queue = ProcessingQueue(workers=1, max_size=3, max_per_user=2)
+        gate = asyncio.Event()
+
+        async def job():
+            await gate.wait()
+
+        first = queue.submit(1, job)
+        await asyncio.sleep(0)  # worker takes the first job
+        queued = [queue.submit(1, job), queue.submit(1, job)]
+
+        with pytest.raises(QueueFullError):
+            queue.submit(1, job)  # user limit
+
+        queued.append(queue.submit(2, job))
+        with pytest.raises(QueueFullError):
+            queue.submit(3, job)  # total limit
+
+        assert queue.stats()["rejected"] == 2
+        gate.set()
+        await asyncio.gather(first, *queued)
+        await queue.close()
+
+    asyncio.run(run())
+
+
+def test_position_and_errors():
+    async def run():
+        queue = ProcessingQueue(workers=1, max_size=10, max_per_user=10)
+        gate = asyncio.Event()
+
+        async def job():
+            await gate.wait()
+
+        async def failing():
+            raise ValueError("boom")
+
+        first = queue.submit(1, job)
+        assert first.position == 0
+        await asyncio.sleep(0)
+
+        assert queue.submit(1, job).position == 0
+        assert queue.submit(1, job).position == 1
+        # Another user's first job only waits for user 1's next one
+        assert queue.submit(2, job).position == 1
+
+        bad = queue.submit(3, failing)
+        gate.set()
+        with pytest.raises(ValueError):
+            await bad
+        await queue.close()
+
+    asyncio.run(run())
+
+
+def test_cancelled_error_inside_a_job_keeps_the_worker():
+    async def run():
+        queue = ProcessingQueue(workers=1, max_size=10, max_per_user=10)
+        leader = asyncio.get_running_loop().create_future()
+
+        async def coalesced():
+            # Waits on another request that gets cancelled
+            await leader
+
+        async def job():
+            return "ok"
+
+        waiter = queue.submit(1, coalesced)
+        [worker] = queue._tasks
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await asyncio.sleep(0)
+        assert not worker.done()
+
+        assert await queue.submit(2, job) == "ok"
+        assert queue._tasks == [worker]
+        assert queue.stats()["completed"] == 2
+        await queue.close()
+
+    asyncio.run(run())
+
+
+def test_dead_workers_are_restarted():
+    async def run():
+        queue = ProcessingQueue(workers=2, max_size=10, max_per_user=10)
+
+        async def job():
+            return "ok"
+
+        assert await queue.submit(1, job) == "ok"
+        dead = queue._tasks[1]
+        dead.cancel()
+        await asyncio.sleep(0)
+        assert dead.done()
+
+        results = await asyncio.gather(*(queue.submit(user, job) for user in range(4)))
+        assert results == ["ok"] * 4
+        assert queue._tasks[1] is not dead
+        assert not any(task.done() for task in queue._tasks)
+        await queue.close()
+
+    asyncio.run(run())
@@ -0,0 +1,141 @@
+"""
+Rollups: incremental updates match a full recomputation (in-memory SQLite)
+"""
+import asyncio
+from datetime import date, timedelta
+from decimal import Decimal
+
+from tortoise import Tortoise
+
+from app.handlers.report import _format_report
+from app.services.rollups import RollupService
+from app.services.transaction_buffer import TransactionBuffer
+
+TODAY = date(2026, 10, 14)  # Wednesday
+
+
+async def init_db():
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["app.models"]})
+    await Tortoise.generate_schemas()
+
+
+def record(buffer: TransactionBuffer, telegram_id: int, tx_type: str, amount, category: str, day: date):
+    buffer.add(
+        telegram_id,
+        {"type": tx_type, "amount": amount, "category": category, "date": day.isoformat()},
+        source="text",
+    )
+
+
+async def user_id(telegram_id: int) -> int:
+    from app.models import User
+
+    return (await User.get(telegram_id=telegram_id)).id
+
+
+def test_report_totals_by_period():
+    async def run():
+        await init_db()
+        try:
+            buffer = TransactionBuffer(max_size=100, flush_interval=60)
+            service = RollupService()
+            record(buffer, 1, "expense", 20000, "food", TODAY)
+            record(buffer, 1, "expense", "30000", "food", TODAY)
+            record(buffer, 1, "expense", 12.5, "transport", TODAY - timedelta(days=1))
+            record(buffer, 1, "income", 500000, "salary", TODAY - timedelta(days=10))
+            record(buffer, 2, "expense", 99, "food", TODAY)
+            await buffer.flush()
+            # Second flush adds to existing buckets
+            record(buffer, 1, "expense", 5000, "food", TODAY)
+            await buffer.flush()
+
+            uid = await user_id(1)
+            day = await service.report(uid, "day", TODAY)
+            assert [(r["category"], r["total"], r["count"]) for r in day] == [
+                ("food", Decimal("55000.00"), 3),
+            ]
+
+            week = {(r["type"], r["category"]): r["total"] for r in await service.report(uid, "week", TODAY)}
+            assert week == {("expense", "food"): Decimal("55000.00"), ("expense", "transport"): Decimal("12.50")}
+
+            month = {(r["type"], r["category"]): r["total"] for r in await service.report(uid, "month", TODAY)}
+            assert month[("income", "salary")] == Decimal("500000.00")
+            assert len(month) == 3
+
+            assert await service.check() == []
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+def test_check_detects_drift_and_rebuild_fixes_it():
+    async def run():
+        from app.models import Transaction, TransactionRollup
+
+        await init_db()
+        try:
+            buffer = TransactionBuffer(max_size=100, flush_interval=60)
+            service = RollupService()
+            record(buffer, 1, "expense", 1000, "food", TODAY)
+            record(buffer, 1, "expense", 2000, "taxi", TODAY)
+            await buffer.flush()
+            uid = await user_id(1)
+
+            # Transaction removed behind the rollups' back, one bucket tampered with
+            await Transaction.filter(category="taxi").delete()
+            await TransactionRollup.filter(period="month", category="food").update(total=1)
+
+            mismatches = await service.check(uid)
+            assert {(key[1], key[3]) for key, _, _ in mismatches} == {
+                ("day", "taxi"), ("week", "taxi"), ("month", "taxi"), ("month", "food"),
+            }
+
+            assert await service.rebuild(uid) == 3
+            assert await service.check(uid) == []
+            month = await service.report(uid, "month", TODAY)
+            assert [(r["category"], r["total"]) for r in month] == [("food", Decimal("1000.00"))]
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+def test_currencies_are_totalled_separately():
+    async def run():
+        from app.models import Transaction
+
+        await init_db()
+        try:
+            buffer = TransactionBuffer(max_size=100, flush_interval=60)
+            service = RollupService()
+            buffer.add(1, {"type": "expense", "amount": 20000, "category": "food", "date": TODAY.isoformat()},
+                       source="text")
+            buffer.add(1, {"type": "expense", "amount": "15 dollar", "category": "food", "date": TODAY.isoformat()},
+                       source="text")
+            buffer.add(1, {"type": "income", "amount": 100, "currency": "usd", "category": "gift",
+                           "date": TODAY.isoformat()}, source="text")
+            await buffer.flush()
+            uid = await user_id(1)
+
+            assert sorted(await Transaction.all().values_list("currency", flat=True)) == ["USD", "USD", "UZS"]
+            day = await service.report(uid, "day", TODAY)
+            assert sorted((r["type"], r["currency"], r["total"]) for r in day) == [
+                ("expense", "USD", Decimal("15.00")),
+                ("expense", "UZS", Decimal("20000.00")),
+                ("income", "USD", Decimal("100.00")),
+            ]
+            assert await service.check(uid) == []
+            return day
+        finally:
+            await Tortoise.close_connections()
+
+    day = asyncio.run(run())
+
+    text = _format_report(day, "day", TODAY)
+    assert "• food: 20 000 UZS (1)" in text
+    assert "• food: 15 USD (1)" in text
+    assert text.endswith(
+        "Jami (UZS): xarajat 20 000, daromad 0, balans -20 000\n"
+        "Jami (USD): xarajat 15, daromad 100, balans 85"
+    )
@@ -0,0 +1,211 @@
+"""
+Sharded mode: user routing, per-user ordering and forked shard processes
+"""
+import asyncio
+import os
+import time
+from collections import Counter, defaultdict
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.sharding import KeyedSerializer, ShardRouter, fork_shards, poll_updates, shard_for, update_user_id
+
+
+def make_update(update_id: int, user_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+            "text": text,
+        },
+    }
+
+
+def test_update_user_id():
+    assert update_user_id(make_update(1, 42, "hi")) == 42
+    assert update_user_id({"update_id": 2, "callback_query": {"id": "1", "from": {"id": 7}}}) == 7
+    assert update_user_id({"update_id": 3, "poll_answer": {"poll_id": "1", "user": {"id": 9}}}) == 9
+    assert update_user_id({"update_id": 4, "channel_post": {"chat": {"id": -100}}}) is None
+
+
+def test_users_are_spread_evenly_and_stably():
+    counts = Counter(shard_for(user_id, 4) for user_id in range(100_000, 140_000))
+
+    assert set(counts) == {0, 1, 2, 3}
+    assert all(9_000 < count < 11_000 for count in counts.values())
+    assert [shard_for(123456789, 4) for _ in range(3)] == [shard_for(123456789, 4)] * 3
+
+
+def test_same_key_runs_in_order_other_keys_concurrently():
+    async def run():
+        serializer = KeyedSerializer(limit=10)
+        log = []
+        running = 0
+        peak = 0
+
+        def job(key, n, delay):
+            async def go():
+                nonlocal running, peak
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(delay)
+                running -= 1
+                if n == 1 and key == "a":
+                    raise RuntimeError("handler failed")
+                log.append((key, n))
+            return go
+
+        # a's first job is the slowest but still finishes first among a's jobs
+        for n, delay in enumerate((0.05, 0.0, 0.01)):
+            await serializer.submit("a", job("a", n, delay))
+        for n in range(3):
+            await serializer.submit("b", job("b", n, 0.0))
+        await serializer.join()
+        return log, peak
+
+    log, peak = asyncio.run(run())
+
+    assert [n for key, n in log if key == "a"] == [0, 2]
+    assert [n for key, n in log if key == "b"] == [0, 1, 2]
+    # b did not wait for a
+    assert log.index(("b", 2)) < log.index(("a", 0))
+    assert peak == 2
+
+
+def test_forked_shards_keep_each_user_on_one_process_in_order(tmp_path):
+    output = tmp_path / "handled.txt"
+    router = Router()
+
+    @router.message()
+    async def record(message: Message):
+        # Later messages are faster, so reordering would show up
+        await asyncio.sleep(0.02 if message.text.endswith(" 0") else 0.0)
+        with open(output, "a") as file:
+            file.write(f"{os.getpid()} {message.from_user.id} {message.text}\n")
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    processes, update_fds, ack_fds = fork_shards(dp, lambda: Bot(token="123456:TEST"), 3)
+
+    async def run():
+        shards = await ShardRouter.connect(update_fds, ack_fds)
+        update_id = 0
+        for n in range(5):
+            for user_id in range(1000, 1020):
+                update_id += 1
+                await shards.route(make_update(update_id, user_id, f"msg {n}"))
+        finished = await shards.close(timeout=10)
+        return shards, finished
+
+    try:
+        shards, finished = asyncio.run(run())
+    finally:
+        for process in processes:
+            process.join(timeout=10)
+
+    assert finished
+    assert not shards.lost.is_set()
+    assert sum(shards.routed) == 100 and shards.done == shards.routed
+    assert shards.in_flight() == [0, 0, 0]
+    assert "%" in shards.report()
+
+    by_user = defaultdict(list)
+    pids = defaultdict(set)
+    for line in output.read_text().splitlines():
+        pid, user_id, text = line.split(" ", 2)
+        by_user[user_id].append(text)
+        pids[user_id].add(pid)
+    assert len(by_user) == 20
+    assert all(texts == [f"msg {n}" for n in range(5)] for texts in by_user.values())
+    assert all(len(user_pids) == 1 for user_pids in pids.values())
+    assert len(set().union(*pids.values())) == 3
+
+
+def test_poll_updates_routes_and_confirms_offsets():
+    offsets = []
+
+    async def get_updates(request):
+        body = await request.json()
+        offsets.append(body["offset"])
+        if len(offsets) == 1:
+            result = [make_update(update_id, 42, f"msg {update_id}") for update_id in (10, 11, 12)]
+        else:
+            await asyncio.sleep(0.05)
+            result = []
+        return web.json_response({"ok": True, "result": result})
+
+    class Recorder:
+        def __init__(self):
+            self.updates = []
+
+        async def route(self, update):
+            self.updates.append(update["update_id"])
+            return 0
+
+    async def run():
+        app = web.Application()
+        app.router.add_post("/getUpdates", get_updates)
+        recorder = Recorder()
+        async with TestServer(app) as server:
+            task = asyncio.create_task(poll_updates(recorder, str(server.make_url("/getUpdates"))))
+            while len(offsets) < 3:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        return recorder.updates
+
+    assert asyncio.run(run()) == [10, 11, 12]
+    assert offsets[:3] == [0, 13, 13]
+
+
+def test_waiting_jobs_of_one_key_do_not_hold_run_slots():
+    async def run():
+        serializer = KeyedSerializer(limit=2, max_pending=50)
+        gate = asyncio.Event()
+        done = []
+
+        async def blocked():
+            await gate.wait()
+            done.append("a")
+
+        async def quick():
+            done.append("b")
+
+        # Ten updates from one busy user: one runs, nine wait for it
+        for _ in range(10):
+            await asyncio.wait_for(serializer.submit("a", blocked), timeout=1)
+        # Another user still gets a slot at once
+        await asyncio.wait_for(serializer.submit("b", quick), timeout=1)
+        await asyncio.sleep(0.01)
+        assert done == ["b"]
+
+        gate.set()
+        await serializer.join()
+        assert done.count("a") == 10
+
+    asyncio.run(run())
+
+
+def test_submit_waits_when_max_pending_jobs_are_queued():
+    async def run():
+        serializer = KeyedSerializer(limit=1, max_pending=3)
+        gate = asyncio.Event()
+
+        for key in range(3):
+            await serializer.submit(key, gate.wait)
+        fourth = asyncio.create_task(serializer.submit(3, gate.wait))
+        await asyncio.sleep(0.01)
+        assert not fourth.done()
+
+        gate.set()
+        await fourth
+        await serializer.join()
+        assert serializer.pending == 0
+
+    asyncio.run(run())
@@ -0,0 +1,151 @@
+"""
+Throttling: token buckets (memory and shared database backend) and middleware
+"""
+import asyncio
+import time
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Message, Update
+from tortoise import Tortoise
+
+from app.middlewares import DatabaseTokenBucket, MemoryTokenBucket, ThrottlingMiddleware
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class RecordingSession(BaseSession):
+    """Bot session that records API calls instead of sending them"""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests.append(method)
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def make_update(update_id: int, user_id: int, text: str = None, voice: bool = False) -> Update:
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+    }
+    if voice:
+        message["voice"] = {"file_id": f"f{update_id}", "file_unique_id": f"u{update_id}", "duration": 3}
+    else:
+        message["text"] = text
+    return Update.model_validate({"update_id": update_id, "message": message})
+
+
+def test_memory_bucket_spends_and_refills():
+    async def run():
+        clock = FakeClock()
+        bucket = MemoryTokenBucket(capacity=5, refill_rate=1.0, clock=clock)
+
+        assert await bucket.consume(1, 3) == (True, 0.0)
+        assert await bucket.consume(1, 2) == (True, 0.0)
+        allowed, retry_after = await bucket.consume(1, 3)
+        assert not allowed
+        assert retry_after == 3.0
+
+        # Other users have their own bucket
+        assert (await bucket.consume(2, 5))[0]
+
+        clock.now += 3
+        assert (await bucket.consume(1, 3))[0]
+        # Refill is capped at capacity
+        clock.now += 100
+        assert (await bucket.consume(1, 5))[0]
+        assert not (await bucket.consume(1, 1))[0]
+
+    asyncio.run(run())
+
+
+def test_database_bucket_is_shared_between_instances():
+    async def run():
+        await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["app.models"]})
+        await Tortoise.generate_schemas()
+        try:
+            clock = FakeClock()
+            # Two "processes" enforcing one limit through the same table
+            first = DatabaseTokenBucket(capacity=4, refill_rate=0.5, clock=clock)
+            second = DatabaseTokenBucket(capacity=4, refill_rate=0.5, clock=clock)
+
+            assert (await first.consume(7, 3))[0]
+            allowed, retry_after = await second.consume(7, 3)
+            assert not allowed
+            assert retry_after == 4.0  # 1 token left, 2 missing at 0.5/s
+            assert (await second.consume(7, 1))[0]
+
+            clock.now += 6
+            assert (await first.consume(7, 3))[0]
+            assert not (await second.consume(7, 1))[0]
+
+            # Cost above capacity is never granted
+            assert not (await first.consume(8, 5))[0]
+            assert (await second.consume(8, 4))[0]
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+def test_middleware_applies_to_nested_routers():
+    async def run():
+        handled = []
+        child = Router()
+
+        @child.message()
+        async def record(message: Message):
+            handled.append(message.text or "voice")
+
+        main_router = Router()
+        main_router.include_router(child)
+        middleware = ThrottlingMiddleware(
+            MemoryTokenBucket(capacity=4, refill_rate=0.001), voice_cost=3, text_cost=1
+        )
+        main_router.message.middleware(middleware)
+
+        dp = Dispatcher()
+        dp.include_router(main_router)
+        session = RecordingSession()
+        bot = Bot(token="123456:TEST", session=session)
+
+        await dp.feed_update(bot, make_update(1, 42, voice=True))
+        await dp.feed_update(bot, make_update(2, 42, text="non 5000"))
+        await dp.feed_update(bot, make_update(3, 42, text="taksi 20000"))
+        await dp.feed_update(bot, make_update(4, 42, voice=True))
+        # Commands are free, other users unaffected
+        await dp.feed_update(bot, make_update(5, 42, text="/help"))
+        await dp.feed_update(bot, make_update(6, 43, text="kofe 15000"))
+
+        assert handled == ["voice", "non 5000", "/help", "kofe 15000"]
+        assert middleware.throttled == 2
+        # One notice for the two throttled messages
+        assert len(session.requests) == 1
+        assert "soniyadan keyin" in session.requests[0].text
+
+    asyncio.run(run())
+
+
+def test_bucket_rejects_non_positive_settings():
+    for bucket_class in (MemoryTokenBucket, DatabaseTokenBucket):
+        with pytest.raises(ValueError, match="refill rate"):
+            bucket_class(capacity=10, refill_rate=0)
+        with pytest.raises(ValueError, match="capacity"):
+            bucket_class(capacity=0, refill_rate=1)
@@ -0,0 +1,210 @@
+"""
+Write-behind buffer: size and interval flushes, drain on close, poison rows (in-memory SQLite)
+"""
+import asyncio
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from tortoise import Tortoise
+
+from app.models import Transaction
+from app.services.financial_record import FinancialRecord
+from app.services.transaction_buffer import TransactionBuffer
+
+TODAY = date(2026, 10, 18)
+
+# SQLite accepts any number, PostgreSQL rejects this one for DECIMAL(18,2)
+TOO_LARGE = Decimal("100000000000000000")
+# Built directly: normalization would already cap the amount
+POISON = FinancialRecord("expense", TOO_LARGE, category="transport", description="taksi", date=TODAY)
+
+
+async def init_db():
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["app.models"]})
+    await Tortoise.generate_schemas()
+
+
+def record(buffer: TransactionBuffer, telegram_id: int, amount, description: str = None):
+    buffer.add(
+        telegram_id,
+        {"type": "expense", "amount": amount, "category": "food", "description": description,
+         "date": TODAY.isoformat()},
+        source="text",
+    )
+
+
+def reject_large_amounts(buffer: TransactionBuffer) -> list:
+    """Make the buffer's writes fail like PostgreSQL's numeric overflow; returns batch sizes"""
+    write = buffer._write
+    sizes = []
+
+    async def checked(batch):
+        sizes.append(len(batch))
+        if any(row[1] >= TOO_LARGE for _, row, _ in batch):
+            raise ValueError("numeric field overflow")
+        await write(batch)
+
+    buffer._write = checked
+    return sizes
+
+
+async def stored_descriptions():
+    return sorted(await Transaction.all().values_list("description", flat=True))
+
+
+def test_flushes_when_max_size_rows_are_pending():
+    async def run():
+        await init_db()
+        try:
+            buffer = TransactionBuffer(max_size=3, flush_interval=60)
+            record(buffer, 1, 1000, "a")
+            record(buffer, 1, 2000, "b")
+            await asyncio.sleep(0.05)
+            assert len(buffer) == 2
+            assert await Transaction.all().count() == 0
+
+            record(buffer, 2, 3000, "c")
+            await asyncio.sleep(0.05)
+            assert len(buffer) == 0
+            assert await stored_descriptions() == ["a", "b", "c"]
+            assert (buffer.flushes, buffer.flushed_rows) == (1, 3)
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+def test_flushes_every_interval():
+    async def run():
+        await init_db()
+        try:
+            buffer = TransactionBuffer(max_size=100, flush_interval=0.05)
+            await buffer.start()
+            record(buffer, 1, 1000, "a")
+            await asyncio.sleep(0.2)
+            assert await stored_descriptions() == ["a"]
+            await buffer.close()
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+def test_close_drains_pending_rows():
+    async def run():
+        await init_db()
+        try:
+            buffer = TransactionBuffer(max_size=100, flush_interval=60)
+            await buffer.start()
+            for index in range(5):
+                record(buffer, index, 1000 + index, str(index))
+            await buffer.close()
+            assert len(buffer) == 0
+            assert await stored_descriptions() == ["0", "1", "2", "3", "4"]
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+def test_poison_row_does_not_block_other_rows():
+    async def run():
+        await init_db()
+        try:
+            buffer = TransactionBuffer(max_size=100, flush_interval=60, max_attempts=2)
+            sizes = reject_large_amounts(buffer)
+
+            buffer.add(1, POISON, source="text")
+            for index in range(7):
+                record(buffer, 2, 1000, f"ok{index}")
+            assert await buffer.flush() == 7
+            assert await Transaction.all().count() == 7
+            # Halved until the bad row is alone
+            assert sizes == [8, 4, 2, 1, 1, 2, 4]
+            # Only the bad row is retried, behind rows that arrived meanwhile
+            assert len(buffer) == 1
+
+            record(buffer, 3, 5000, "later")
+            assert await buffer.flush() == 1
+            assert "later" in await stored_descriptions()
+
+            # Second failure next to a written row: dead-lettered
+            assert len(buffer) == 0
+            assert buffer.dead_lettered == 1
+            telegram_id, row, error = buffer.dead_letters[0]
+            assert (telegram_id, row[1], row[4]) == (1, TOO_LARGE, "taksi")
+            assert "overflow" in error
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+def test_database_outage_keeps_rows_without_counting_attempts():
+    async def run():
+        await init_db()
+        try:
+            buffer = TransactionBuffer(max_size=100, flush_interval=60, max_attempts=1)
+            write = buffer._write
+            down = True
+
+            async def flaky(batch):
+                if down:
+                    raise ConnectionError("database is down")
+                await write(batch)
+
+            buffer._write = flaky
+            record(buffer, 1, 1000, "a")
+            record(buffer, 2, 2000, "b")
+            assert await buffer.flush() == 0
+            assert await buffer.flush() == 0
+            assert (len(buffer), buffer.dead_lettered) == (2, 0)
+
+            down = False
+            assert await buffer.flush() == 2
+            assert await stored_descriptions() == ["a", "b"]
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+def test_failed_rows_are_capped_dropping_the_oldest():
+    async def run():
+        await init_db()
+        try:
+            buffer = TransactionBuffer(max_size=1, flush_interval=60)
+
+            async def down(batch):
+                raise ConnectionError("database is down")
+
+            buffer._write = down
+            for index in range(15):
+                buffer._pending.append((index, ("expense", Decimal(1), "UZS", "food", str(index), TODAY, None, "text"), 0))
+            await buffer.flush()
+            assert [telegram_id for telegram_id, _, _ in buffer._pending] == list(range(5, 15))
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+def test_save_writes_at_once_and_raises_on_failure():
+    async def run():
+        await init_db()
+        try:
+            buffer = TransactionBuffer(max_size=100, flush_interval=60)
+            reject_large_amounts(buffer)
+            await buffer.save(1, {"type": "income", "amount": 500, "category": "gift"}, source="voice",
+                              transcript="sovg'a")
+            transaction = await Transaction.get()
+            assert (transaction.amount, transaction.transcript) == (Decimal("500.00"), "sovg'a")
+
+            with pytest.raises(ValueError):
+                await buffer.save(1, POISON, source="text")
+            assert len(buffer) == 0
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
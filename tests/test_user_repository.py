@@ -0,0 +1,98 @@
+"""
+User repository: single-statement upsert and the user cache
+
+The SQLite tests cover the follow-up SELECT path; the CTE path needs
+PostgreSQL and is skipped without it.
+"""
+import asyncio
+
+from tortoise import Tortoise
+
+from app.models import User
+from app.repositories.user_repository import UserRepository
+from tests.test_database import init_postgres, requires_postgres
+
+# Not a real Telegram ID (the PostgreSQL test shares a database)
+TELEGRAM_ID = -4242
+
+
+async def init_sqlite() -> None:
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["app.models"]})
+    await Tortoise.generate_schemas()
+
+
+async def check_upsert() -> None:
+    repository = UserRepository(max_entries=10, ttl=60)
+
+    # New user
+    user, written = await repository.upsert(TELEGRAM_ID, "ali", "Ali", None)
+    assert written
+    assert (user.telegram_id, user.username, user.first_name, user.last_name) == (TELEGRAM_ID, "ali", "Ali", None)
+    assert await User.filter(telegram_id=TELEGRAM_ID).count() == 1
+    updated_at = (await User.get(telegram_id=TELEGRAM_ID)).updated_at
+
+    # Unchanged profile: answered from the cache, then (cache cleared) by the database
+    cached, written = await repository.upsert(TELEGRAM_ID, "ali", "Ali", None)
+    assert not written and cached is user
+    repository.clear()
+    stored, written = await repository.upsert(TELEGRAM_ID, "ali", "Ali", None)
+    assert not written
+    assert stored.id == user.id
+    assert (await User.get(telegram_id=TELEGRAM_ID)).updated_at == updated_at
+
+    # Changed username and name: written, and the cached copy is replaced
+    assert (await repository.get_by_telegram_id(TELEGRAM_ID)).username == "ali"
+    changed, written = await repository.upsert(TELEGRAM_ID, "ali_v", "Ali", "Valiyev")
+    assert written
+    assert (changed.username, changed.last_name) == ("ali_v", "Valiyev")
+    cached = await repository.get_by_telegram_id(TELEGRAM_ID)
+    assert (cached.username, cached.last_name) == ("ali_v", "Valiyev")
+    stored = await User.get(telegram_id=TELEGRAM_ID)
+    assert (stored.username, stored.last_name) == ("ali_v", "Valiyev")
+    assert await User.filter(telegram_id=TELEGRAM_ID).count() == 1
+
+
+def test_upsert_on_sqlite():
+    async def run():
+        await init_sqlite()
+        try:
+            await check_upsert()
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+def test_lookups_are_cached_and_invalidated():
+    async def run():
+        await init_sqlite()
+        try:
+            repository = UserRepository(max_entries=10, ttl=60)
+            assert await repository.get_by_telegram_id(7) is None
+
+            await User.create(telegram_id=7, username="old")
+            first = await repository.get_by_telegram_id(7)
+            await User.filter(telegram_id=7).update(username="new")
+            assert (await repository.get_by_telegram_id(7)) is first
+
+            repository.invalidate(7)
+            assert (await repository.get_by_telegram_id(7)).username == "new"
+        finally:
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
+
+
+@requires_postgres
+def test_upsert_on_postgres():
+    async def run():
+        await init_postgres()
+        try:
+            await Tortoise.generate_schemas(safe=True)
+            await User.filter(telegram_id=TELEGRAM_ID).delete()
+            await check_upsert()
+        finally:
+            await User.filter(telegram_id=TELEGRAM_ID).delete()
+            await Tortoise.close_connections()
+
+    asyncio.run(run())
@@ -0,0 +1,132 @@
+"""
+Voice downloads: size pre-check, cached file paths and bytes copied per message
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import GetFile
+from aiogram.types import File
+
+from app.services.voice_downloader import VoiceDownloader, VoiceTooLargeError
+
+PAYLOAD = bytes(range(256)) * 1000  # 256 000 bytes
+
+
+class FileSession(BaseSession):
+    """Serves one file from memory in chunks, recording every request"""
+
+    def __init__(self, payload: bytes = PAYLOAD, chunk_size: int = 65536):
+        super().__init__()
+        self.payload = payload
+        self.chunk_size = chunk_size
+        self.requests = []
+        self.downloads = []
+        self.expired_paths = set()
+        self.path_version = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests.append(method)
+        assert isinstance(method, GetFile)
+        self.path_version += 1
+        return File(
+            file_id=method.file_id, file_unique_id="u", file_size=len(self.payload),
+            file_path=f"voice/{method.file_id}-{self.path_version}.oga",
+        )
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        self.downloads.append(url)
+        if any(url.endswith(path) for path in self.expired_paths):
+            raise RuntimeError("404 Not Found")
+        for start in range(0, len(self.payload), self.chunk_size):
+            yield self.payload[start:start + self.chunk_size]
+
+    async def close(self):
+        pass
+
+
+def voice(file_id: str = "f1", file_size=len(PAYLOAD)):
+    return SimpleNamespace(file_id=file_id, file_size=file_size)
+
+
+def test_oversized_note_is_rejected_before_any_request():
+    async def run():
+        session = FileSession()
+        bot = Bot(token="123456:TEST", session=session)
+        downloader = VoiceDownloader(max_bytes=1000, path_ttl=60)
+
+        assert downloader.too_large(voice())
+        with pytest.raises(VoiceTooLargeError):
+            await downloader.download(bot, voice())
+        assert session.requests == [] and session.downloads == []
+        assert downloader.rejected == 1
+
+    asyncio.run(run())
+
+
+def test_unannounced_size_is_enforced_while_streaming():
+    async def run():
+        session = FileSession()
+        bot = Bot(token="123456:TEST", session=session)
+        downloader = VoiceDownloader(max_bytes=100_000, path_ttl=60)
+
+        with pytest.raises(VoiceTooLargeError):
+            await downloader.download(bot, voice(file_size=None))
+
+    asyncio.run(run())
+
+
+def test_one_copy_into_a_preallocated_buffer():
+    async def run():
+        session = FileSession()
+        bot = Bot(token="123456:TEST", session=session)
+        downloader = VoiceDownloader(max_bytes=1_000_000, path_ttl=60)
+
+        data = await downloader.download(bot, voice())
+
+        assert isinstance(data, memoryview)
+        assert data == PAYLOAD
+        # Each network chunk is copied once, into the buffer sized from file_size
+        assert downloader.bytes_copied == len(PAYLOAD)
+        assert len(data.obj) == len(PAYLOAD)
+
+        # Without an announced size the buffer grows, still one copy per byte
+        data = await downloader.download(bot, voice("f2", file_size=None))
+        assert data == PAYLOAD
+        assert downloader.bytes_copied == 2 * len(PAYLOAD)
+
+    asyncio.run(run())
+
+
+def test_file_path_is_cached():
+    async def run():
+        session = FileSession()
+        bot = Bot(token="123456:TEST", session=session)
+        downloader = VoiceDownloader(max_bytes=1_000_000, path_ttl=60)
+
+        await downloader.download(bot, voice())
+        await downloader.download(bot, voice())
+
+        assert len(session.requests) == 1
+        assert len(session.downloads) == 2
+        assert (downloader.path_misses, downloader.path_hits) == (1, 1)
+
+    asyncio.run(run())
+
+
+def test_expired_cached_path_is_refreshed():
+    async def run():
+        session = FileSession()
+        bot = Bot(token="123456:TEST", session=session)
+        downloader = VoiceDownloader(max_bytes=1_000_000, path_ttl=60)
+
+        await downloader.download(bot, voice())
+        session.expired_paths.add("voice/f1-1.oga")
+
+        assert await downloader.download(bot, voice()) == PAYLOAD
+        assert len(session.requests) == 2
+        assert session.downloads[-1].endswith("voice/f1-2.oga")
+
+    asyncio.run(run())
@@ -0,0 +1,157 @@
+"""
+Segmented transcription: Ogg/Opus demux/remux, splitting at pauses and
+parallel transcription of long voice notes
+"""
+import asyncio
+import struct
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.gemini_service import GeminiService
+from app.services.resilience import ResilientCaller
+from app.utils import ogg
+from config.settings import settings
+
+HEAD = b"OpusHead" + bytes([1, 1]) + struct.pack("<HIhB", 312, 48000, 0, 0)
+TAGS = b"OpusTags" + struct.pack("<I", 4) + b"test" + struct.pack("<I", 0)
+# TOC byte: SILK narrowband 20 ms, one frame
+TOC_20MS = 1 << 3
+
+
+def speech(seconds: float, marker: int = 0) -> list:
+    """Large 20 ms packets (speech); the second byte carries a marker"""
+    return [bytes([TOC_20MS, marker]) + b"\x55" * 58 for _ in range(int(seconds * 50))]
+
+
+def pause(seconds: float) -> list:
+    """Tiny 20 ms packets (silence)"""
+    return [bytes([TOC_20MS, 0]) + b"\x00"] * int(seconds * 50)
+
+
+def voice_note(packets: list) -> bytes:
+    return ogg.write_opus(ogg.OpusStream(HEAD, TAGS, packets))
+
+
+def test_packet_durations():
+    assert ogg.packet_samples(bytes([TOC_20MS])) == 960
+    # CELT 20 ms (config 31), code 3 with 3 frames
+    assert ogg.packet_samples(bytes([(31 << 3) | 3, 3])) == 2880
+    # SILK 60 ms (config 3), code 1 (two frames)
+    assert ogg.packet_samples(bytes([(3 << 3) | 1])) == 5760
+
+
+def test_write_and_read_round_trip():
+    packets = speech(3) + [b"\x08" + b"x" * 600] + pause(1)
+    data = voice_note(packets)
+
+    stream = ogg.read_opus(data)
+    assert stream.head == HEAD
+    assert stream.tags == TAGS
+    assert stream.packets == packets
+    assert stream.pre_skip == 312
+    assert stream.duration == pytest.approx(4.02)
+    assert ogg.duration(data) == pytest.approx(4.02)
+
+
+def test_corrupt_data_is_rejected():
+    data = bytearray(voice_note(speech(1)))
+    data[-1] ^= 0xFF
+    with pytest.raises(ogg.OggError):
+        ogg.read_opus(bytes(data))
+    with pytest.raises(ogg.OggError):
+        ogg.read_opus(b"RIFF" + b"\x00" * 100)
+
+
+def test_split_lands_in_the_pause():
+    # 25 s of speech, a 1 s pause, 20 s more: the 30 s limit falls inside the
+    # search window after the pause
+    packets = speech(25, marker=1) + pause(1) + speech(20, marker=2)
+    stream = ogg.read_opus(voice_note(packets))
+
+    pieces = ogg.split_at_silence(stream, max_seconds=30)
+
+    assert len(pieces) == 2
+    assert sum(len(piece.packets) for piece in pieces) == len(packets)
+    assert {packet[1] for packet in pieces[0].packets} == {0, 1}
+    assert {packet[1] for packet in pieces[1].packets} == {0, 2}
+
+
+def test_pieces_respect_the_maximum_without_pauses():
+    stream = ogg.OpusStream(HEAD, TAGS, speech(100))
+
+    pieces = ogg.split_at_silence(stream, max_seconds=30)
+
+    assert all(piece.duration <= 30 for piece in pieces)
+    assert sum(piece.duration for piece in pieces) == pytest.approx(100)
+    # Every piece is a standalone Ogg/Opus file
+    for piece in pieces:
+        written = ogg.read_opus(ogg.write_opus(piece))
+        assert written.head == HEAD and written.packets == piece.packets
+
+
+class MarkerModels:
+    """Transcribes a piece as the markers of its speech packets; later pieces answer first"""
+
+    def __init__(self):
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def generate_content(self, *, model, contents, config=None):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        audio = contents[1].inline_data.data
+        markers = sorted({packet[1] for packet in ogg.read_opus(audio).packets} - {0})
+        await asyncio.sleep(0.05 / markers[0])
+        self.in_flight -= 1
+        return SimpleNamespace(text=" ".join(f"part{marker}" for marker in markers))
+
+
+def make_service(models) -> GeminiService:
+    service = GeminiService()
+    service.client = SimpleNamespace(aio=SimpleNamespace(models=models))
+    service.caller = ResilientCaller(["primary"])
+    return service
+
+
+def test_long_note_is_transcribed_in_parallel_and_in_order(monkeypatch):
+    monkeypatch.setattr(settings, "voice_segment_threshold", 60.0)
+    monkeypatch.setattr(settings, "voice_segment_max_length", 30.0)
+
+    async def run():
+        models = MarkerModels()
+        service = make_service(models)
+        packets = speech(28, 1) + pause(1) + speech(28, 2) + pause(1) + speech(20, 3)
+
+        text = await service.transcribe_segmented(voice_note(packets))
+
+        assert text == "part1 part2 part3"
+        assert models.calls == 3
+        assert models.max_in_flight == 3
+
+    asyncio.run(run())
+
+
+def test_short_note_keeps_single_shot(monkeypatch):
+    monkeypatch.setattr(settings, "voice_segment_threshold", 60.0)
+
+    async def run():
+        models = MarkerModels()
+        service = make_service(models)
+
+        text = await service.transcribe_segmented(voice_note(speech(40, 1) + speech(10, 2)))
+
+        assert text == "part1 part2"
+        assert models.calls == 1
+
+    asyncio.run(run())
+
+
+def test_unparseable_audio_is_sent_whole(monkeypatch):
+    monkeypatch.setattr(settings, "voice_segment_threshold", 1.0)
+    data = bytearray(voice_note(speech(5)))
+    data[40] ^= 0xFF  # breaks a checksum, keeps the duration readable
+
+    assert GeminiService.split_audio(bytes(data)) == [bytes(data)]
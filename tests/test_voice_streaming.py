@@ -0,0 +1,203 @@
+"""
+Streaming transcription: throttled progress edits and the streaming voice handler
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageText
+
+from app.handlers import voice
+from app.services import gemini_provider
+from app.services.financial_record import FinancialRecord
+from app.services.gemini_service import GeminiService
+from app.services.processing_queue import ProcessingQueue
+from app.services.resilience import ResilientCaller
+from app.utils.message_editor import MAX_TEXT_LENGTH, ThrottledEditor
+from config.settings import settings
+
+TRANSCRIPT = "Bugun bozorda 45 ming so'mga meva oldim"
+
+
+class ProgressMessage:
+    """Sent message recording its edits"""
+
+    def __init__(self, text: str, fail_first: int = 0):
+        self.text = text
+        self.edits = []
+        self.fail_first = fail_first
+        self.deleted = False
+
+    async def edit_text(self, text: str, **kwargs):
+        if self.fail_first:
+            self.fail_first -= 1
+            raise TelegramRetryAfter(EditMessageText(text=text), "Flood control", retry_after=0.05)
+        self.edits.append((text, kwargs))
+        self.text = text
+        return self
+
+    async def delete(self):
+        self.deleted = True
+
+
+class IncomingMessage:
+    """Voice message whose replies are ProgressMessages"""
+
+    def __init__(self, file_id: str):
+        self.from_user = SimpleNamespace(id=1)
+        self.voice = SimpleNamespace(file_id=file_id, file_unique_id=f"unique-{file_id}", duration=5, file_size=104)
+        self.sent = []
+
+    async def answer(self, text: str, **kwargs):
+        reply = ProgressMessage(text)
+        self.sent.append(reply)
+        return reply
+
+
+class StreamingModels:
+    """Streams the transcript word by word; answers extraction with JSON"""
+
+    def __init__(self):
+        self.streams = 0
+
+    async def generate_content_stream(self, *, model, contents, config=None):
+        self.streams += 1
+
+        async def chunks():
+            for index, word in enumerate(TRANSCRIPT.split(" ")):
+                await asyncio.sleep(0.01)
+                yield SimpleNamespace(text=word if index == 0 else " " + word)
+
+        return chunks()
+
+    async def generate_content(self, *, model, contents, config=None):
+        return SimpleNamespace(text=json.dumps({
+            "type": "expense", "amount": 45000, "category": "food", "description": "meva", "date": "today",
+        }))
+
+
+class FakeBot:
+    async def get_file(self, file_id):
+        return SimpleNamespace(file_path=f"voice/{file_id}.oga", file_size=104)
+
+    async def download_file(self, file_path, destination=None, **kwargs):
+        destination.write(b"OggS" + b"\x00" * 100)
+        return destination
+
+
+def test_rapid_updates_are_coalesced():
+    async def run():
+        message = ProgressMessage("start")
+        editor = ThrottledEditor(min_interval=0.05)
+        editor.attach(message)
+
+        for i in range(50):
+            editor.update(f"text {i}")
+            await asyncio.sleep(0.002)
+        await asyncio.sleep(0.12)
+
+        # ~100 ms of updates at one edit per 50 ms, ending on the newest text
+        assert 2 <= len(message.edits) <= 4
+        assert message.text == "text 49"
+
+        await editor.finish("done")
+        assert message.text == "done"
+
+    asyncio.run(run())
+
+
+def test_updates_before_attach_are_shown():
+    async def run():
+        message = ProgressMessage("start")
+        editor = ThrottledEditor(min_interval=0.01)
+        editor.update("early")
+        editor.attach(message)
+        await asyncio.sleep(0.02)
+        assert message.edits == [("early", {"parse_mode": None})]
+        await editor.stop()
+
+    asyncio.run(run())
+
+
+def test_progress_edits_are_plain_text():
+    async def run():
+        message = ProgressMessage("start")
+        editor = ThrottledEditor(min_interval=0.0)
+        editor.attach(message)
+        editor.update("narx <50 ming & undan ko'p")
+        await asyncio.sleep(0.01)
+        await editor.finish("<b>tayyor</b>", parse_mode="HTML")
+        # Progress ignores the Bot's default HTML mode; the final edit picks its own
+        assert message.edits == [
+            ("narx <50 ming & undan ko'p", {"parse_mode": None}),
+            ("<b>tayyor</b>", {"parse_mode": "HTML"}),
+        ]
+
+    asyncio.run(run())
+
+
+def test_flood_control_delays_next_edit():
+    async def run():
+        message = ProgressMessage("start", fail_first=1)
+        editor = ThrottledEditor(min_interval=0.0)
+        editor.attach(message)
+        editor.update("partial")
+        await asyncio.sleep(0.02)
+        # Rejected with retry_after=0.05, not retried yet
+        assert message.edits == []
+        await asyncio.sleep(0.06)
+        assert message.text == "partial"
+        await editor.stop()
+
+    asyncio.run(run())
+
+
+def test_long_text_keeps_its_end():
+    async def run():
+        message = ProgressMessage("start")
+        editor = ThrottledEditor(min_interval=0.0)
+        editor.attach(message)
+        editor.update("x" * MAX_TEXT_LENGTH + "end")
+        await asyncio.sleep(0.01)
+        assert len(message.text) == MAX_TEXT_LENGTH
+        assert message.text.endswith("end")
+
+    asyncio.run(run())
+
+
+def test_streaming_handler_edits_processing_message(monkeypatch):
+    async def run():
+        models = StreamingModels()
+        queue = ProcessingQueue(workers=2, max_size=10, max_per_user=5)
+        saved = []
+        monkeypatch.setattr(settings, "voice_streaming", True)
+        monkeypatch.setattr(settings, "voice_stream_edit_interval", 0.02)
+        monkeypatch.setattr(voice, "processing_queue", queue)
+        monkeypatch.setattr(voice.transaction_buffer, "add", lambda *args, **kwargs: saved.append(args))
+        service = GeminiService()
+        service.client = SimpleNamespace(aio=SimpleNamespace(models=models))
+        service.caller = ResilientCaller(["primary"])
+        monkeypatch.setattr(gemini_provider, "_service", service)
+
+        message = IncomingMessage("streaming-test")
+        await voice.handle_voice(message, FakeBot())
+        await queue.close()
+
+        # One message, edited in place: partial transcript first, final answer last
+        assert len(message.sent) == 1
+        progress = message.sent[0]
+        assert not progress.deleted
+        texts = [text for text, _ in progress.edits]
+        assert any(text.endswith("▌") and TRANSCRIPT not in text for text in texts)
+        final, kwargs = progress.edits[-1]
+        assert TRANSCRIPT in final and "45000" in final
+        assert kwargs == {"parse_mode": "Markdown"}
+        assert models.streams == 1
+        ((user_id, record),) = saved
+        assert user_id == 1
+        assert record == FinancialRecord.from_dict({
+            "type": "expense", "amount": 45000, "category": "food", "description": "meva", "date": "today",
+        })
+
+    asyncio.run(run())
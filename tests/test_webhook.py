@@ -0,0 +1,110 @@
+"""
+Webhook mode: post synthetic Telegram updates to the aiohttp application
+"""
+import asyncio
+import time
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message
+from aiohttp.test_utils import TestClient, TestServer
+
+from app.webhook import create_webhook_app
+
+SECRET = "test-secret"
+PATH = "/webhook"
+
+
+def make_update(update_id: int, text: str) -> dict:
+    """Build a minimal Telegram text message update"""
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": 42, "type": "private"},
+            "from": {"id": 42, "is_bot": False, "first_name": "Test"},
+            "text": text,
+        },
+    }
+
+
+def make_app(handler_delay: float = 0.0):
+    """Webhook app with a recording router instead of the real handlers"""
+    received = []
+    router = Router()
+
+    @router.message()
+    async def record(message: Message):
+        await asyncio.sleep(handler_delay)
+        received.append(message.text)
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot(token="123456:TEST")
+    return create_webhook_app(dp, bot, secret_token=SECRET, path=PATH), received
+
+
+async def wait_for(condition, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for updates"
+        await asyncio.sleep(0.01)
+
+
+def test_updates_are_processed():
+    async def run():
+        app, received = make_app()
+        async with TestClient(TestServer(app)) as client:
+            for update_id in range(1, 6):
+                response = await client.post(
+                    PATH,
+                    json=make_update(update_id, f"msg {update_id}"),
+                    headers={"X-Telegram-Bot-Api-Secret-Token": SECRET},
+                )
+                assert response.status == 200
+
+            await wait_for(lambda: len(received) == 5)
+        assert sorted(received) == [f"msg {i}" for i in range(1, 6)]
+
+    asyncio.run(run())
+
+
+def test_wrong_secret_is_rejected():
+    async def run():
+        app, received = make_app()
+        async with TestClient(TestServer(app)) as client:
+            response = await client.post(PATH, json=make_update(1, "hi"))
+            assert response.status == 401
+
+            response = await client.post(
+                PATH,
+                json=make_update(2, "hi"),
+                headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"},
+            )
+            assert response.status == 401
+
+            await asyncio.sleep(0.05)
+        assert received == []
+
+    asyncio.run(run())
+
+
+def test_acknowledges_before_processing():
+    async def run():
+        app, received = make_app(handler_delay=0.5)
+        async with TestClient(TestServer(app)) as client:
+            started = time.perf_counter()
+            response = await client.post(
+                PATH,
+                json=make_update(1, "slow"),
+                headers={"X-Telegram-Bot-Api-Secret-Token": SECRET},
+            )
+            elapsed = time.perf_counter() - started
+
+            assert response.status == 200
+            assert elapsed < 0.25
+            assert received == []
+
+            await wait_for(lambda: received == ["slow"])
+
+    asyncio.run(run())